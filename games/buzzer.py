@@ -0,0 +1,389 @@
+# games/buzzer.py
+"""
+حَكَم البازر — قرار واحد لكل ضغطة بغضّ النظر عن المسار (WS أو HTTP):
+- أول ضغطة تفتح نافذة جمع قصيرة (BUZZ_WINDOW_MS، افتراضياً 30ms)
+- كل ضغطة WS تُرتَّب بوقت وصولها للخادم ناقص نصف زمن الذهاب والعودة (RTT) للاتصال؛
+  الـ RTT يقيسه الخادم بساعته (rtt_probe بمعرّف عشوائي ← rtt_echo) ولا يُقبل رقم من العميل.
+  ضغطات HTTP بوقت الوصول فقط
+- عند انتهاء النافذة يُعلن فائز واحد ويُقفل الزر لمدة ttl (buzz_timer + 2)
+- التخزين: Redis (سكربتات Lua ذرية) عند استخدام django_redis — موزّعاً بمعرّف الجلسة مع REDIS_SHARDS —
+  أو الكاش المشترك بين عمال الجهاز (SHARED_CACHE_PATH)، وإلا داخل العملية
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger('games')
+
+DEFAULT_WINDOW_MS = 30
+# أقصى RTT نعوّضه — يمنع أي اتصال من ادعاء أفضلية أكبر من ذلك
+RTT_CAP_MS = 300
+RTT_SMOOTHING = 0.25
+
+DECIDED = 'decided'
+OPEN = 'open'
+
+_seq = itertools.count(1)
+
+
+def _now_ms() -> float:
+    return time.time() * 1000.0
+
+
+def _game_settings() -> dict:
+    return getattr(settings, 'GAME_SETTINGS', {}) or {}
+
+
+def window_ms() -> int:
+    try:
+        return max(0, int(_game_settings().get('BUZZ_WINDOW_MS', DEFAULT_WINDOW_MS)))
+    except (TypeError, ValueError):
+        return DEFAULT_WINDOW_MS
+
+
+def lock_key(session_id, game: str = '') -> str:
+    """نفس أسماء أقفال الكاش القديمة: buzz_lock_<id> و buzz_lock_feud_<id>."""
+    return f"buzz_lock_{game}_{session_id}" if game else f"buzz_lock_{session_id}"
+
+
+def clamp_rtt(value) -> float:
+    try:
+        rtt = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    if rtt != rtt:  # NaN
+        return 0.0
+    return max(0.0, min(rtt, float(RTT_CAP_MS)))
+
+
+def observe_rtt(current, sample):
+    """متوسط متحرك لـ RTT الاتصال من ping/pong (يرجع current إذا كانت العينة غير صالحة)."""
+    if sample is None:
+        return current
+    rtt = clamp_rtt(sample)
+    if not current:
+        return rtt
+    return current + RTT_SMOOTHING * (rtt - current)
+
+
+async def probe_rtt(consumer):
+    """ping من الخادم؛ وقت الإرسال يبقى على المستهلك والعميل يعيد المعرّف فقط."""
+    from games import ws_protocol
+
+    nonce = uuid.uuid4().hex[:12]
+    consumer.rtt_probe = (nonce, time.monotonic())
+    await ws_protocol.send(consumer, {'type': 'rtt_probe', 'n': nonce})
+
+
+def observe_echo(consumer, data):
+    """rtt_echo من العميل: عينة RTT من ساعة الخادم إن طابق المعرّف آخر probe."""
+    probe = getattr(consumer, 'rtt_probe', None)
+    if not probe or data.get('n') != probe[0]:
+        return
+    consumer.rtt_probe = None
+    consumer.rtt_ms = observe_rtt(consumer.rtt_ms, (time.monotonic() - probe[1]) * 1000.0)
+
+
+def _order(candidate):
+    return (candidate['corrected'], candidate['received'], candidate['seq'])
+
+
+# ============================ Backends ============================
+class LocalBackend:
+    """داخل العملية — يكفي عند وجود عامل واحد."""
+
+    blocking = False
+    PRUNE_AT = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._decisions = {}
+
+    def submit(self, key, candidate, ttl_ms):
+        now = _now_ms()
+        with self._lock:
+            decision = self._decisions.get(key)
+            if decision and decision[1] > now:
+                return DECIDED, decision[0]
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = {'opened': now, 'candidates': []}
+            window['candidates'].append(candidate)
+            return OPEN, window['opened']
+
+    def decide(self, key, ttl_ms):
+        now = _now_ms()
+        with self._lock:
+            decision = self._decisions.get(key)
+            if decision and decision[1] > now:
+                return decision[0]
+            window = self._windows.pop(key, None)
+            if not window:
+                return None
+            winner = min(window['candidates'], key=_order)
+            self._decisions[key] = (winner, now + ttl_ms)
+            if len(self._decisions) > self.PRUNE_AT:
+                self._decisions = {k: v for k, v in self._decisions.items() if v[1] > now}
+            return winner
+
+    def current(self, key):
+        decision = self._decisions.get(key)
+        if decision and decision[1] > _now_ms():
+            return decision[0]
+        return None
+
+    def reset(self, key):
+        with self._lock:
+            self._decisions.pop(key, None)
+            self._windows.pop(key, None)
+
+
+_SUBMIT_LUA = """
+local d = redis.call('GET', KEYS[3])
+if d then return {1, d} end
+redis.call('SET', KEYS[2], ARGV[1], 'NX', 'PX', ARGV[4])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+return {0, redis.call('GET', KEYS[2])}
+"""
+
+_DECIDE_LUA = """
+local d = redis.call('GET', KEYS[3])
+if d then return d end
+local top = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #top == 0 then return false end
+redis.call('SET', KEYS[3], top[1], 'PX', ARGV[1])
+redis.call('DEL', KEYS[1], KEYS[2])
+return top[1]
+"""
+
+
+class RedisBackend:
+    """مشترك بين كل العمال — كل خطوة سكربت Lua واحد (ذري)."""
+
+    blocking = True
+
+    def __init__(self, client):
+        self.client = client
+        self._submit = client.register_script(_SUBMIT_LUA)
+        self._decide = client.register_script(_DECIDE_LUA)
+
+    @staticmethod
+    def _keys(key):
+        return [f"wesh:buzzer:{key}:w", f"wesh:buzzer:{key}:o", f"wesh:buzzer:{key}:d"]
+
+    def submit(self, key, candidate, ttl_ms):
+        # النافذة تعيش حتى ttl كحد أقصى لو مات العامل قبل القرار
+        state, value = self._submit(
+            keys=self._keys(key),
+            args=[_now_ms(), candidate['corrected'], json.dumps(candidate), int(ttl_ms)],
+        )
+        if int(state) == 1:
+            return DECIDED, json.loads(value)
+        return OPEN, float(value)
+
+    def decide(self, key, ttl_ms):
+        value = self._decide(keys=self._keys(key), args=[int(ttl_ms)])
+        return json.loads(value) if value else None
+
+    def current(self, key):
+        value = self.client.get(self._keys(key)[2])
+        return json.loads(value) if value else None
+
+    def reset(self, key):
+        self.client.delete(*self._keys(key))
+
+
+class ShardedRedisBackend:
+    """RedisBackend لكل عقدة (REDIS_SHARDS): مفاتيح الجلسة الثلاثة على عقدتها فتبقى السكربتات ذرية."""
+
+    blocking = True
+
+    def __init__(self, shard_client):
+        self._shards = {name: RedisBackend(conn) for name, conn in shard_client._serverdict.items()}
+        self._pick = shard_client.get_server_name
+
+    def _backend(self, key):
+        return self._shards[self._pick(key)]
+
+    def submit(self, key, candidate, ttl_ms):
+        return self._backend(key).submit(key, candidate, ttl_ms)
+
+    def decide(self, key, ttl_ms):
+        return self._backend(key).decide(key, ttl_ms)
+
+    def current(self, key):
+        return self._backend(key).current(key)
+
+    def reset(self, key):
+        self._backend(key).reset(key)
+
+
+class SharedCacheBackend:
+    """
+    مشترك بين عمال الجهاز الواحد عبر games.shared_cache (بدون Redis): كل خطوة transform ذرية
+    على مفتاح واحد للجلسة؛ النافذة تحفظ أفضل مرشّح فقط فيبقى حجمها ثابتاً مهما كثرت الضغطات.
+    """
+
+    blocking = False
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    @staticmethod
+    def _key(key):
+        return f"buzzer:{key}"
+
+    def submit(self, key, candidate, ttl_ms):
+        def step(state):
+            now = _now_ms()
+            if state and state.get('winner'):
+                return state, (DECIDED, state['winner'])
+            if not state:
+                state = {'opened': now, 'best': candidate}
+            elif _order(candidate) < _order(state['best']):
+                state['best'] = candidate
+            return state, (OPEN, state['opened'])
+
+        return self.cache.transform(self._key(key), step, timeout=ttl_ms / 1000.0)
+
+    def decide(self, key, ttl_ms):
+        def step(state):
+            if not state:
+                return None, None
+            if state.get('winner'):
+                return state, state['winner']
+            return {'winner': state['best']}, state['best']
+
+        return self.cache.transform(self._key(key), step, timeout=ttl_ms / 1000.0)
+
+    def current(self, key):
+        state = self.cache.get(self._key(key))
+        return state.get('winner') if state else None
+
+    def reset(self, key):
+        self.cache.delete(self._key(key))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        mode = str(_game_settings().get('BUZZ_ARBITER', 'auto')).lower()
+        cache_backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+        if mode == 'redis' or (mode == 'auto' and 'django_redis' in cache_backend):
+            try:
+                from django.core.cache import cache
+                from django_redis import get_redis_connection
+                from games.sharding import SessionShardClient
+
+                client = getattr(cache, 'client', None)
+                if isinstance(client, SessionShardClient):
+                    _backend = ShardedRedisBackend(client)
+                else:
+                    _backend = RedisBackend(get_redis_connection('default'))
+            except Exception as e:
+                logger.error(f"Buzzer: Redis backend unavailable, using local: {e}")
+                _backend = LocalBackend()
+        elif mode == 'shared' or (mode == 'auto' and cache_backend == 'games.shared_cache.SharedMemoryCache'):
+            from django.core.cache import cache
+
+            _backend = SharedCacheBackend(cache)
+        else:
+            _backend = LocalBackend()
+    return _backend
+
+
+# ============================ Arbitration ============================
+def make_candidate(payload: dict, rtt_ms=0.0) -> dict:
+    received = _now_ms()
+    rtt = clamp_rtt(rtt_ms)
+    return {
+        **payload,
+        'received': received,
+        'rtt': rtt,
+        'corrected': received - rtt / 2.0,
+        'seq': next(_seq),
+        'id': uuid.uuid4().hex,
+    }
+
+
+def _result(candidate, winner):
+    """(accepted, winner_payload) — winner قد يكون None لو أُعيد ضبط الزر أثناء النافذة."""
+    return (winner is not None and winner.get('id') == candidate['id']), winner
+
+
+async def arbitrate(key, payload: dict, rtt_ms=0.0, ttl_seconds=5):
+    backend = get_backend()
+    candidate = make_candidate(payload, rtt_ms)
+    ttl_ms = int(ttl_seconds * 1000)
+
+    if backend.blocking:
+        state, value = await sync_to_async(backend.submit)(key, candidate, ttl_ms)
+    else:
+        state, value = backend.submit(key, candidate, ttl_ms)
+    if state == DECIDED:
+        return _result(candidate, value)
+
+    wait = (value + window_ms() - _now_ms()) / 1000.0
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+    if backend.blocking:
+        winner = await sync_to_async(backend.decide)(key, ttl_ms)
+    else:
+        winner = backend.decide(key, ttl_ms)
+    return _result(candidate, winner)
+
+
+def arbitrate_sync(key, payload: dict, rtt_ms=0.0, ttl_seconds=5):
+    """نفس القرار لمسار HTTP المتزامن."""
+    backend = get_backend()
+    candidate = make_candidate(payload, rtt_ms)
+    ttl_ms = int(ttl_seconds * 1000)
+
+    state, value = backend.submit(key, candidate, ttl_ms)
+    if state == DECIDED:
+        return _result(candidate, value)
+
+    wait = (value + window_ms() - _now_ms()) / 1000.0
+    if wait > 0:
+        time.sleep(wait)
+    return _result(candidate, backend.decide(key, ttl_ms))
+
+
+def current_holder(key):
+    return get_backend().current(key)
+
+
+async def current_holder_async(key):
+    backend = get_backend()
+    if backend.blocking:
+        return await sync_to_async(backend.current)(key)
+    return backend.current(key)
+
+
+def reset(key):
+    get_backend().reset(key)
+
+
+async def reset_async(key):
+    backend = get_backend()
+    if backend.blocking:
+        await sync_to_async(backend.reset)(key)
+    else:
+        backend.reset(key)
+
+
+def rejection_message(winner) -> str:
+    return f'الزر محجوز من {(winner or {}).get("name", "مشارك")}'
@@ -11,7 +11,11 @@ from django.core.cache import cache
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 
-from games.models import GameSession, Contestant, LettersGameProgress
+from games.models import GameSession, LettersGameProgress
+from games import (
+    buzzer, event_log, feud_catalog, hexboard, live_letters, live_settings, live_time,
+    presence, session_control, timer_wheel, ws_groups, ws_protocol,
+)
 
 logger = logging.getLogger('games')
 
@@ -21,76 +25,97 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
     Consumer محسّن مع ربط فوري بين الصفحات:
     - المتسابق يضغط → فوري لشاشة العرض + المقدم
     - قفل 3 ثوانٍ تلقائي (تقدر ترفعه لـ 4 ثوانٍ لو تبي توحّد مع HTTP)
-    - أوامر المقدم تُحفَظ في DB وتُبث عبر المجموعة
+    - أوامر المقدم تُطبَّق على الحالة الحيّة (live_letters) وتُبث فوراً، والكتابة لـ DB على دفعات
     - بث إبراز الحرف المختار (letter_selected)
     - توافق مع views.update_scores عبر alias broadcast_scores
     """
 
-    # ============ Group broadcasts (called by views/group_send) ============
-    async def broadcast_letters_replace(self, event):
-        if self.role == 'contestant':
-            try:
-                from games.models import GameSettings
-                show = await sync_to_async(
-                    lambda: GameSettings.get_or_create_for_session(self.session).show_grid_to_contestants
-                )()
-                if show:
-                    await self.send(text_data=json.dumps({
-                        'type': 'letters_updated',
-                        'letters': event.get('letters', []),
-                        'reset_progress': bool(event.get('reset_progress', False)),
-                    }))
-            except Exception:
-                pass
-            return
-        await self.send(text_data=json.dumps({
+    # ============ Client messages (built once per broadcast) ============
+    @staticmethod
+    def _msg_letters_replace(event):
+        return {
             'type': 'letters_updated',
             'letters': event.get('letters', []),
             'reset_progress': bool(event.get('reset_progress', False)),
-        }))
+        }
 
-    async def broadcast_buzz_event(self, event):
+    @staticmethod
+    def _msg_buzz_event(event):
         action = event.get('action')
         if action == 'buzz_accepted':
-            if self.role == 'contestant':
-                return
-            await self.send(text_data=json.dumps({
+            return {
                 'type': 'contestant_buzz_accepted',
                 'contestant_name': event.get('contestant_name'),
                 'team': event.get('team'),
                 'team_display': event.get('team_display'),
                 'timestamp': event.get('timestamp'),
                 'start_countdown': True
-            }))
-        elif action == 'buzz_unlock':
-            if self.role == 'contestant':
-                return
-            await self.send(text_data=json.dumps({
+            }
+        if action == 'buzz_unlock':
+            return {
                 'type': 'buzz_unlocked',
                 'message': 'انتهى الوقت - الزر متاح الآن'
-            }))
-        elif action == 'buzz_reset':
-            if self.role == 'contestant':
-                return
-            await self.send(text_data=json.dumps({'type': 'buzz_reset_by_host'}))
-        
-    async def broadcast_cell_state(self, event):
-        if self.role == 'contestant':
-            try:
-                from games.models import GameSettings
-                show = await sync_to_async(
-                    lambda: GameSettings.get_or_create_for_session(self.session).show_grid_to_contestants
-                )()
-                if not show:
-                    return
-            except Exception:
-                return
-        await self.send(text_data=json.dumps({
+            }
+        return {'type': 'buzz_reset_by_host'}
+
+    @staticmethod
+    def _msg_cell_state(event):
+        return {
             'type': 'cell_state_updated',
             'letter': event.get('letter'),
             'state': event.get('state'),
             'cell_index': event.get('cell_index'),
-        }))
+        }
+
+    @staticmethod
+    def _msg_round_won(event):
+        return {
+            'type': 'round_won',
+            'team': event.get('team'),
+            'path': event.get('path', []),
+        }
+
+    @staticmethod
+    def _msg_score_update(event):
+        return {
+            'type': 'scores_updated',
+            'team1_score': event.get('team1_score'),
+            'team2_score': event.get('team2_score')
+        }
+
+    @staticmethod
+    def _msg_letter_selected(event):
+        return {
+            "type": "letter_selected",
+            "letter": event.get("letter"),
+            "cell_index": event.get("cell_index"),
+        }
+
+    # ============ Group broadcasts (called by views/group_send) ============
+    async def broadcast_letters_replace(self, event):
+        if event.get('reset_progress') and getattr(self, 'live', None):
+            self.live.observe_reset()
+        if self.role == 'contestant' and not self.settings_snapshot.get('show_grid_to_contestants'):
+            return
+        await ws_groups.forward(self, event, self._msg_letters_replace)
+
+    async def broadcast_buzz_event(self, event):
+        if self.role == 'contestant':
+            return
+        if event.get('action') not in ('buzz_accepted', 'buzz_unlock', 'buzz_reset'):
+            return
+        await ws_groups.forward(self, event, self._msg_buzz_event)
+
+    async def broadcast_cell_state(self, event):
+        # تغييرات مسار HTTP أو عامل آخر نعكسها على الحالة الحيّة (صدى ما طبّقناه هنا نتجاهله)
+        if not ws_groups.is_echo(event) and getattr(self, 'live', None):
+            self.live.observe_cell(event.get('letter'), event.get('state'), event.get('cell_index'))
+        if self.role == 'contestant' and not self.settings_snapshot.get('show_grid_to_contestants'):
+            return
+        await ws_groups.forward(self, event, self._msg_cell_state)
+
+    async def broadcast_round_won(self, event):
+        await ws_groups.forward(self, event, self._msg_round_won)
 
     async def broadcast_cell_update(self, event):
         # توافق قديم
@@ -102,48 +127,28 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
         - المقدم/شاشة العرض: دائمًا يستقبلون التحديث
         - المتسابق: يستقبل التحديث فقط إذا كان خيار إظهار الخلية للمتسابقين مفعّل
         """
-        if self.role == 'contestant':
-            try:
-                from games.models import GameSettings
-                show = await sync_to_async(
-                    lambda: GameSettings.get_or_create_for_session(self.session).show_grid_to_contestants
-                )()
-                if not show:
-                    return
-            except Exception:
-                return
-
-        await self.send(text_data=json.dumps({
-            'type': 'scores_updated',
-            'team1_score': event.get('team1_score'),
-            'team2_score': event.get('team2_score')
-        }))
+        if not ws_groups.is_echo(event) and getattr(self, 'live', None):
+            self.live.observe_scores(
+                event.get('team1_score'), event.get('team2_score'),
+                event.get('winner'), event.get('is_completed'),
+            )
+        if self.role == 'contestant' and not self.settings_snapshot.get('show_grid_to_contestants'):
+            return
+        await ws_groups.forward(self, event, self._msg_score_update)
 
     async def broadcast_scores(self, event):
         """Alias لاستقبال ما ترسله views.update_scores(type='broadcast_scores')."""
         await self.broadcast_score_update(event)
 
     async def broadcast_letter_selected(self, event):
-        if self.role == 'contestant':
-            try:
-                from games.models import GameSettings
-                show = await sync_to_async(
-                    lambda: GameSettings.get_or_create_for_session(self.session).show_grid_to_contestants
-                )()
-                if show:
-                    await self.send(text_data=json.dumps({
-                        "type": "letter_selected",
-                        "letter": event.get("letter"),
-                        "cell_index": event.get("cell_index"),
-                    }))
-            except Exception:
-                pass
+        if not ws_groups.is_echo(event) and getattr(self, 'live', None):
+            self.live.observe_letter(event.get('letter'))
+        if self.role == 'contestant' and not self.settings_snapshot.get('show_grid_to_contestants'):
             return
-        await self.send(text_data=json.dumps({
-            "type": "letter_selected",
-            "letter": event.get("letter"),
-            "cell_index": event.get("cell_index"),
-        }))
+        await ws_groups.forward(self, event, self._msg_letter_selected)
+
+    async def broadcast_roster_changed(self, event):
+        await ws_groups.forward(self, event, presence.changed_message)
 
     # ============================== Lifecycle ==============================
     async def connect(self):
@@ -152,10 +157,11 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
     
         qs = self._parse_qs()
         self.role = qs.get('role', ['viewer'])[0]
+        self.wire = ws_protocol.negotiate(self.scope)
+        self.rtt_ms = 0.0
     
         # قيمة المؤقت — تُحمّل مرة وحدة وتُحدَّث عند تغيير الإعدادات
         self.buzz_timer = 3
-        self._unlock_task = None
     
         try:
             self.session = await self.get_session()
@@ -163,55 +169,71 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
             await self.close(code=4404)
             return
     
-        if await self._is_session_expired(self.session) or not self.session.is_active:
+        if session_control.is_closed(self.session):
             await self.close(code=4401)
             return
     
-        # حمّل القيمة الحقيقية من الإعدادات
-        try:
-            def _load_timer():
-                from games.models import GameSettings
-                s = GameSettings.get_or_create_for_session(self.session)
-                return max(1, s.buzz_timer_seconds or 3)
-            self.buzz_timer = await sync_to_async(_load_timer)()
-        except Exception:
-            pass
+        # لقطة الإعدادات المشتركة للجلسة — تُحمّل مرة وحدة وتُحدَّث عند تغيير الإعدادات
+        self.settings_snapshot = await live_settings.acquire(self.session)
+        self.buzz_timer = self.settings_snapshot.buzz_timer
     
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        # الحالة الحيّة المشتركة لهذه الجلسة داخل العملية
+        self.live = live_letters.acquire(self.session_id)
+        try:
+            await self.live.ensure_loaded()
+        except Exception as e:
+            logger.error(f"Live state load error for session {self.session_id}: {e}")
+
+        self.roster = presence.acquire(self.session_id)
+
+        await ws_groups.join(self.channel_layer, self.group_name, self.channel_name, self.role)
+        await self.accept(subprotocol=ws_protocol.accept_subprotocol(self.wire))
+        await session_control.watch(self)
     
         if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
+            await self._join_roster(qs.get('name', [''])[0], qs.get('team', [''])[0])
             await self._send_grid_to_contestant_if_enabled()
+        else:
+            await ws_protocol.send(self, await presence.roster_message(self.roster))
     
         logger.info(f"WS connected: session={self.session_id}, role={self.role}, buzz_timer={self.buzz_timer}")
 
 
     async def disconnect(self, close_code):
         try:
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await ws_groups.leave(self.channel_layer, self.group_name, self.channel_name, self.role)
+            await session_control.unwatch(self)
         except Exception:
             pass
+        await self._leave_roster()
+        live = getattr(self, 'live', None)
+        if live is not None:
+            self.live = None
+            try:
+                await live_letters.release(live)
+            except Exception as e:
+                logger.error(f"Live state release error for session {self.session_id}: {e}")
+        if getattr(self, 'settings_snapshot', None) is not None:
+            live_settings.release(self.settings_snapshot)
+            self.settings_snapshot = None
         logger.info(f"WS disconnected: session={self.session_id}, role={self.role}, code={close_code}")
 
     # ============================== Receive ================================
-    async def receive(self, text_data: str):
-        if await self._is_session_expired(self.session) or not self.session.is_active:
-            try:
-                await self.send(text_data=json.dumps({'type': 'error', 'message': 'انتهت صلاحية الجلسة'}))
-            finally:
-                await self.close(code=4401)
-            return
-
-        try:
-            data = json.loads(text_data or "{}")
-        except json.JSONDecodeError:
+    async def receive(self, text_data=None, bytes_data=None):
+        data = ws_protocol.decode(text_data, bytes_data)
+        if data is None:
             return
 
         message_type = data.get('type')
 
         try:
             if message_type == "ping":
-                await self.send(text_data=json.dumps({"type": "pong"}))
+                await self._handle_ping(data)
+                return
+
+            if message_type == "rtt_echo":
+                buzzer.observe_echo(self, data)
                 return
 
             # المتسابق: البازر الفوري
@@ -219,22 +241,29 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
                 await self.handle_contestant_buzz_instant(data)
                 return
 
+            # المتسابق: إعلان الاسم والفريق (قائمة الحضور)
+            if message_type == "contestant_join" and self.role == "contestant":
+                await self._join_roster(data.get("contestant_name"), data.get("team"))
+                return
+
             # المقدم أو شاشة العرض: أوامر وضع بدون مقدم
             if self.role in ("host", "display"):
                 if message_type == "nohost_letter_select":
                     letter = (data.get('letter') or '').strip()
                     if letter:
-                        await self.channel_layer.group_send(self.group_name, {
+                        self.live.select_letter(letter)
+                        await ws_groups.broadcast(self.channel_layer, self.group_name, {
                             "type": "broadcast_letter_selected",
-                            "letter": letter
-                        })
+                            "letter": letter,
+                            "origin": ws_groups.origin(),
+                        }, self._msg_letter_selected)
                     return
                 if message_type == "nohost_question_broadcast":
-                    await self.channel_layer.group_send(self.group_name, {
+                    await ws_groups.broadcast(self.channel_layer, self.group_name, {
                         "type": "broadcast_nohost_question",
                         "letter": data.get("letter"),
                         "question": data.get("question"),
-                    })
+                    }, self._msg_nohost_question, roles=ws_groups.DISPLAY_ONLY)
                     return
                 if message_type == "update_scores":
                     await self.handle_update_scores(data)
@@ -251,24 +280,20 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
                 if message_type == "letter_selected":
                     letter = (data.get('letter') or '').strip()
                     if letter:
-                        await self.channel_layer.group_send(self.group_name, {
+                        self.live.select_letter(letter)
+                        await ws_groups.broadcast(self.channel_layer, self.group_name, {
                             "type": "broadcast_letter_selected",
-                            "letter": letter
-                        })
+                            "letter": letter,
+                            "origin": ws_groups.origin(),
+                        }, self._msg_letter_selected)
                     return
                 if message_type == "penalty_start":
-                    await self.channel_layer.group_send(self.group_name, {
-                        "type": "broadcast_penalty_start",
-                        "team": data.get("team"),
-                        "team_name": data.get("team_name"),
-                        "seconds": data.get("seconds", 10),
-                    })
+                    await self.handle_penalty_start(data)
                     return
                 if message_type == "penalty_end":
-                    await self.channel_layer.group_send(self.group_name, {
-                        "type": "broadcast_penalty_end",
-                        "team": data.get("team"),
-                    })
+                    # إنهاء مبكر من المقدم؛ لو انتهى مؤقت الخادم قبلها فالانتهاء بُث مسبقاً
+                    if timer_wheel.cancel(f"{self.group_name}:penalty"):
+                        await self._end_penalty(self.channel_layer, self.group_name, data.get("team"))
                     return
 
         except Exception as e:
@@ -280,11 +305,13 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
         team = data.get("team")
         timestamp = data.get("timestamp")
     
-        if not contestant_name or team not in ("team1", "team2"):
+        if not presence.clean(contestant_name, team):
             await self._reply_contestant(error="اسم المتسابق والفريق مطلوبان")
             return
+
+        # عميل لم يرسل contestant_join: أول ضغطة تسجّله (ذاكرة فقط)
+        await self._join_roster(contestant_name, team)
     
-        buzz_lock_key = f"buzz_lock_{self.session_id}"
         lock_payload = {
             'name': contestant_name,
             'team': team,
@@ -293,36 +320,39 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
             'method': 'WS',
         }
     
-        # timeout = buzz_timer + 2 (buffer) لضمان عدم انتهاء الـ cache قبل العداد
+        # ttl = buzz_timer + 2 (buffer) لضمان عدم انتهاء القفل قبل العداد
         lock_ttl = self.buzz_timer + 2
     
         try:
-            added = await sync_to_async(cache.add)(buzz_lock_key, lock_payload, timeout=lock_ttl)
-        except Exception:
-            added = False
+            accepted, winner = await buzzer.arbitrate(
+                buzzer.lock_key(self.session_id), lock_payload, self.rtt_ms, lock_ttl
+            )
+        except Exception as e:
+            logger.error(f"Buzzer arbitration error for session {self.session_id}: {e}")
+            accepted, winner = False, None
     
-        if not added:
-            current_buzzer = await sync_to_async(cache.get)(buzz_lock_key) or {}
-            await self._reply_contestant(rejected=f'الزر محجوز من {current_buzzer.get("name", "مشارك")}')
+        if not accepted:
+            await self._reply_contestant(rejected=buzzer.rejection_message(winner))
             return
     
-        await self.ensure_contestant(self.session, contestant_name, team)
         await self._reply_contestant(confirmed=True, name=contestant_name, team=team)
     
         team_display = await self.get_team_display_name(self.session, team)
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_buzz_event',
             'contestant_name': contestant_name,
             'team': team,
             'team_display': team_display,
             'timestamp': timestamp,
             'action': 'buzz_accepted'
-        })
+        }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
     
-        # إلغاء أي task فتح سابق وإنشاء واحد جديد
-        if self._unlock_task and not self._unlock_task.done():
-            self._unlock_task.cancel()
-        self._unlock_task = asyncio.create_task(self._auto_unlock_after_timer())
+        # فتح الزر من عجلة المؤقتات (يستبدل أي فتح سابق لنفس الجلسة)
+        timer_wheel.schedule(
+            f"{self.group_name}:buzz_unlock", self.buzz_timer,
+            self._unlock_buzzer, self.channel_layer, self.group_name, self.session_id, winner['id'],
+            token=winner['id'],
+        )
     
         logger.info(f"INSTANT Buzz: {contestant_name} from {team} in session {self.session_id}, timer={self.buzz_timer}s")
  
@@ -330,52 +360,65 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
 
     async def handle_buzz_reset(self):
         try:
-            buzz_lock_key = f"buzz_lock_{self.session_id}"
-            await sync_to_async(cache.delete)(buzz_lock_key)
-            await self.channel_layer.group_send(self.group_name, {
+            await buzzer.reset_async(buzzer.lock_key(self.session_id))
+            await ws_groups.broadcast(self.channel_layer, self.group_name, {
                 'type': 'broadcast_buzz_event',
                 'action': 'buzz_reset'
-            })
+            }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
         except Exception as e:
             logger.error(f"Error resetting buzzer: {e}")
 
+    async def handle_penalty_start(self, data):
+        try:
+            seconds = max(1, int(data.get("seconds", 10)))
+        except (TypeError, ValueError):
+            seconds = 10
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
+            "type": "broadcast_penalty_start",
+            "team": data.get("team"),
+            "team_name": data.get("team_name"),
+            "seconds": seconds,
+        }, self._msg_penalty_start, roles=ws_groups.DISPLAY_AND_CONTESTANT)
+        # الخادم يضمن بث الانتهاء حتى لو أُغلقت صفحة المقدم
+        timer_wheel.schedule(
+            f"{self.group_name}:penalty", seconds,
+            self._end_penalty, self.channel_layer, self.group_name, data.get("team"),
+        )
+
+    @classmethod
+    async def _end_penalty(cls, channel_layer, group_name, team):
+        await ws_groups.broadcast(channel_layer, group_name, {
+            "type": "broadcast_penalty_end",
+            "team": team,
+        }, cls._msg_penalty_end, roles=ws_groups.DISPLAY_AND_CONTESTANT)
+
     async def handle_update_cell_state(self, data):
         letter = (data.get('letter') or '').strip()
         state = (data.get('state') or '').strip()
-        cell_index = data.get('cell_index')  # ← هنا قبل الدالة
+        cell_index = data.get('cell_index')
 
         if not letter or state not in ('normal', 'team1', 'team2'):
             return
 
-        try:
-            def _update_progress():
-                progress, _ = LettersGameProgress.objects.get_or_create(
-                    session=self.session,
-                    defaults={'cell_states': {}, 'used_letters': []}
-                )
-                if not isinstance(progress.cell_states, dict):
-                    progress.cell_states = {}
-                key = str(cell_index) if cell_index is not None else letter
-                progress.cell_states[key] = state
-
-                if not isinstance(progress.used_letters, list):
-                    progress.used_letters = []
-                if letter not in progress.used_letters:
-                    progress.used_letters.append(letter)
-
-                progress.save(update_fields=['cell_states', 'used_letters'])
+        # في الذاكرة فقط — الكتابة لـ DB تتم على دفعات (live_letters)
+        won = self.live.apply_cell(letter, state, cell_index, self.settings_snapshot.get('grid_size'))
 
-            await sync_to_async(_update_progress)()
-        except Exception as e:
-            logger.error(f"DB update error (cell_state) in session {self.session_id}: {e}")
+        # لكل الأدوار: أي عامل فيه مستهلك للجلسة (ولو متسابقاً فقط) يحدّث نسخته الحيّة،
+        # والمتسابق لا يُرسل الإطار لعميله إن كانت اللوحة مخفية عنه
 
-        cell_index = data.get('cell_index')
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_cell_state',
             'letter': letter,
             'state': state,
             'cell_index': cell_index,
-        })
+            'origin': ws_groups.origin(),
+        }, self._msg_cell_state)
+
+        if won:
+            await ws_groups.broadcast(self.channel_layer, self.group_name, {
+                'type': 'broadcast_round_won',
+                **won,
+            }, self._msg_round_won)
 
     async def handle_update_scores(self, data):
         try:
@@ -384,30 +427,16 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
         except (TypeError, ValueError):
             return
 
-        try:
-            def _update_scores():
-                session = GameSession.objects.select_for_update().get(id=self.session_id)
-                session.team1_score = team1_score
-                session.team2_score = team2_score
-
-                winning_score = 10
-                if session.team1_score >= winning_score and session.team1_score > session.team2_score:
-                    session.winner_team = 'team1'
-                    session.is_completed = True
-                elif session.team2_score >= winning_score and session.team2_score > session.team1_score:
-                    session.winner_team = 'team2'
-                    session.is_completed = True
-                session.save(update_fields=['team1_score', 'team2_score', 'winner_team', 'is_completed'])
-
-            await sync_to_async(_update_scores)()
-        except Exception as e:
-            logger.error(f"DB update error (scores) in session {self.session_id}: {e}")
+        winner_team, is_completed = self.live.apply_scores(team1_score, team2_score)
 
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_score_update',
             'team1_score': team1_score,
-            'team2_score': team2_score
-        })
+            'team2_score': team2_score,
+            'winner': winner_team,
+            'is_completed': is_completed,
+            'origin': ws_groups.origin(),
+        }, self._msg_score_update)
 
     # ============================== Helpers ================================
     async def get_session(self):
@@ -415,19 +444,32 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
             lambda: GameSession.objects.select_related('package').get(id=self.session_id)
         )()
 
-    async def ensure_contestant(self, session, contestant_name, team):
+    async def _join_roster(self, name, team):
+        """حضور المتسابق: تحديث القائمة المشتركة وبث الفرق للمقدم/العرض إن تغيّرت."""
+        member = presence.clean(name, team)
+        roster = getattr(self, 'roster', None)
+        if member is None or roster is None:
+            return
+        diff = await roster.join(self.channel_name, *member)
+        if diff:
+            await ws_groups.broadcast(self.channel_layer, self.group_name, {
+                'type': 'broadcast_roster_changed', **diff
+            }, presence.changed_message, roles=ws_groups.HOST_AND_DISPLAY)
+
+    async def _leave_roster(self):
+        roster = getattr(self, 'roster', None)
+        if roster is None:
+            return
+        self.roster = None
         try:
-            def _ensure():
-                obj = Contestant.objects.filter(session=session, name=contestant_name).first()
-                if obj:
-                    if obj.team != team:
-                        obj.team = team
-                        obj.save(update_fields=['team'])
-                else:
-                    Contestant.objects.create(session=session, name=contestant_name, team=team)
-            await sync_to_async(_ensure)()
+            diff = await roster.leave(self.channel_name)
+            if diff:
+                await ws_groups.broadcast(self.channel_layer, self.group_name, {
+                    'type': 'broadcast_roster_changed', **diff
+                }, presence.changed_message, roles=ws_groups.HOST_AND_DISPLAY)
+            await presence.release(roster)
         except Exception as e:
-            logger.error(f"Error ensuring contestant: {e}")
+            logger.error(f"Roster release error for session {self.session_id}: {e}")
 
     async def get_team_display_name(self, session, team):
         if team == 'team1':
@@ -436,23 +478,22 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
             return session.team2_name
         return 'فريق غير معروف'
 
-    async def _auto_unlock_after_timer(self):
-        """فتح الزر بعد انتهاء المؤقت المحدد في الإعدادات."""
-        try:
-            await asyncio.sleep(self.buzz_timer)
-            buzz_lock_key = f"buzz_lock_{self.session_id}"
-            await sync_to_async(cache.delete)(buzz_lock_key)
-            await self.channel_layer.group_send(self.group_name, {
-                'type': 'broadcast_buzz_event',
-                'action': 'buzz_unlock'
-            })
-        except asyncio.CancelledError:
-            pass  # تم الإلغاء يدوياً — طبيعي
-        except Exception as e:
-            logger.error(f"Auto unlock error for session {self.session_id}: {e}")
+    @classmethod
+    async def _unlock_buzzer(cls, channel_layer, group_name, session_id, winner_id):
+        """فتح الزر بعد انتهاء المؤقت — فقط إن كان القفل ما زال لنفس الضغطة."""
+        key = buzzer.lock_key(session_id)
+        holder = await buzzer.current_holder_async(key)
+        if not holder or holder.get('id') != winner_id:
+            return
+        await buzzer.reset_async(key)
+        await ws_groups.broadcast(channel_layer, group_name, {
+            'type': 'broadcast_buzz_event',
+            'action': 'buzz_unlock'
+        }, cls._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
 
     async def broadcast_settings_update(self, event):
         settings = event.get('settings', {})
+        self.settings_snapshot.apply(settings)
     
         # تحديث المؤقت فورياً بدون قراءة DB
         if 'buzz_timer_seconds' in settings:
@@ -461,31 +502,29 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
             except (ValueError, TypeError):
                 pass
     
-        await self.send(text_data=json.dumps({
-            'type': 'settings_updated',
-            'settings': settings
-        }))
+        await ws_groups.forward(self, event, self._msg_settings_update)
     
         if self.role == 'contestant' and settings.get('show_grid_to_contestants'):
             await self._send_grid_to_contestant_if_enabled()
 
 
-    async def _is_session_expired(self, session: GameSession) -> bool:
-        """
-        التحقق من انتهاء صلاحية الجلسة:
-        - المجاني: ساعة واحدة
-        - المدفوع: لا ينتهي أبداً
-        """
-        if not session.package:
-            return False
-        
-        # المدفوع: لا ينتهي
-        if not session.package.is_free:
-            return False
-        
-        # المجاني: ساعة واحدة
-        expiry_time = session.created_at + timedelta(hours=1)
-        return timezone.now() >= expiry_time
+    async def broadcast_session_deadline(self, event):
+        await session_control.deadline_changed(self, event)
+
+    async def broadcast_session_expired(self, event):
+        try:
+            await ws_protocol.send(self, {'type': 'error', 'message': 'انتهت صلاحية الجلسة'})
+        finally:
+            await self.close(code=4401)
+
+    async def _handle_ping(self, data):
+        pong = {'type': 'pong'}
+        if 't' in data:
+            pong['t'] = data['t']
+        await ws_protocol.send(self, pong)
+        # كل نبضة من المتسابق تجدد قياس RTT (لتعويض البازر) بساعة الخادم
+        if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
 
     def _parse_qs(self):
         try:
@@ -497,90 +536,107 @@ class LettersGameConsumer(AsyncWebsocketConsumer):
 
     async def _reply_contestant(self, confirmed: bool = False, name: str = "", team: str = "", rejected: str = "", error: str = ""):
         if confirmed:
-            await self.send(text_data=json.dumps({
+            await ws_protocol.send(self, {
                 'type': 'buzz_confirmed',
                 'contestant_name': name,
                 'team': team,
                 'message': f'تم تسجيل إجابتك يا {name}!'
-            }))
+            })
             return
         if rejected:
-            await self.send(text_data=json.dumps({
+            await ws_protocol.send(self, {
                 'type': 'buzz_rejected',
                 'message': rejected
-            }))
+            })
             return
         if error:
-            await self.send(text_data=json.dumps({
+            await ws_protocol.send(self, {
                 'type': 'error',
                 'message': error
-            }))
+            })
 
     async def _send_grid_to_contestant_if_enabled(self):
+        # لقطة من الحالة الحيّة تؤخذ داخل الـ event loop (لا نقرأها من thread)
+        board = self.live.board
+        cell_states = dict(self.live.cell_states)
+        team1_score, team2_score = self.live.team1_score, self.live.team2_score
+        settings = self.settings_snapshot
+        if not settings.get('show_grid_to_contestants'):
+            return
         try:
-            def _get_data():
-                from games.models import GameSettings, LettersGameProgress
+            def _get_letters():
                 from games.utils_letters import get_session_order
-
-                settings = GameSettings.get_or_create_for_session(self.session)
-                if not settings.show_grid_to_contestants:
-                    return None
-
-                letters = get_session_order(self.session.id, self.session.package.is_free) or []
-                progress = LettersGameProgress.objects.filter(session=self.session).first()
-                cell_states = progress.cell_states if (progress and isinstance(progress.cell_states, dict)) else {}
-
-                return {
-                    'show_grid': True,
-                    'grid_size': settings.grid_size,
-                    'letters': letters,
-                    'cell_states': cell_states,
-                    'team1_color': settings.team1_color,
-                    'team2_color': settings.team2_color,
-                    'team1_name': settings.team1_name or self.session.team1_name,
-                    'team2_name': settings.team2_name or self.session.team2_name,
-                    'team1_score': self.session.team1_score,
-                    'team2_score': self.session.team2_score,
-                }
-
-            data = await sync_to_async(_get_data)()
-            if data:
-                await self.send(text_data=json.dumps({
-                    'type': 'grid_state',
-                    **data
-                }))
+                return get_session_order(self.session.id, self.session.package.is_free) or []
+
+            letters = await sync_to_async(_get_letters)()
+            data = {
+                'show_grid': True,
+                'grid_size': settings.get('grid_size'),
+                'letters': letters,
+                # خلايا بمفاتيح الحروف فقط (صفوف قديمة) تُدمج في اللوحة بترتيب حروف الجلسة
+                'board': list(hexboard.merge_letters(board, cell_states, letters)),
+                'team1_color': settings.get('team1_color'),
+                'team2_color': settings.get('team2_color'),
+                'team1_name': settings.get('team1_name') or self.session.team1_name,
+                'team2_name': settings.get('team2_name') or self.session.team2_name,
+                'team1_score': team1_score,
+                'team2_score': team2_score,
+            }
+            await ws_protocol.send(self, {
+                'type': 'grid_state',
+                **data
+            })
         except Exception as e:
             logger.error(f'Error sending grid to contestant: {e}')
     
 
-    async def broadcast_penalty_start(self, event):
-        if self.role == 'host':
-            return
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_settings_update(event):
+        return {
+            'type': 'settings_updated',
+            'settings': event.get('settings', {})
+        }
+
+    @staticmethod
+    def _msg_penalty_start(event):
+        return {
             'type': 'penalty_start',
             'team': event.get('team'),
             'team_name': event.get('team_name'),
             'seconds': event.get('seconds', 10),
-        }))
+        }
+
+    @staticmethod
+    def _msg_penalty_end(event):
+        return {
+            'type': 'penalty_end',
+            'team': event.get('team'),
+        }
+
+    @staticmethod
+    def _msg_nohost_question(event):
+        return {
+            'type': 'nohost_question',
+            'letter': event.get('letter'),
+            'question': event.get('question'),
+        }
+
+    async def broadcast_penalty_start(self, event):
+        if self.role == 'host':
+            return
+        await ws_groups.forward(self, event, self._msg_penalty_start)
 
     async def broadcast_penalty_end(self, event):
         if self.role == 'host':
             return
-        await self.send(text_data=json.dumps({
-            'type': 'penalty_end',
-            'team': event.get('team'),
-        }))
+        await ws_groups.forward(self, event, self._msg_penalty_end)
 
     
     async def broadcast_nohost_question(self, event):
         """بث السؤال لشاشات العرض الأخرى — لا نرسل للمقدم ولا للمتسابقين"""
         if self.role in ('host', 'contestant'):
             return
-        await self.send(text_data=json.dumps({
-            'type': 'nohost_question',
-            'letter': event.get('letter'),
-            'question': event.get('question'),
-        }))
+        await ws_groups.forward(self, event, self._msg_nohost_question)
 
 
         
@@ -604,7 +660,7 @@ from django.core.cache import cache
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 
-from games.models import GameSession, Contestant, PictureRiddle, PictureGameProgress
+from games.models import GameSession, PictureRiddle, PictureGameProgress
 
 logger = logging.getLogger('games')
 
@@ -616,6 +672,7 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
     - المقدم: تنقّل/تعيين/تحديث نقاط/Reset للبازر.
     - العرض: يستقبل الصورة الحالية + إشعارات البازر + النقاط.
     - نقبل الاتصال أولاً ثم نجلب البيانات لتفادي فشل الـhandshake.
+    - تغيّر الصورة مرقّم (event_log): العائد بـ ?since=<آخر seq> يأخذ ما فاته فقط بدل اللقطة.
     """
 
     async def connect(self):
@@ -624,9 +681,12 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
 
         self.role = self._parse_qs().get('role', ['viewer'])[0]
 
+        self.wire = ws_protocol.negotiate(self.scope)
+
+        self.rtt_ms = 0.0
+
         # مؤقت الزر — يُحمّل مرة وتُحدَّث عند تغيير الإعدادات
         self.buzz_timer = 3
-        self._unlock_task = None
 
         try:
             self.session = await self._get_session()
@@ -634,77 +694,76 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             await self.close(code=4404)
             return
 
-        if await self._is_session_expired(self.session) or not self.session.is_active:
+        if session_control.is_closed(self.session):
             await self.close(code=4401)
             return
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        self.roster = presence.acquire(self.session_id)
+
+        await ws_groups.join(self.channel_layer, self.group_name, self.channel_name, self.role)
+        await self.accept(subprotocol=ws_protocol.accept_subprotocol(self.wire))
+        await session_control.watch(self)
         logger.info(f"WS connected (images): session={self.session_id}, role={self.role}")
 
-        # حمّل القيمة الحقيقية من الإعدادات
-        try:
-            def _load_timer():
-                from games.models import GameSettings
-                s = GameSettings.get_or_create_for_session(self.session)
-                return max(1, s.buzz_timer_seconds or 3)
-            self.buzz_timer = await sync_to_async(_load_timer)()
-        except Exception:
-            pass
+        if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
+            qs = self._parse_qs()
+            await self._join_roster(qs.get('name', [''])[0], qs.get('team', [''])[0])
+        elif self.role in ('host', 'display'):
+            await ws_protocol.send(self, await presence.roster_message(self.roster))
 
-        self.riddles = []
-        try:
-            self.riddles = await sync_to_async(lambda: list(
-                PictureRiddle.objects.filter(package=self.session.package)
-                .order_by('order')
-                .values('order', 'image_url', 'hint', 'answer')
-            ))()
-        except Exception as e:
-            logger.error(f'Pics: failed to load riddles for {self.session_id}: {e}')
+        # لقطة الإعدادات المشتركة للجلسة
+        self.settings_snapshot = await live_settings.acquire(self.session)
+        self.buzz_timer = self.settings_snapshot.buzz_timer
 
-        self.current_index, self.total = 1, max(1, len(self.riddles) or 1)
-        try:
-            self.current_index, self.total = await self._ensure_progress_bounds()
-        except Exception as e:
-            logger.error(f'Pics: ensure progress failed for {self.session_id}: {e}')
+        # الألغاز تُحمَّل عند أول حاجة (لقطة/تنقّل) — العائد بـ ?since والمتسابق لا يحتاجانها
+        self.riddles = None
+        self.current_index = 1
 
+        # العائد بـ ?since يأخذ ما فاته فقط؛ اللقطة الكاملة (الألغاز + حدود التقدم) إن تعذّر ذلك
         if self.role in ('host', 'display'):
-            await self._send_puzzle_state()
-
-
-            
+            if not await ws_groups.resume(self, event_log.parse_since(self._parse_qs())):
+                await self._load_riddles()
+                try:
+                    self.current_index, _ = await self._ensure_progress_bounds()
+                except Exception as e:
+                    logger.error(f'Pics: ensure progress failed for {self.session_id}: {e}')
+                await self._send_puzzle_state()
 
     async def disconnect(self, code):
         try:
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await ws_groups.leave(self.channel_layer, self.group_name, self.channel_name, self.role)
+            await session_control.unwatch(self)
         except Exception:
             pass
-
-    async def receive(self, text_data: str):
-        # إنهاء أنيق لو انتهت الجلسة
-        if await self._is_session_expired(self.session) or not self.session.is_active:
-            try:
-                await self.send(text_data=json.dumps({'type': 'error', 'message': 'انتهت صلاحية الجلسة'}))
-            finally:
-                await self.close(code=4401)
-            return
-
-        try:
-            data = json.loads(text_data or '{}')
-        except json.JSONDecodeError:
+        await self._leave_roster()
+        if getattr(self, 'settings_snapshot', None) is not None:
+            live_settings.release(self.settings_snapshot)
+            self.settings_snapshot = None
+
+    async def receive(self, text_data=None, bytes_data=None):
+        data = ws_protocol.decode(text_data, bytes_data)
+        if data is None:
             return
 
         t = data.get('type')
 
         # keep-alive
         if t == 'ping':
-            await self.send(text_data=json.dumps({'type': 'pong'}))
+            await self._handle_ping(data)
+            return
+
+        if t == 'rtt_echo':
+            buzzer.observe_echo(self, data)
             return
 
         # المتسابق
         if t == 'contestant_buzz' and self.role == 'contestant':
             await self._handle_buzz(data)
             return
+        if t == 'contestant_join' and self.role == 'contestant':
+            await self._join_roster(data.get('contestant_name'), data.get('team'))
+            return
 
         # المقدم
         if self.role == 'host':
@@ -733,7 +792,7 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
     async def _handle_nav(self, dir_):
         if dir_ not in ('next', 'prev'):
             return
-        total = max(1, len(self.riddles) or 1)
+        total = max(1, len(await self._load_riddles()) or 1)
 
         def _upd():
             prog = PictureGameProgress.objects.select_for_update().get(session=self.session)
@@ -752,7 +811,7 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             idx = int(index)
         except (TypeError, ValueError):
             return
-        total = max(1, len(self.riddles) or 1)
+        total = max(1, len(await self._load_riddles()) or 1)
 
         def _upd():
             prog = PictureGameProgress.objects.select_for_update().get(session=self.session)
@@ -784,10 +843,10 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             logger.error(f'Pics scores DB error: {e}')
             return
 
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_score_update',
             'team1_score': t1f, 'team2_score': t2f
-        })
+        }, self._msg_score_update, roles=ws_groups.HOST_AND_DISPLAY)
 
     # --------------------- handlers: buzzer ---------------------
     async def _handle_buzz(self, data):
@@ -795,93 +854,122 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
         team = data.get('team')
         timestamp = data.get('timestamp')
     
-        if not name or team not in ('team1', 'team2'):
+        if not presence.clean(name, team):
             await self._reply_contestant(error='اسم المتسابق والفريق مطلوبان')
             return
+
+        await self._join_roster(name, team)
     
-        key = f'buzz_lock_{self.session_id}'
         payload = {'name': name, 'team': team, 'timestamp': timestamp,
                 'session_id': self.session_id, 'method': 'WS'}
     
         lock_ttl = self.buzz_timer + 2  # buffer
     
         try:
-            added = await sync_to_async(cache.add)(key, payload, timeout=lock_ttl)
-        except Exception:
-            added = False
+            accepted, winner = await buzzer.arbitrate(
+                buzzer.lock_key(self.session_id), payload, self.rtt_ms, lock_ttl
+            )
+        except Exception as e:
+            logger.error(f'Pics buzzer arbitration error: {e}')
+            accepted, winner = False, None
     
-        if not added:
-            cur = await sync_to_async(cache.get)(key) or {}
-            await self._reply_contestant(rejected=f'الزر محجوز من {cur.get("name","مشارك")}')
+        if not accepted:
+            await self._reply_contestant(rejected=buzzer.rejection_message(winner))
             return
     
-        await self._ensure_contestant(name, team)
         await self._reply_contestant(confirmed=True, name=name, team=team)
     
         team_display = self.session.team1_name if team == 'team1' else self.session.team2_name
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_buzz_event',
             'contestant_name': name, 'team': team,
             'team_display': team_display, 'timestamp': timestamp,
             'action': 'buzz_accepted'
-        })
+        }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
     
-        if self._unlock_task and not self._unlock_task.done():
-            self._unlock_task.cancel()
-        self._unlock_task = asyncio.create_task(self._auto_unlock_after_timer())
+        timer_wheel.schedule(
+            f"{self.group_name}:buzz_unlock", self.buzz_timer,
+            self._unlock_buzzer, self.channel_layer, self.group_name, self.session_id, winner['id'],
+            token=winner['id'],
+        )
 
 
     async def _handle_buzz_reset(self):
         try:
-            await sync_to_async(cache.delete)(f'buzz_lock_{self.session_id}')
-            await self.channel_layer.group_send(self.group_name, {
+            await buzzer.reset_async(buzzer.lock_key(self.session_id))
+            await ws_groups.broadcast(self.channel_layer, self.group_name, {
                 'type': 'broadcast_buzz_event', 'action': 'buzz_reset'
-            })
+            }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
         except Exception as e:
             logger.error(f'Pics buzz reset error: {e}')
 
-    # --------------------- group handlers ---------------------
-    async def broadcast_buzz_event(self, event):
+    # --------------------- client messages ---------------------
+    @staticmethod
+    def _msg_buzz_event(event):
         action = event.get('action')
-        if self.role == 'contestant':
-            return
         if action == 'buzz_accepted':
-            await self.send(text_data=json.dumps({
+            return {
                 'type': 'contestant_buzz_accepted',
                 'contestant_name': event.get('contestant_name'),
                 'team': event.get('team'),
                 'team_display': event.get('team_display'),
                 'timestamp': event.get('timestamp'),
                 'start_countdown': True
-            }))
-        elif action == 'buzz_unlock':
-            await self.send(text_data=json.dumps({'type': 'buzz_unlocked'}))
-        elif action == 'buzz_reset':
-            await self.send(text_data=json.dumps({'type': 'buzz_reset_by_host'}))
+            }
+        if action == 'buzz_unlock':
+            return {'type': 'buzz_unlocked'}
+        return {'type': 'buzz_reset_by_host'}
 
-    async def broadcast_score_update(self, event):
-        if self.role == 'contestant':
-            return
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_score_update(event):
+        return {
             'type': 'scores_updated',
             'team1_score': event.get('team1_score'),
             'team2_score': event.get('team2_score'),
-        }))
-
-    async def broadcast_scores(self, event):
-        await self.broadcast_score_update(event)
+        }
 
-    async def broadcast_puzzle_state(self, event):
-        if self.role == 'contestant':
-            return
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_puzzle_state(event):
+        return {
             'type': 'puzzle_updated',
+            'seq': event.get('seq'),
             'index': event.get('index'),
             'total': event.get('total'),
             'image_url': event.get('image_url'),
             'hint': event.get('hint'),
             'answer': event.get('answer'),
-        }))
+        }
+
+    @staticmethod
+    def _msg_settings_update(event):
+        return {
+            'type': 'settings_updated',
+            'settings': event.get('settings', {}),
+        }
+
+    # --------------------- group handlers ---------------------
+    async def broadcast_buzz_event(self, event):
+        if self.role == 'contestant':
+            return
+        if event.get('action') not in ('buzz_accepted', 'buzz_unlock', 'buzz_reset'):
+            return
+        await ws_groups.forward(self, event, self._msg_buzz_event)
+
+    async def broadcast_score_update(self, event):
+        if self.role == 'contestant':
+            return
+        await ws_groups.forward(self, event, self._msg_score_update)
+
+    async def broadcast_scores(self, event):
+        await self.broadcast_score_update(event)
+
+    async def broadcast_puzzle_state(self, event):
+        if self.role == 'contestant':
+            return
+        await ws_groups.forward(self, event, self._msg_puzzle_state)
+
+    async def broadcast_roster_changed(self, event):
+        await ws_groups.forward(self, event, presence.changed_message)
 
     async def broadcast_image_index(self, event):
         if self.role == 'contestant':
@@ -891,38 +979,58 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
         except (TypeError, ValueError):
             idx = 1
 
-        total = max(1, len(self.riddles) or int(event.get('count') or 1))
+        riddles = await self._load_riddles()
+        total = max(1, len(riddles) or int(event.get('count') or 1))
         idx = max(1, min(idx, total))
-        r = self.riddles[idx - 1] if 1 <= idx <= len(self.riddles) else {'image_url': '', 'hint': '', 'answer': ''}
+        r = riddles[idx - 1] if 1 <= idx <= len(riddles) else {'image_url': '', 'hint': '', 'answer': ''}
 
-        await self.send(text_data=json.dumps({
+        await ws_protocol.send(self, {
             'type': 'puzzle_updated',
             'index': idx,
-            'total': len(self.riddles) or total,
+            'total': len(riddles) or total,
             'image_url': r.get('image_url') or '',
             'hint': r.get('hint') or '',
             'answer': r.get('answer') or '',
-        }))
+        })
 
     # --------------------- helpers ---------------------
     async def _send_puzzle_state(self):
+        # seq قبل قراءة الصورة: اللقطة لا تكون أقدم من الرقم الذي تحمله
+        seq = await sync_to_async(event_log.current_seq)(self.group_name)
         idx = await self._get_current_index()
-        payload = self._state_payload(idx)
-        await self.send(text_data=json.dumps({'type': 'puzzle_updated', **payload}))
+        await ws_protocol.send(self, self._msg_puzzle_state({
+            'seq': seq, **self._state_payload(idx)
+        }))
 
     async def _broadcast_puzzle_state(self):
         idx = await self._get_current_index()
-        payload = self._state_payload(idx)
-        await self.channel_layer.group_send(self.group_name, {'type': 'broadcast_puzzle_state', **payload})
+        await self._load_riddles()
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
+            'type': 'broadcast_puzzle_state', **self._state_payload(idx)
+        }, self._msg_puzzle_state, roles=ws_groups.HOST_AND_DISPLAY, sequenced=True)
+
+    async def _load_riddles(self):
+        if self.riddles is None:
+            try:
+                self.riddles = await sync_to_async(lambda: list(
+                    PictureRiddle.objects.filter(package=self.session.package)
+                    .order_by('order')
+                    .values('order', 'image_url', 'hint', 'answer')
+                ))()
+            except Exception as e:
+                logger.error(f'Pics: failed to load riddles for {self.session_id}: {e}')
+                return []
+        return self.riddles
 
     def _state_payload(self, idx: int):
-        if 1 <= idx <= len(self.riddles):
-            r = self.riddles[idx - 1]
+        riddles = self.riddles or []
+        if 1 <= idx <= len(riddles):
+            r = riddles[idx - 1]
         else:
             r = {'image_url': '', 'hint': '', 'answer': ''}
         return {
             'index': max(1, idx),
-            'total': max(1, len(self.riddles) or 1),
+            'total': max(1, len(riddles) or 1),
             'image_url': r.get('image_url') or '',
             'hint': (r.get('hint') or ''),
             'answer': (r.get('answer') or ''),
@@ -939,7 +1047,7 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             obj, _ = PictureGameProgress.objects.get_or_create(
                 session=self.session, defaults={'current_index': 1}
             )
-            total = max(1, len(self.riddles) or 1)
+            total = max(1, len(self.riddles or []) or 1)
             if obj.current_index < 1 or obj.current_index > total:
                 obj.current_index = 1
                 obj.save(update_fields=['current_index'])
@@ -951,48 +1059,63 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             lambda: GameSession.objects.select_related('package').get(id=self.session_id)
         )()
 
-    async def _ensure_contestant(self, name, team):
-        def _ensure():
-            obj = Contestant.objects.filter(session=self.session, name=name).first()
-            if obj:
-                if obj.team != team:
-                    obj.team = team
-                    obj.save(update_fields=['team'])
-            else:
-                Contestant.objects.create(session=self.session, name=name, team=team)
-        await sync_to_async(_ensure)()
-
-    async def _auto_unlock_after_timer(self):
-        """فتح الزر بعد انتهاء المؤقت."""
+    async def _join_roster(self, name, team):
+        member = presence.clean(name, team)
+        roster = getattr(self, 'roster', None)
+        if member is None or roster is None:
+            return
+        diff = await roster.join(self.channel_name, *member)
+        if diff:
+            await ws_groups.broadcast(self.channel_layer, self.group_name, {
+                'type': 'broadcast_roster_changed', **diff
+            }, presence.changed_message, roles=ws_groups.HOST_AND_DISPLAY)
+
+    async def _leave_roster(self):
+        roster = getattr(self, 'roster', None)
+        if roster is None:
+            return
+        self.roster = None
         try:
-            await asyncio.sleep(self.buzz_timer)
-            await sync_to_async(cache.delete)(f'buzz_lock_{self.session_id}')
-            await self.channel_layer.group_send(self.group_name, {
-                'type': 'broadcast_buzz_event', 'action': 'buzz_unlock'
-            })
-        except asyncio.CancelledError:
-            pass
+            diff = await roster.leave(self.channel_name)
+            if diff:
+                await ws_groups.broadcast(self.channel_layer, self.group_name, {
+                    'type': 'broadcast_roster_changed', **diff
+                }, presence.changed_message, roles=ws_groups.HOST_AND_DISPLAY)
+            await presence.release(roster)
         except Exception as e:
-            logger.error(f'auto unlock error: {e}')
+            logger.error(f'Pics roster release error: {e}')
+
+    @classmethod
+    async def _unlock_buzzer(cls, channel_layer, group_name, session_id, winner_id):
+        """فتح الزر بعد انتهاء المؤقت — فقط إن كان القفل ما زال لنفس الضغطة."""
+        key = buzzer.lock_key(session_id)
+        holder = await buzzer.current_holder_async(key)
+        if not holder or holder.get('id') != winner_id:
+            return
+        await buzzer.reset_async(key)
+        await ws_groups.broadcast(channel_layer, group_name, {
+            'type': 'broadcast_buzz_event', 'action': 'buzz_unlock'
+        }, cls._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
  
 
 
-    async def _is_session_expired(self, session: GameSession) -> bool:
-        """
-        التحقق من انتهاء صلاحية الجلسة:
-        - المجاني: ساعة واحدة
-        - المدفوع: لا ينتهي أبداً
-        """
-        if not session.package:
-            return False
-        
-        # المدفوع: لا ينتهي
-        if not session.package.is_free:
-            return False
-        
-        # المجاني: ساعة واحدة
-        expiry_time = session.created_at + timedelta(hours=1)
-        return timezone.now() >= expiry_time
+    async def broadcast_session_deadline(self, event):
+        await session_control.deadline_changed(self, event)
+
+    async def broadcast_session_expired(self, event):
+        try:
+            await ws_protocol.send(self, {'type': 'error', 'message': 'انتهت صلاحية الجلسة'})
+        finally:
+            await self.close(code=4401)
+
+    async def _handle_ping(self, data):
+        pong = {'type': 'pong'}
+        if 't' in data:
+            pong['t'] = data['t']
+        await ws_protocol.send(self, pong)
+        # كل نبضة من المتسابق تجدد قياس RTT (لتعويض البازر) بساعة الخادم
+        if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
 
     def _parse_qs(self):
         try:
@@ -1036,14 +1159,16 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             logger.error(f'Pics settings save error: {e}')
             return
 
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_settings_update',
             'settings': saved,
-        })
+        }, self._msg_settings_update)
 
     async def broadcast_settings_update(self, event):
         """يبث الإعدادات لجميع المتصلين"""
         settings = event.get('settings', {})
+        if getattr(self, 'settings_snapshot', None) is not None:
+            self.settings_snapshot.apply(settings)
 
         # تحديث المؤقت فورياً
         if 'buzz_timer_seconds' in settings:
@@ -1052,24 +1177,21 @@ class PicturesGameConsumer(AsyncWebsocketConsumer):
             except (ValueError, TypeError):
                 pass
 
-        await self.send(text_data=json.dumps({
-            'type': 'settings_updated',
-            'settings': settings,
-        }))
+        await ws_groups.forward(self, event, self._msg_settings_update)
 
 
     async def _reply_contestant(self, confirmed=False, name="", team="", rejected="", error=""):
         if confirmed:
-            await self.send(text_data=json.dumps({
+            await ws_protocol.send(self, {
                 'type': 'buzz_confirmed', 'contestant_name': name, 'team': team,
                 'message': f'تم تسجيل إجابتك يا {name}!'
-            }))
+            })
             return
         if rejected:
-            await self.send(text_data=json.dumps({'type': 'buzz_rejected', 'message': rejected}))
+            await ws_protocol.send(self, {'type': 'buzz_rejected', 'message': rejected})
             return
         if error:
-            await self.send(text_data=json.dumps({'type': 'error', 'message': error}))
+            await ws_protocol.send(self, {'type': 'error', 'message': error})
 
 
 
@@ -1103,7 +1225,8 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
     - host: يتحكم بالصورة (next/prev/set_index) + إدارة المؤقّت (start/pause/reset).
     - display: يستقبل الصورة + حالة المؤقّتين ويعرضها.
     - contestant: يستقبل الصورة + حالة المؤقّتين؛ وعنده زر "جوّبت" يرسل stop&switch.
-    منطق الوقت مثل ساعة الشطرنج: side A/B.
+    منطق الوقت مثل ساعة الشطرنج: side A/B — الساعة في الذاكرة (live_time) والحفظ لـ DB على دفعات؛
+    كل عامل يطبّق إطارات timer_state القادمة من غيره على نسخته.
     """
 
     # --------------- Lifecycle ---------------
@@ -1111,6 +1234,7 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.group_name = f"time_session_{self.session_id}"
         self.role = self._parse_qs().get('role', ['viewer'])[0]
+        self.wire = ws_protocol.negotiate(self.scope)
 
         try:
             self.session = await self._get_session()
@@ -1118,61 +1242,69 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
             await self.close(code=4404)
             return
 
-        if await self._is_session_expired(self.session) or not self.session.is_active:
+        if session_control.is_closed(self.session):
             await self.close(code=4401)
             return
 
+        self.clock = live_time.acquire(self.session_id)
+
         # اقبل الاتصال أولًا
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await ws_groups.join(self.channel_layer, self.group_name, self.channel_name, self.role)
+        await self.accept(subprotocol=ws_protocol.accept_subprotocol(self.wire))
+        await session_control.watch(self)
         tlogger.info(f"WS connected (time): session={self.session_id}, role={self.role}")
 
-        # حمّل الألغاز المرتبطة بالحزمة
-        self.riddles = []
-        try:
-            self.riddles = await sync_to_async(lambda: list(
-                TimeRiddle.objects.filter(package=self.session.package)
-                .order_by('order')
-                .values('order', 'image_url', 'hint', 'answer')
-            ))()
-        except Exception as e:
-            tlogger.error(f"time: failed loading riddles for {self.session_id}: {e}")
-
-        # تأكد من وجود progress وضبط الحدود
+        # الألغاز تُحمَّل مرة واحدة مع الساعة — إعادة الاتصال لا تعيد الاستعلام
+        if self.clock.riddles is None:
+            try:
+                self.clock.riddles = await sync_to_async(lambda: list(
+                    TimeRiddle.objects.filter(package=self.session.package)
+                    .order_by('order')
+                    .values('order', 'image_url', 'hint', 'answer')
+                ))()
+            except Exception as e:
+                tlogger.error(f"time: failed loading riddles for {self.session_id}: {e}")
+        self.riddles = self.clock.riddles or []
+
+        # حمّل الساعة من آخر نقطة حفظ (مرة واحدة لكل جلسة داخل العملية)
         try:
-            await self._ensure_progress_bounds()
+            await self.clock.ensure_loaded(total=len(self.riddles))
         except Exception as e:
-            tlogger.error(f"time: ensure progress failed for {self.session_id}: {e}")
+            tlogger.error(f"time: clock load failed for {self.session_id}: {e}")
+        # مؤقتات العجلة عند مالك الساعة وحده (العامل الذي طبّق آخر تغيير)
+        if self.clock.is_owner and not timer_wheel.pending(self._clock_timer(self.clock, self.group_name, 'flag')):
+            self._arm_clock(self.clock, self.channel_layer, self.group_name)
 
-        # أرسل الحالة الأولية (صورة + مؤقتين)
-        await self._send_puzzle_state()
+        # الصورة: العائد بـ ?since يأخذ ما فاته فقط؛ المؤقتان دائماً من الساعة الآن (القديم منها تجاوزه الوقت)
+        if not await ws_groups.resume(self, event_log.parse_since(self._parse_qs())):
+            await self._send_puzzle_state()
         await self._send_timer_state()
 
     async def disconnect(self, code):
         try:
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await ws_groups.leave(self.channel_layer, self.group_name, self.channel_name, self.role)
+            await session_control.unwatch(self)
         except Exception:
-            pass
-
-    # --------------- Receive ---------------
-    async def receive(self, text_data: str):
-        if await self._is_session_expired(self.session) or not self.session.is_active:
+            pass
+        clock = getattr(self, 'clock', None)
+        if clock is not None:
+            self.clock = None
             try:
-                await self.send(text_data=json.dumps({'type': 'error', 'message': 'انتهت صلاحية الجلسة'}))
-            finally:
-                await self.close(code=4401)
-            return
+                await live_time.release(clock)
+            except Exception as e:
+                tlogger.error(f"time: clock release error for {self.session_id}: {e}")
 
-        try:
-            data = json.loads(text_data or '{}')
-        except json.JSONDecodeError:
+    # --------------- Receive ---------------
+    async def receive(self, text_data=None, bytes_data=None):
+        data = ws_protocol.decode(text_data, bytes_data)
+        if data is None:
             return
 
         t = data.get('type')
 
         # keep alive
         if t == 'ping':
-            await self.send(text_data=json.dumps({'type': 'pong'}))
+            await self._handle_ping(data)
             return
 
         # المتسابق: أوقف وقتي وبدّل للخصم
@@ -1210,18 +1342,8 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
     async def _handle_nav(self, dir_):
         if dir_ not in ('next', 'prev'):
             return
-        total = max(1, len(self.riddles) or 1)
-
-        def _upd():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-            if dir_ == 'next':
-                prog.current_index = min(prog.current_index + 1, total)
-            else:
-                prog.current_index = max(prog.current_index - 1, 1)
-            prog.save(update_fields=['current_index'])
-            return prog.current_index
-
-        await sync_to_async(_upd)()
+        step = 1 if dir_ == 'next' else -1
+        self.clock.set_index(self.clock.current_index + step, len(self.riddles))
         await self._broadcast_puzzle_state()
 
     async def _handle_set_index(self, index):
@@ -1229,176 +1351,112 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
             idx = int(index)
         except (TypeError, ValueError):
             return
-        total = max(1, len(self.riddles) or 1)
-
-        def _upd():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-            prog.current_index = max(1, min(idx, total))
-            prog.save(update_fields=['current_index'])
-            return prog.current_index
-
-        await sync_to_async(_upd)()
+        self.clock.set_index(idx, len(self.riddles))
         await self._broadcast_puzzle_state()
 
     # --------------- Handlers: Timer Core ---------------
+    # كل أمر يُطبَّق على الساعة في الذاكرة (بدون await) ثم يُبث ويُعاد ضبط مؤقتات العجلة
     async def _handle_timer_start(self, side):
-        if side not in ('A', 'B'):
+        if not self.clock.start(side):
             return
-
-        now = timezone.now()
-
-        def _start():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-            # لو كان يجري، نخصم أولًا
-            if prog.is_running and prog.active_side in ('A', 'B') and prog.last_started_at:
-                elapsed = (now - prog.last_started_at).total_seconds()
-                if prog.active_side == 'A':
-                    prog.a_time_left_seconds = max(0, int(prog.a_time_left_seconds - elapsed))
-                else:
-                    prog.b_time_left_seconds = max(0, int(prog.b_time_left_seconds - elapsed))
-
-            # ابدأ الجانب المطلوب إن بقي وقت
-            if side == 'A' and prog.a_time_left_seconds > 0:
-                prog.active_side = 'A'; prog.is_running = True; prog.last_started_at = now
-            elif side == 'B' and prog.b_time_left_seconds > 0:
-                prog.active_side = 'B'; prog.is_running = True; prog.last_started_at = now
-            else:
-                # لا يوجد وقت متبقٍ لهذا الجانب
-                prog.is_running = False
-                prog.active_side = None
-                prog.last_started_at = None
-
-            prog.save(update_fields=[
-                'a_time_left_seconds', 'b_time_left_seconds',
-                'active_side', 'is_running', 'last_started_at'
-            ])
-
-        await sync_to_async(_start)()
-        await self._broadcast_timer_state()
+        await self._clock_changed()
 
     async def _handle_timer_pause(self):
-        now = timezone.now()
-
-        def _pause():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-            if prog.is_running and prog.active_side in ('A', 'B') and prog.last_started_at:
-                elapsed = (now - prog.last_started_at).total_seconds()
-                if prog.active_side == 'A':
-                    prog.a_time_left_seconds = max(0, int(prog.a_time_left_seconds - elapsed))
-                else:
-                    prog.b_time_left_seconds = max(0, int(prog.b_time_left_seconds - elapsed))
-            prog.is_running = False
-            prog.last_started_at = None
-            prog.save(update_fields=[
-                'a_time_left_seconds', 'b_time_left_seconds',
-                'is_running', 'last_started_at'
-            ])
-
-        await sync_to_async(_pause)()
-        await self._broadcast_timer_state()
+        self.clock.pause()
+        await self._clock_changed()
 
     async def _handle_timer_reset(self, seconds_each, start_side, a_name, b_name):
-        now = timezone.now()
-        seconds_each = max(1, int(seconds_each))
-        start_side = 'A' if start_side != 'B' else 'B'
-
-        def _reset():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-            prog.a_time_left_seconds = seconds_each
-            prog.b_time_left_seconds = seconds_each
-            prog.player_a_name = a_name or prog.player_a_name or ""
-            prog.player_b_name = b_name or prog.player_b_name or ""
-            prog.active_side = start_side
-            prog.is_running = True
-            prog.last_started_at = now
-            prog.save(update_fields=[
-                'a_time_left_seconds', 'b_time_left_seconds',
-                'player_a_name', 'player_b_name',
-                'active_side', 'is_running', 'last_started_at'
-            ])
-
-        await sync_to_async(_reset)()
-        await self._broadcast_timer_state()
+        self.clock.reset(seconds_each, start_side, a_name, b_name)
+        await self._clock_changed()
 
     async def _handle_contestant_stop_and_switch(self, side, name):
         """
-        المتسابق على الجانب (A/B) يضغط: نخصم وقته منذ آخر تشغيل → نوقفه → نبدّل للخصم ويبدأ من رصيده الحالي.
+        المتسابق على الجانب (A/B) يضغط: نخصم وقته حتى لحظة الاستلام → نوقفه → نبدّل للخصم ويبدأ من رصيده الحالي.
         """
         if side not in ('A', 'B'):
             await self._reply(error='Side غير صحيح')
             return
 
-        now = timezone.now()
-
-        def _stop_and_switch():
-            prog = TimeGameProgress.objects.select_for_update().get(session=self.session)
-
-            # حفظ الاسم اختياريًا (لو أرسله أول مرة)
-            if side == 'A' and name and not prog.player_a_name:
-                prog.player_a_name = name
-            if side == 'B' and name and not prog.player_b_name:
-                prog.player_b_name = name
-
-            # يجب أن يكون الدور للـside نفسه وهو يجري
-            if not prog.is_running or prog.active_side != side or not prog.last_started_at:
-                return False, prog
-
-            # خصم الوقت المنقضي
-            elapsed = (now - prog.last_started_at).total_seconds()
-            if side == 'A':
-                prog.a_time_left_seconds = max(0, int(prog.a_time_left_seconds - elapsed))
-            else:
-                prog.b_time_left_seconds = max(0, int(prog.b_time_left_seconds - elapsed))
-
-            # إنتهى وقت هذا الجانب؟
-            if (side == 'A' and prog.a_time_left_seconds <= 0) or (side == 'B' and prog.b_time_left_seconds <= 0):
-                prog.is_running = False
-                prog.active_side = None
-                prog.last_started_at = None
-                prog.save(update_fields=[
-                    'a_time_left_seconds','b_time_left_seconds','is_running','active_side','last_started_at',
-                    'player_a_name','player_b_name'
-                ])
-                return True, prog
-
-            # بدّل للخصم وابدأ فورًا من رصيده الحالي
-            next_side = 'B' if side == 'A' else 'A'
-            # لو الخصم وقته صفر، نوقف اللعبة
-            if (next_side == 'A' and prog.a_time_left_seconds <= 0) or (next_side == 'B' and prog.b_time_left_seconds <= 0):
-                prog.is_running = False
-                prog.active_side = None
-                prog.last_started_at = None
-            else:
-                prog.active_side = next_side
-                prog.is_running = True
-                prog.last_started_at = now
-
-            prog.save(update_fields=[
-                'a_time_left_seconds','b_time_left_seconds','is_running','active_side','last_started_at',
-                'player_a_name','player_b_name'
-            ])
-            return True, prog
-
-        ok, _ = await sync_to_async(_stop_and_switch)()
-        if not ok:
+        if not self.clock.stop_and_switch(side, name):
             await self._reply(error='الحالة غير صالحة الآن (ليس دورك أو المؤقت متوقف).')
             return
 
+        await self._clock_changed()
+
+    async def _clock_changed(self):
         await self._broadcast_timer_state()
+        self._arm_clock(self.clock, self.channel_layer, self.group_name)
+
+    @staticmethod
+    def _clock_timer(clock, group_name, name):
+        # مفتاح لكل نسخة ساعة: عمال محاكون (ws_loadtest --workers) يتشاركون عجلة العملية
+        return f"{group_name}:{clock.worker}:clock_{name}"
+
+    @classmethod
+    def _disarm_clock(cls, clock, group_name):
+        timer_wheel.cancel(cls._clock_timer(clock, group_name, 'flag'))
+        timer_wheel.cancel(cls._clock_timer(clock, group_name, 'tick'))
+
+    @classmethod
+    def _arm_clock(cls, clock, channel_layer, group_name):
+        """مؤقتا العجلة للساعة الجارية: انتهاء الوقت (flag) + tick دوري؛ يُلغيان عند التوقف."""
+        if not clock.is_running:
+            cls._disarm_clock(clock, group_name)
+            return
+        timer_wheel.schedule(
+            cls._clock_timer(clock, group_name, 'flag'), clock.remaining_ms() / 1000.0,
+            cls._clock_flag, clock, channel_layer, group_name, clock.version,
+        )
+        interval = live_time.tick_interval()
+        if interval > 0:
+            timer_wheel.schedule(
+                cls._clock_timer(clock, group_name, 'tick'), interval,
+                cls._clock_tick, clock, channel_layer, group_name, clock.version,
+            )
 
-    # --------------- Group broadcasts ---------------
-    async def broadcast_puzzle_state(self, event):
-        await self.send(text_data=json.dumps({
+    @classmethod
+    async def _clock_flag(cls, clock, channel_layer, group_name, version):
+        if clock.version != version:
+            return
+        if not clock.flag(version):
+            # وصلنا قبل الصفر بأجزاء من الـ tick: أعد الجدولة للمتبقي
+            cls._arm_clock(clock, channel_layer, group_name)
+            return
+        timer_wheel.cancel(cls._clock_timer(clock, group_name, 'tick'))
+        await ws_groups.broadcast(channel_layer, group_name, {
+            'type': 'broadcast_timer_state', 'origin': clock.worker, **clock.snapshot()
+        }, cls._msg_timer_state)
+
+    @classmethod
+    async def _clock_tick(cls, clock, channel_layer, group_name, version):
+        if clock.version != version or not clock.is_running:
+            return
+        await ws_groups.broadcast(channel_layer, group_name, {
+            'type': 'broadcast_timer_tick', **clock.tick()
+        }, cls._msg_timer_tick)
+        interval = live_time.tick_interval()
+        if interval > 0 and clock.remaining_ms() > 0:
+            timer_wheel.schedule(
+                cls._clock_timer(clock, group_name, 'tick'), interval,
+                cls._clock_tick, clock, channel_layer, group_name, version,
+            )
+
+    # --------------- Client messages ---------------
+    @staticmethod
+    def _msg_puzzle_state(event):
+        return {
             'type': 'puzzle_updated',
+            'seq': event.get('seq'),
             'index': event.get('index'),
             'total': event.get('total'),
             'image_url': event.get('image_url'),
             'hint': event.get('hint'),
             'answer': event.get('answer'),
-        }))
+        }
 
-    async def broadcast_timer_state(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_timer_state(event):
+        return {
             'type': 'timer_state',
             'active_side': event.get('active_side'),
             'a_left': event.get('a_left'),
@@ -1407,18 +1465,50 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
             'last_started_at': event.get('last_started_at'),
             'player_a_name': event.get('player_a_name') or '',
             'player_b_name': event.get('player_b_name') or '',
-        }))
+            'a_ms': event.get('a_ms'),
+            'b_ms': event.get('b_ms'),
+            'v': event.get('v'),
+        }
+
+    @staticmethod
+    def _msg_timer_tick(event):
+        return {
+            'type': 'timer_tick',
+            's': event.get('s'),
+            'a': event.get('a'),
+            'b': event.get('b'),
+            'v': event.get('v'),
+        }
+
+    # --------------- Group broadcasts ---------------
+    async def broadcast_puzzle_state(self, event):
+        if not ws_groups.is_echo(event) and getattr(self, 'clock', None) is not None:
+            self.clock.observe_index(event.get('index'), len(self.riddles))
+        await ws_groups.forward(self, event, self._msg_puzzle_state)
+
+    async def broadcast_timer_state(self, event):
+        # ساعة عامل آخر تغيّرت: نطبّق لقطتها على نسختنا، ومؤقتات العجلة تنتقل لمالكها
+        if not ws_groups.is_echo(event) and getattr(self, 'clock', None) is not None:
+            if self.clock.observe(event, event.get('origin')):
+                self._disarm_clock(self.clock, self.group_name)
+        await ws_groups.forward(self, event, self._msg_timer_state)
+
+    async def broadcast_timer_tick(self, event):
+        await ws_groups.forward(self, event, self._msg_timer_tick)
 
     # --------------- Helpers: puzzle state ---------------
     async def _send_puzzle_state(self):
-        idx = await self._get_current_index()
-        await self.send(text_data=json.dumps({'type': 'puzzle_updated', **self._state_payload(idx)}))
+        idx = self.clock.current_index
+        seq = await sync_to_async(event_log.current_seq)(self.group_name)
+        await ws_protocol.send(self, self._msg_puzzle_state({
+            'seq': seq, **self._state_payload(idx)
+        }))
 
     async def _broadcast_puzzle_state(self):
-        idx = await self._get_current_index()
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'broadcast_puzzle_state', **self._state_payload(idx)
-        })
+        idx = self.clock.current_index
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
+            'type': 'broadcast_puzzle_state', 'origin': ws_groups.origin(), **self._state_payload(idx)
+        }, self._msg_puzzle_state, sequenced=True)
 
     def _state_payload(self, idx: int):
         if 1 <= idx <= len(self.riddles):
@@ -1434,65 +1524,14 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
             'answer': (r.get('answer') or ''),
         }
 
-    async def _get_current_index(self) -> int:
-        def _read():
-            return TimeGameProgress.objects.filter(session=self.session)\
-                   .values_list('current_index', flat=True).first() or 1
-        return await sync_to_async(_read)()
-
-    async def _ensure_progress_bounds(self):
-        def _ensure():
-            obj, _ = TimeGameProgress.objects.get_or_create(
-                session=self.session,
-                defaults={
-                    'current_index': 1,
-                    'a_time_left_seconds': 60,
-                    'b_time_left_seconds': 60,
-                    'active_side': None,
-                    'is_running': False,
-                    'last_started_at': None
-                }
-            )
-            total = max(1, len(self.riddles) or 1)
-            if obj.current_index < 1 or obj.current_index > total:
-                obj.current_index = 1
-                obj.save(update_fields=['current_index'])
-        return await sync_to_async(_ensure)()
-
     # --------------- Helpers: timer state ---------------
     async def _send_timer_state(self):
-        payload = await self._timer_payload()
-        await self.send(text_data=json.dumps({'type': 'timer_state', **payload}))
+        await ws_protocol.send(self, {'type': 'timer_state', **self.clock.snapshot()})
 
     async def _broadcast_timer_state(self):
-        payload = await self._timer_payload()
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'broadcast_timer_state', **payload
-        })
-
-    async def _timer_payload(self):
-        def _read():
-            p = TimeGameProgress.objects.filter(session=self.session).values(
-                'a_time_left_seconds', 'b_time_left_seconds',
-                'active_side', 'is_running', 'last_started_at',
-                'player_a_name', 'player_b_name'
-            ).first()
-            return p or {}
-        p = await sync_to_async(_read)()
-
-        # نعيد القيم كما هي؛ الواجهات تحدث العرض محليًا باستخدام last_started_at (إن كان جاريًا)
-        last_ts = p.get('last_started_at')
-        last_iso = last_ts.isoformat() if last_ts else None
-
-        return {
-            'active_side': p.get('active_side'),
-            'a_left': int(p.get('a_time_left_seconds') or 0),
-            'b_left': int(p.get('b_time_left_seconds') or 0),
-            'is_running': bool(p.get('is_running')),
-            'last_started_at': last_iso,
-            'player_a_name': p.get('player_a_name') or '',
-            'player_b_name': p.get('player_b_name') or '',
-        }
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
+            'type': 'broadcast_timer_state', 'origin': self.clock.worker, **self.clock.snapshot()
+        }, self._msg_timer_state)
 
     # --------------- Misc helpers ---------------
     async def _get_session(self):
@@ -1500,22 +1539,20 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
             lambda: GameSession.objects.select_related('package').get(id=self.session_id)
         )()
 
-    async def _is_session_expired(self, session: GameSession) -> bool:
-        """
-        التحقق من انتهاء صلاحية الجلسة:
-        - المجاني: ساعة واحدة
-        - المدفوع: لا ينتهي أبداً
-        """
-        if not session.package:
-            return False
-        
-        # المدفوع: لا ينتهي
-        if not session.package.is_free:
-            return False
-        
-        # المجاني: ساعة واحدة
-        expiry_time = session.created_at + timedelta(hours=1)
-        return timezone.now() >= expiry_time
+    async def broadcast_session_deadline(self, event):
+        await session_control.deadline_changed(self, event)
+
+    async def broadcast_session_expired(self, event):
+        try:
+            await ws_protocol.send(self, {'type': 'error', 'message': 'انتهت صلاحية الجلسة'})
+        finally:
+            await self.close(code=4401)
+
+    async def _handle_ping(self, data):
+        pong = {'type': 'pong'}
+        if 't' in data:
+            pong['t'] = data['t']
+        await ws_protocol.send(self, pong)
 
     def _parse_qs(self):
         try:
@@ -1526,7 +1563,7 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
 
     async def _reply(self, error=''):
         if error:
-            await self.send(text_data=json.dumps({'type': 'error', 'message': error}))
+            await ws_protocol.send(self, {'type': 'error', 'message': error})
 
 
 
@@ -1538,11 +1575,22 @@ class TimeGameConsumer(AsyncWebsocketConsumer):
 from games.models import FamilyFeudProgress, FamilyFeudAnswer
 
 class FamilyFeudConsumer(AsyncWebsocketConsumer):
+    """
+    فاميلي فيود — المقدم يتحكم بكل شيء:
+    - full_state عند الاتصال أو عند طلب resync فقط (يحمل آخر seq)
+    - كل أمر بعدها يبث delta صغيراً برقم seq متزايد (event_log)؛ السؤال الجديد = question_changed
+    - المقدم والعرض يستقبلان كل الفروقات فيكتشفان الفجوات؛ المتسابق يستقبل جزءاً منها ولا يتتبعها
+    - إعادة الاتصال بـ ?since=<آخر seq> ترسل الفائت فقط من حلقة event_log بدل اللقطة
+    - التقدم (الأسئلة/الإجابات المكشوفة/الأخطاء/النقاط) يبقى في DB بقفل صف لكل أمر: الأوامر بطيئة الإيقاع
+      وتدمج عدة حقول معاً، والقفل يمنع تضاربها بين العمال دون نسخة حيّة تحتاج مزامنة مثل الحروف والوقت
+    """
 
     async def connect(self):
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.group_name = f"feud_session_{self.session_id}"
         self.role = self._parse_qs().get('role', ['viewer'])[0]
+        self.wire = ws_protocol.negotiate(self.scope)
+        self.rtt_ms = 0.0
 
         try:
             self.session = await sync_to_async(
@@ -1552,33 +1600,53 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
             await self.close(code=4404)
             return
 
-        if not self.session.is_active:
+        if session_control.is_closed(self.session):
             await self.close(code=4401)
             return
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        # لقطة الإعدادات المشتركة (مؤقت الزر + اسم العرض)
+        self.settings_snapshot = await live_settings.acquire(self.session)
+        self.package_id = self.session.package_id
+
+        await ws_groups.join(self.channel_layer, self.group_name, self.channel_name, self.role)
+        await self.accept(subprotocol=ws_protocol.accept_subprotocol(self.wire))
+        await session_control.watch(self)
         logger.info(f"WS connected (feud): session={self.session_id}, role={self.role}")
+        if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
 
-        # أرسل الحالة الأولية
-        await self._send_initial_state()
+        # عميل عائد (?since=<seq>): الأحداث الفائتة فقط من حلقة الجلسة، وإلا لقطة كاملة
+        if not await ws_groups.resume(self, event_log.parse_since(self._parse_qs())):
+            await self._send_initial_state()
 
     async def disconnect(self, code):
         try:
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await ws_groups.leave(self.channel_layer, self.group_name, self.channel_name, self.role)
+            await session_control.unwatch(self)
         except Exception:
             pass
+        if getattr(self, 'settings_snapshot', None) is not None:
+            live_settings.release(self.settings_snapshot)
+            self.settings_snapshot = None
 
-    async def receive(self, text_data: str):
-        try:
-            data = json.loads(text_data or '{}')
-        except json.JSONDecodeError:
+    async def receive(self, text_data=None, bytes_data=None):
+        data = ws_protocol.decode(text_data, bytes_data)
+        if data is None:
             return
 
         t = data.get('type')
 
         if t == 'ping':
-            await self.send(text_data=json.dumps({'type': 'pong'}))
+            await self._handle_ping(data)
+            return
+
+        if t == 'rtt_echo':
+            buzzer.observe_echo(self, data)
+            return
+
+        # العميل رأى فجوة في seq
+        if t == 'resync':
+            await self._send_initial_state()
             return
 
         # المقدم فقط
@@ -1628,20 +1696,16 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
         if rank is None:
             return
 
+        catalog = await feud_catalog.get(self.package_id)
+
         def _reveal():
             from django.db import transaction
             with transaction.atomic():
                 progress = FamilyFeudProgress.objects.select_for_update().get(session=self.session)
                 if rank not in progress.revealed_answers:
                     progress.revealed_answers = progress.revealed_answers + [rank]
-                    q = progress.session.package.feud_questions.filter(
-                        order=progress.current_question_index
-                    ).first()
-                    pts = 0
-                    if q:
-                        ans = q.answers.filter(rank=rank).first()
-                        if ans:
-                            pts = ans.points * progress.current_multiplier
+                    q = catalog.question(progress.current_question_index)
+                    pts = q.points(rank) * progress.current_multiplier if q else 0
                     progress.round_points += pts
                     progress.save(update_fields=['revealed_answers', 'round_points'])
                     return progress, pts
@@ -1649,13 +1713,12 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         progress, pts = await sync_to_async(_reveal)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_answer_revealed',
             'rank': rank,
             'points_added': pts,
             'round_points': progress.round_points,
-            'revealed_answers': progress.revealed_answers,
-        })
+        }, self._msg_answer_revealed)
 
     async def _handle_mark_strike(self, team):
         def _strike():
@@ -1671,12 +1734,12 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         progress = await sync_to_async(_strike)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_strike',
             'team': team,
             'team1_strikes': progress.team1_strikes,
             'team2_strikes': progress.team2_strikes,
-        })
+        }, self._msg_strike, roles=ws_groups.HOST_AND_DISPLAY)
 
     async def _handle_reset_strikes(self):
         def _reset():
@@ -1690,12 +1753,12 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         progress = await sync_to_async(_reset)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_strike',
             'team': None,
             'team1_strikes': 0,
             'team2_strikes': 0,
-        })
+        }, self._msg_strike, roles=ws_groups.HOST_AND_DISPLAY)
 
     async def _handle_award_points(self, team):
         def _award():
@@ -1715,13 +1778,13 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         session, pts = await sync_to_async(_award)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_score_update',
             'team1_score': session.team1_score,
             'team2_score': session.team2_score,
             'awarded_team': team,
             'awarded_points': pts,
-        })
+        }, self._msg_score_update)
 
     async def _handle_update_team_names(self, t1_name, t2_name, game_title=None):
         if not t1_name or not t2_name:
@@ -1749,70 +1812,63 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
                 settings.save(update_fields=['show_name'])
                 final_title = 'فاميلي فيود'
 
-            return final_title
+            return final_title, settings.show_name
 
-        final_title = await sync_to_async(_save)()
+        final_title, show_name = await sync_to_async(_save)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_team_names',
             'team1_name': t1_name,
             'team2_name': t2_name,
             'game_title': final_title,
-        })
+            'show_name': show_name,
+        }, self._msg_team_names)
 
     async def broadcast_team_names(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'team_names_updated',
-            'team1_name': event['team1_name'],
-            'team2_name': event['team2_name'],
-            'game_title': event.get('game_title', 'فاميلي فيود'),
-        }))
-    async def _handle_next_question(self):
-        def _next():
-            from django.db import transaction
-            with transaction.atomic():
-                progress = FamilyFeudProgress.objects.select_for_update().get(session=self.session)
-                total = self.session.package.feud_questions.count()
-                if progress.current_question_index < total:
-                    progress.current_question_index += 1
-                    progress.reset_round()
-                    progress.save()
-                return progress
+        # post_save يحدّث لقطة العملية التي حفظت فقط؛ الحدث يصل كل العمال فنطبّقه هنا
+        if 'show_name' in event and getattr(self, 'settings_snapshot', None) is not None:
+            self.settings_snapshot.apply({'show_name': event['show_name']})
+        await ws_groups.forward(self, event, self._msg_team_names)
 
-        progress = await sync_to_async(_next)()
-        await self._broadcast_full_state(progress)
+    async def _handle_next_question(self):
+        await self._move_to_question(lambda current, total: current + 1 if current < total else None)
 
     async def _handle_prev_question(self):
-        def _prev():
-            from django.db import transaction
-            with transaction.atomic():
-                progress = FamilyFeudProgress.objects.select_for_update().get(session=self.session)
-                if progress.current_question_index > 1:
-                    progress.current_question_index -= 1
-                    progress.reset_round()
-                    progress.save()
-                return progress
-
-        progress = await sync_to_async(_prev)()
-        await self._broadcast_full_state(progress)
+        await self._move_to_question(lambda current, total: current - 1 if current > 1 else None)
 
     async def _handle_set_question(self, index):
-        if index is None:
+        try:
+            idx = int(index)
+        except (TypeError, ValueError):
             return
+        await self._move_to_question(lambda current, total: max(1, min(idx, total)))
 
-        def _set():
+    async def _move_to_question(self, target):
+        """target(current, total) → رقم السؤال الجديد أو None (بدون تغيير)؛ العدد والمضاعف من الكتالوج."""
+        catalog = await feud_catalog.get(self.package_id)
+
+        def _move():
             from django.db import transaction
             with transaction.atomic():
                 progress = FamilyFeudProgress.objects.select_for_update().get(session=self.session)
-                total = self.session.package.feud_questions.count()
-                idx = max(1, min(int(index), total))
-                progress.current_question_index = idx
-                progress.reset_round()
-                progress.save()
+                idx = target(progress.current_question_index, catalog.total)
+                if idx is not None:
+                    progress.current_question_index = idx
+                    progress.reset_round(multiplier=catalog.multiplier(idx))
+                    progress.save()
                 return progress
 
-        progress = await sync_to_async(_set)()
-        await self._broadcast_full_state(progress)
+        progress = await sync_to_async(_move)()
+        q = catalog.question(progress.current_question_index)
+        # جولة جديدة: الأخطاء/النقاط/المكشوف/الفريق المتحكم تُصفَّر ضمنياً عند العميل
+        await self._delta({
+            'type': 'broadcast_question_changed',
+            'question_index': progress.current_question_index,
+            'question_text': q.text if q else '',
+            'answers': q.answers_payload() if q else [],
+            'multiplier': progress.current_multiplier,
+            'phase': progress.phase,
+        }, self._msg_question_changed)
 
     async def _handle_set_phase(self, phase):
         valid = ['waiting', 'question', 'buzzer', 'team1_turn', 'team2_turn', 'steal', 'award', 'finished']
@@ -1828,10 +1884,10 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
                 return progress
 
         progress = await sync_to_async(_set)()
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_phase_change',
             'phase': phase,
-        })
+        }, self._msg_phase_change)
 
     async def _handle_set_controlling_team(self, team):
         def _set():
@@ -1844,10 +1900,10 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         await sync_to_async(_set)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_controlling_team',
             'team': team,
-        })
+        }, self._msg_controlling_team)
 
     async def _handle_set_multiplier(self, multiplier):
         try:
@@ -1866,10 +1922,10 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         await sync_to_async(_set)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_multiplier',
             'multiplier': m,
-        })
+        }, self._msg_multiplier, roles=ws_groups.HOST_AND_DISPLAY)
 
     async def _handle_update_scores(self, t1, t2):
         try:
@@ -1888,25 +1944,24 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
 
         await sync_to_async(_update)()
 
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_score_update',
             'team1_score': t1,
             'team2_score': t2,
-        })
+        }, self._msg_score_update)
 
     async def _handle_show_question(self, show):
-        await self.channel_layer.group_send(self.group_name, {
+        await self._delta({
             'type': 'broadcast_question_visibility',
             'show': bool(show),
-        })
+        }, self._msg_question_visibility)
 
     async def _handle_buzz_reset(self):
-        buzz_key = f"buzz_lock_feud_{self.session_id}"
-        await sync_to_async(cache.delete)(buzz_key)
-        await self.channel_layer.group_send(self.group_name, {
+        await buzzer.reset_async(buzzer.lock_key(self.session_id, 'feud'))
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_buzz_event',
             'action': 'buzz_reset',
-        })
+        }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
 
     async def _handle_buzz(self, data):
         name = (data.get('contestant_name') or '').strip()
@@ -1914,129 +1969,150 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
         if not name or team not in ('team1', 'team2'):
             return
 
-        buzz_key = f"buzz_lock_feud_{self.session_id}"
         payload = {'name': name, 'team': team}
 
-        # اقرأ المؤقت من cache — نفس منطق Letters
-        timer_cache_key = f"buzz_timer_{self.session_id}"
-        buzz_timer = await sync_to_async(cache.get)(timer_cache_key)
-        if buzz_timer is None:
-            try:
-                from games.models import GameSettings
-                s = GameSettings.get_or_create_for_session(self.session)
-                buzz_timer = max(1, s.buzz_timer_seconds or 3)
-            except Exception:
-                buzz_timer = 3
-            await sync_to_async(cache.set)(timer_cache_key, buzz_timer, timeout=600)
+        # المؤقت من لقطة الإعدادات — بدون cache/DB
+        buzz_timer = self.settings_snapshot.buzz_timer
 
         lock_ttl = buzz_timer + 2
 
         try:
-            added = await sync_to_async(cache.add)(buzz_key, payload, timeout=lock_ttl)
-        except Exception:
-            added = False
+            accepted, winner = await buzzer.arbitrate(
+                buzzer.lock_key(self.session_id, 'feud'), payload, self.rtt_ms, lock_ttl
+            )
+        except Exception as e:
+            logger.error(f"Feud buzzer arbitration error: {e}")
+            accepted, winner = False, None
 
-        if not added:
-            cur = await sync_to_async(cache.get)(buzz_key) or {}
-            await self.send(text_data=json.dumps({
+        if not accepted:
+            await ws_protocol.send(self, {
                 'type': 'buzz_rejected',
-                'message': f'الزر محجوز من {cur.get("name", "مشارك")}'
-            }))
+                'message': buzzer.rejection_message(winner)
+            })
             return
 
-        await self.send(text_data=json.dumps({
+        await ws_protocol.send(self, {
             'type': 'buzz_confirmed',
             'contestant_name': name,
             'team': team,
             'message': f'تم تسجيل إجابتك يا {name}!'
-        }))
+        })
 
         team_display = self.session.team1_name if team == 'team1' else self.session.team2_name
-        await self.channel_layer.group_send(self.group_name, {
+        await ws_groups.broadcast(self.channel_layer, self.group_name, {
             'type': 'broadcast_buzz_event',
             'action': 'buzz_accepted',
             'contestant_name': name,
             'team': team,
             'team_display': team_display,
-        })
+        }, self._msg_buzz_event, roles=ws_groups.HOST_AND_DISPLAY)
 
-    # ==================== Group Broadcasts ====================
+    # ==================== Client Messages ====================
 
-    async def broadcast_answer_revealed(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_answer_revealed(event):
+        return {
             'type': 'answer_revealed',
+            'seq': event.get('seq'),
             'rank': event['rank'],
             'points_added': event['points_added'],
             'round_points': event['round_points'],
-            'revealed_answers': event['revealed_answers'],
-        }))
+        }
 
-    async def broadcast_strike(self, event):
-        if self.role == 'contestant':
-            return
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_strike(event):
+        return {
             'type': 'strike_updated',
+            'seq': event.get('seq'),
             'team': event.get('team'),
             'team1_strikes': event['team1_strikes'],
             'team2_strikes': event['team2_strikes'],
-        }))
+        }
 
-    async def broadcast_score_update(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_score_update(event):
+        msg = {
             'type': 'scores_updated',
+            'seq': event.get('seq'),
             'team1_score': event['team1_score'],
             'team2_score': event['team2_score'],
-            'awarded_team': event.get('awarded_team'),
-            'awarded_points': event.get('awarded_points'),
-            'team1_name': event.get('team1_name'),
-            'team2_name': event.get('team2_name'),
-        }))
-    async def broadcast_phase_change(self, event):
-        await self.send(text_data=json.dumps({
+        }
+        for key in ('awarded_team', 'awarded_points', 'team1_name', 'team2_name'):
+            if event.get(key) is not None:
+                msg[key] = event[key]
+        return msg
+
+    @staticmethod
+    def _msg_phase_change(event):
+        return {
             'type': 'phase_changed',
+            'seq': event.get('seq'),
             'phase': event['phase'],
-        }))
+        }
 
-    async def broadcast_controlling_team(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_controlling_team(event):
+        return {
             'type': 'controlling_team_changed',
+            'seq': event.get('seq'),
             'team': event['team'],
-        }))
+        }
 
-    async def broadcast_multiplier(self, event):
-        if self.role == 'contestant':
-            return
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_multiplier(event):
+        return {
             'type': 'multiplier_changed',
+            'seq': event.get('seq'),
             'multiplier': event['multiplier'],
-        }))
+        }
 
-    async def broadcast_question_visibility(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_question_visibility(event):
+        return {
             'type': 'question_visibility',
+            'seq': event.get('seq'),
             'show': event['show'],
-        }))
+        }
 
-    async def broadcast_buzz_event(self, event):
-        action = event.get('action')
-        if action == 'buzz_accepted':
-            if self.role == 'contestant':
-                return
-            await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_buzz_event(event):
+        if event.get('action') == 'buzz_accepted':
+            return {
                 'type': 'contestant_buzz_accepted',
                 'contestant_name': event.get('contestant_name'),
                 'team': event.get('team'),
                 'team_display': event.get('team_display'),
                 'start_countdown': True,
-            }))
-        elif action == 'buzz_reset':
-            if self.role == 'contestant':
-                return
-            await self.send(text_data=json.dumps({'type': 'buzz_reset_by_host'}))
+            }
+        return {'type': 'buzz_reset_by_host'}
+
+    @staticmethod
+    def _msg_team_names(event):
+        return {
+            'type': 'team_names_updated',
+            'seq': event.get('seq'),
+            'team1_name': event['team1_name'],
+            'team2_name': event['team2_name'],
+            'game_title': event.get('game_title', 'فاميلي فيود'),
+        }
 
-    async def broadcast_full_state(self, event):
-        await self.send(text_data=json.dumps({
+    @staticmethod
+    def _msg_question_changed(event):
+        return {
+            'type': 'question_changed',
+            'seq': event.get('seq'),
+            'question_index': event['question_index'],
+            'question_text': event.get('question_text', ''),
+            'answers': event.get('answers', []),
+            'multiplier': event.get('multiplier', 1),
+            'phase': event.get('phase', 'question'),
+        }
+
+    @staticmethod
+    def _msg_full_state(event):
+        return {
             'type':             'full_state',
+            'seq':              event.get('seq', 0),
             'question_index':   event['question_index'],
             'question_text':    event.get('question_text', ''),
             'answers':          event.get('answers', []),
@@ -2053,92 +2129,116 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
             'team1_name':       event.get('team1_name', ''),
             'team2_name':       event.get('team2_name', ''),
             'game_title':       event.get('game_title', 'فاميلي فيود'),
-        }))
+        }
+
+    # ==================== Group Broadcasts ====================
+
+    async def broadcast_answer_revealed(self, event):
+        await ws_groups.forward(self, event, self._msg_answer_revealed)
+
+    async def broadcast_strike(self, event):
+        if self.role == 'contestant':
+            return
+        await ws_groups.forward(self, event, self._msg_strike)
+
+    async def broadcast_score_update(self, event):
+        await ws_groups.forward(self, event, self._msg_score_update)
+
+    async def broadcast_phase_change(self, event):
+        await ws_groups.forward(self, event, self._msg_phase_change)
+
+    async def broadcast_controlling_team(self, event):
+        await ws_groups.forward(self, event, self._msg_controlling_team)
+
+    async def broadcast_multiplier(self, event):
+        if self.role == 'contestant':
+            return
+        await ws_groups.forward(self, event, self._msg_multiplier)
+
+    async def broadcast_question_visibility(self, event):
+        await ws_groups.forward(self, event, self._msg_question_visibility)
+
+    async def broadcast_buzz_event(self, event):
+        if self.role == 'contestant':
+            return
+        if event.get('action') not in ('buzz_accepted', 'buzz_reset'):
+            return
+        await ws_groups.forward(self, event, self._msg_buzz_event)
+
+    async def broadcast_question_changed(self, event):
+        await ws_groups.forward(self, event, self._msg_question_changed)
+
+    async def broadcast_session_deadline(self, event):
+        await session_control.deadline_changed(self, event)
+
+    async def broadcast_session_expired(self, event):
+        try:
+            await ws_protocol.send(self, {'type': 'error', 'message': 'انتهت صلاحية الجلسة'})
+        finally:
+            await self.close(code=4401)
 
     # ==================== Helpers ====================
 
     async def _send_initial_state(self):
+        catalog = await feud_catalog.get(self.package_id)
+        if not catalog.total:
+            return
+
         def _get():
-            progress = FamilyFeudProgress.objects.filter(session=self.session).first()
-            if not progress:
-                progress = FamilyFeudProgress.objects.create(
-                    session=self.session,
-                    current_question_index=1,
-                    phase='waiting'
-                )
-            session = GameSession.objects.select_related('package').get(id=self.session_id)
-            questions = session.package.feud_questions.order_by('order')
-            total = questions.count()
-            if total == 0:
-                return None
-            q = questions.filter(order=progress.current_question_index).first()
-            if not q:
-                q = questions.first()
+            progress, _ = FamilyFeudProgress.objects.get_or_create(
+                session=self.session,
+                defaults={'current_question_index': 1, 'phase': 'waiting'}
+            )
+            q = catalog.question(progress.current_question_index)
+            if q.order != progress.current_question_index:
                 progress.current_question_index = q.order
                 progress.save(update_fields=['current_question_index'])
-            answers = []
-            if q:
-                for ans in q.answers.all().order_by('rank'):
-                    answers.append({'rank': ans.rank, 'text': ans.text, 'points': ans.points})
-            return {
-                'question_index':   progress.current_question_index,
-                'question_text':    q.question_text if q else '',
-                'answers':          answers,
-                'revealed_answers': progress.revealed_answers or [],
-                'team1_strikes':    progress.team1_strikes,
-                'team2_strikes':    progress.team2_strikes,
-                'round_points':     progress.round_points,
-                'controlling_team': progress.controlling_team,
-                'phase':            progress.phase,
-                'multiplier':       progress.current_multiplier,
-                'total_questions':  total,
-                'team1_score':      session.team1_score,
-                'team2_score':      session.team2_score,
-                'team1_name':       session.team1_name,
-                'team2_name':       session.team2_name,
-                'game_title': self._get_game_title(),
-            }
+            return progress, self._session_values()
 
-        state = await sync_to_async(_get)()
-        if state:
-            await self.send(text_data=json.dumps({'type': 'full_state', **state}))
+        # seq قبل القراءة: أي delta بعده يُعاد تطبيقه فوق اللقطة بلا ضرر
+        seq = await sync_to_async(event_log.current_seq)(self.group_name)
+        progress, session = await sync_to_async(_get)()
+        await ws_protocol.send(self, self._msg_full_state({'seq': seq, **self._full_state(catalog, progress, session)}))
 
-    async def _broadcast_full_state(self, progress=None):
-        def _get():
-            session = GameSession.objects.select_related('package').get(id=self.session_id)
-            p = progress or FamilyFeudProgress.objects.get(session=session)
-            questions = session.package.feud_questions.order_by('order')
-            total = questions.count()
-            q = questions.filter(order=p.current_question_index).first()
-            if not q and questions.exists():
-                q = questions.first()
-            answers = []
-            if q:
-                for ans in q.answers.all().order_by('rank'):
-                    answers.append({'rank': ans.rank, 'text': ans.text, 'points': ans.points})
-            return {
-                'question_index':   p.current_question_index,
-                'question_text':    q.question_text if q else '',
-                'answers':          answers,
-                'revealed_answers': p.revealed_answers or [],
-                'team1_strikes':    p.team1_strikes,
-                'team2_strikes':    p.team2_strikes,
-                'round_points':     p.round_points,
-                'controlling_team': p.controlling_team,
-                'phase':            p.phase,
-                'multiplier':       p.current_multiplier,
-                'total_questions':  total,
-                'team1_score':      session.team1_score,
-                'team2_score':      session.team2_score,
-                'team1_name':       session.team1_name,
-                'team2_name':       session.team2_name,
-                'game_title': self._get_game_title(),
-            }
+    async def _delta(self, event, build, roles=None):
+        """تغيير حالة برقم تسلسلي للجلسة (العميل يطلب resync عند الفجوة، ويستأنف به بعد الانقطاع)."""
+        await ws_groups.broadcast(self.channel_layer, self.group_name, event, build, roles=roles, sequenced=True)
 
-        state = await sync_to_async(_get)()
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'broadcast_full_state', **state
-        })
+    def _session_values(self):
+        return GameSession.objects.filter(id=self.session_id).values(
+            'team1_score', 'team2_score', 'team1_name', 'team2_name'
+        ).first() or {}
+
+    def _full_state(self, catalog, progress, session):
+        """اللقطة الكاملة من الكتالوج (في الذاكرة) + التقدم + نقاط/أسماء الجلسة."""
+        q = catalog.question(progress.current_question_index)
+        return {
+            'question_index':   progress.current_question_index,
+            'question_text':    q.text if q else '',
+            'answers':          q.answers_payload() if q else [],
+            'revealed_answers': progress.revealed_answers or [],
+            'team1_strikes':    progress.team1_strikes,
+            'team2_strikes':    progress.team2_strikes,
+            'round_points':     progress.round_points,
+            'controlling_team': progress.controlling_team,
+            'phase':            progress.phase,
+            'multiplier':       progress.current_multiplier,
+            'total_questions':  catalog.total,
+            'team1_score':      session.get('team1_score', 0),
+            'team2_score':      session.get('team2_score', 0),
+            'team1_name':       session.get('team1_name', ''),
+            'team2_name':       session.get('team2_name', ''),
+            'game_title': self._get_game_title(),
+        }
+
+    async def _handle_ping(self, data):
+        pong = {'type': 'pong'}
+        if 't' in data:
+            pong['t'] = data['t']
+        await ws_protocol.send(self, pong)
+        # كل نبضة من المتسابق تجدد قياس RTT (لتعويض البازر) بساعة الخادم
+        if self.role == 'contestant':
+            await buzzer.probe_rtt(self)
 
     def _parse_qs(self):
         try:
@@ -2149,13 +2249,7 @@ class FamilyFeudConsumer(AsyncWebsocketConsumer):
         
 
     def _get_game_title(self):
-        try:
-            from games.models import GameSettings
-            s = GameSettings.objects.filter(session=self.session).first()
-            if s and s.show_name:
-                custom_name = s.show_name.strip()
-                if custom_name:
-                    return f'{custom_name} فيود'
-        except Exception:
-            pass
+        custom_name = (self.settings_snapshot.get('show_name') or '').strip()
+        if custom_name:
+            return f'{custom_name} فيود'
         return 'فاميلي فيود'
\ No newline at end of file
@@ -0,0 +1,120 @@
+# games/event_log.py
+"""
+سجل أحداث الحالة لكل جلسة في الكاش المشترك (كل العمال يرون نفس الترقيم):
+- كل تغيير حالة (delta) يأخذ seq من عدّاد مجموعة الجلسة في الكاش (incr ذري في Redis / الكاش المشترك)
+  وتُحفظ رسالته بمفتاح خاص بـ seq؛ نحتفظ بآخر EVENT_LOG_SIZE حدث فقط
+- العدّاد يبدأ من وقت إنشائه بالميكروثانية (أقل من 2^53 فيبقى دقيقاً في JS): إن طُرد من الكاش
+  بدأ من رقم أكبر فيرى العميل فجوة ويطلب لقطة، بدل أن يتجاهل الأحداث الجديدة كمكررة
+- اللقطة الكاملة تحمل آخر seq وقت بنائها؛ العميل يطبّق ما بعده بالترتيب
+- الفروقات قيمها مطلقة (نقاط الجولة / الأخطاء / المجموع) فتكرار حدث بعد اللقطة لا يضر
+- فجوة في seq عند العميل = ضاع شيء → يطلب resync ويأخذ لقطة جديدة
+- إعادة الاتصال: العميل يرسل ?since=<آخر seq>، فيأخذ الأحداث الفائتة فقط (أياً كان العامل الذي بثّها)
+  أو لقطة كاملة إن نقص منها شيء
+- كاش داخل العملية مع طبقة قنوات متعددة العمليات: الترقيم المحلي سيتصادم بين العمال،
+  فالبث يخرج بلا seq (العميل لا يكشف فجوات) والعائد يأخذ لقطة كاملة دائماً
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_SIZE = 128
+# مدة بقاء الحدث لإعادة تشغيله (انقطاع قصير) ومدة العدّاد بلا أحداث
+EVENT_TIMEOUT = 10 * 60
+SEQ_TIMEOUT = 24 * 60 * 60
+
+_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+_LOCAL_LAYERS = ('channels.layers.InMemoryChannelLayer',)
+
+
+def _size() -> int:
+    try:
+        return max(1, int(getattr(settings, 'GAME_SETTINGS', {}).get('EVENT_LOG_SIZE', DEFAULT_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_SIZE
+
+
+def enabled() -> bool:
+    """الترقيم صالح فقط إن كان الكاش مشتركاً بين كل من يبث لنفس المجموعة."""
+    cache_backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    layer_backend = getattr(settings, 'CHANNEL_LAYERS', {}).get('default', {}).get('BACKEND', '')
+    return cache_backend not in _LOCAL_CACHES or layer_backend in _LOCAL_LAYERS
+
+
+def _seq_key(group_name) -> str:
+    return f"event_seq:{group_name}"
+
+
+def _event_key(group_name, seq) -> str:
+    return f"event:{group_name}:{seq}"
+
+
+def _start(key):
+    cache.add(key, int(time.time() * 1_000_000), SEQ_TIMEOUT)
+
+
+def _next_seq(group_name) -> int:
+    key = _seq_key(group_name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _start(key)
+        return cache.incr(key)
+
+
+def append(group_name, event, build, roles=None):
+    """
+    يرقّم الحدث (event['seq'])، يبني رسالته ويحفظها لإعادة تشغيلها لمن يعود بعد انقطاع.
+    ترجع الرسالة المبنية. بلا ترقيم (enabled() خطأ) تُبنى الرسالة فقط.
+    """
+    if not enabled():
+        return build(event)
+    seq = event['seq'] = _next_seq(group_name)
+    message = build(event)
+    cache.set(_event_key(group_name, seq), (message, tuple(roles) if roles else None), EVENT_TIMEOUT)
+    cache.delete(_event_key(group_name, seq - _size()))
+    return message
+
+
+def current_seq(group_name):
+    """آخر seq للمجموعة (يُنشئ العدّاد إن لم يوجد فلا تبدو أول delta فجوة)، أو None بلا ترقيم."""
+    if not enabled():
+        return None
+    key = _seq_key(group_name)
+    current = cache.get(key)
+    if current is None:
+        _start(key)
+        current = cache.get(key)
+    return current or 0
+
+
+def since(group_name, seq, role):
+    """
+    الرسائل بعد seq الموجّهة لهذا الدور، أو None إذا تعذّر الاستئناف
+    (seq أكبر من الحالي = عدّاد جديد، أو خرج ما بعده من السجل، أو لا ترقيم).
+    """
+    if not enabled():
+        return None
+    current = cache.get(_seq_key(group_name)) or 0
+    if seq > current:
+        return None
+    if seq == current:
+        return []
+    if current - seq > _size():
+        return None
+    keys = [_event_key(group_name, s) for s in range(seq + 1, current + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [msg for msg, roles in (found[k] for k in keys) if roles is None or role in roles]
+
+
+def parse_since(query) -> int:
+    """?since=<seq> من query string (parse_qs)، أو -1 إن لم يُرسل."""
+    try:
+        return int((query.get('since') or ['-1'])[0])
+    except (TypeError, ValueError):
+        return -1
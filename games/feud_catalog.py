@@ -0,0 +1,148 @@
+# games/feud_catalog.py
+"""
+كتالوج أسئلة فاميلي فيود لكل حزمة داخل العملية (للقراءة فقط):
+- يُحمَّل مرة واحدة (استعلامان) عند أول مستهلك للحزمة ويُشارك بين كل جلساتها
+- الأسئلة مرتبة بـ order والإجابات بـ rank، مع جداول بحث مباشرة (كشف الإجابة / التنقل بدون DB)
+- يُبطَل عند حفظ/حذف سؤال أو إجابة (signals) برفع نسخة محتوى الحزمة في الكاش المشترك
+  (نفس أسلوب letters_questions.version)؛ كل get() يقارن نسخته المحمّلة بها فتعيد كل العمليات
+  التحميل بعد أي تعديل
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger('games')
+
+Answer = namedtuple('Answer', ('rank', 'text', 'points'))
+
+
+class Question:
+    __slots__ = ('id', 'order', 'text', 'multiplier', 'answers', '_points')
+
+    def __init__(self, id, order, text, multiplier, answers):
+        self.id = id
+        self.order = order
+        self.text = text
+        self.multiplier = multiplier
+        self.answers = tuple(answers)
+        self._points = {a.rank: a.points for a in self.answers}
+
+    def points(self, rank) -> int:
+        return self._points.get(rank, 0)
+
+    def answers_payload(self) -> list:
+        return [{'rank': a.rank, 'text': a.text, 'points': a.points} for a in self.answers]
+
+
+class FeudCatalog:
+    """نسخة ثابتة — أي تعديل في الأدمن ينتج نسخة جديدة بدل تعديل هذه."""
+
+    def __init__(self, package_id, questions):
+        self.package_id = package_id
+        self.questions = tuple(questions)
+        self._by_order = {q.order: q for q in self.questions}
+        self.question_ids = frozenset(q.id for q in self.questions)
+
+    @property
+    def total(self) -> int:
+        return len(self.questions)
+
+    def question(self, order):
+        """السؤال برقم order، أو الأول إن لم يوجد (None للحزمة الفارغة)."""
+        q = self._by_order.get(order)
+        if q is None and self.questions:
+            return self.questions[0]
+        return q
+
+    def multiplier(self, order) -> int:
+        q = self._by_order.get(order)
+        return q.multiplier if q else 1
+
+    def clamp(self, index) -> int:
+        return max(1, min(int(index), self.total))
+
+
+def _load(package_id) -> FeudCatalog:
+    from games.models import FamilyFeudAnswer, FamilyFeudQuestion
+
+    rows = list(
+        FamilyFeudQuestion.objects.filter(package_id=package_id)
+        .order_by('order')
+        .values_list('id', 'order', 'question_text', 'multiplier')
+    )
+    answers = {}
+    for qid, rank, text, points in (
+        FamilyFeudAnswer.objects.filter(question__package_id=package_id)
+        .order_by('question_id', 'rank')
+        .values_list('question_id', 'rank', 'text', 'points')
+    ):
+        answers.setdefault(qid, []).append(Answer(rank, text, points))
+    return FeudCatalog(package_id, [
+        Question(qid, order, text, multiplier, answers.get(qid, ()))
+        for qid, order, text, multiplier in rows
+    ])
+
+
+# ========================= Content version (shared) =========================
+def _version_key(package_id) -> str:
+    return f'feud_catalog_v:{package_id}'
+
+
+def version(package_id):
+    """نسخة محتوى الحزمة؛ تبدأ بطابع زمني حتى لا تعود نسخة قديمة بعد طرد المفتاح من الكاش."""
+    key = _version_key(package_id)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, int(time.time() * 1000), None)
+        current = cache.get(key)
+    return current
+
+
+# =========================== Process registry ===========================
+_catalogs = {}   # package_id → (version, FeudCatalog)
+_locks = {}
+
+
+async def get(package_id) -> FeudCatalog:
+    """يرجع كتالوج الحزمة من الذاكرة ما دامت نسخته هي الحالية، وإلا يحمّله من DB."""
+    current = await sync_to_async(version)(package_id)
+    hit = _catalogs.get(package_id)
+    if hit is not None and hit[0] == current:
+        return hit[1]
+    lock = _locks.setdefault(package_id, asyncio.Lock())
+    async with lock:
+        hit = _catalogs.get(package_id)
+        if hit is not None and hit[0] == current:
+            return hit[1]
+        # تحميل بدأ قبل الإبطال يُخزَّن تحت النسخة القديمة فيُعاد في الطلب التالي
+        catalog = await sync_to_async(_load)(package_id)
+        _catalogs[package_id] = (current, catalog)
+    return catalog
+
+
+def invalidate(package_id):
+    key = _version_key(package_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+    if _catalogs.pop(package_id, None) is not None:
+        logger.info(f"Feud catalog invalidated for package {package_id}")
+
+
+def invalidate_question(question_id):
+    """لتعديل إجابة: حزمة السؤال من DB (العمليات الأخرى قد لا تحمّلها)، أو من الكتالوجات المحمّلة
+    إن كان السؤال نفسه قد حُذف."""
+    from games.models import FamilyFeudQuestion
+
+    package_id = FamilyFeudQuestion.objects.filter(id=question_id).values_list('package_id', flat=True).first()
+    if package_id is not None:
+        invalidate(package_id)
+        return
+    for package_id, (_, catalog) in list(_catalogs.items()):
+        if question_id in catalog.question_ids:
+            invalidate(package_id)
@@ -0,0 +1,164 @@
+# games/hexboard.py
+"""
+لوحة خلية الحروف كرقمين (bitboard): بت لكل خلية في team1 وآخر في team2، والخلية العادية صفر في الاثنين.
+- ترقيم الخلايا كما يرسمها العميل: صفوف من الأعلى، والصفوف الفردية مزاحة نصف خلية لليمين
+- حتى 7x7 (49 خلية): الرقم يتسع في BigIntegerField ويصل للمتصفح كعدد صحيح آمن (< 2^53)
+- اللقطة للعميل [team1, team2] بدل قاموس cell_states، والفرق XOR، والفوز فيض بتات عبر الجيران
+"""
+from functools import lru_cache
+
+MAX_SIZE = 7
+STATES = ('normal', 'team1', 'team2')
+EMPTY = (0, 0)
+
+
+def grid_cells(grid_size) -> int:
+    """'5x5' → 25 (الافتراضي 5x5 لأي قيمة غير مفهومة)."""
+    return side(grid_size) ** 2
+
+
+def side(grid_size) -> int:
+    try:
+        n = int(str(grid_size).lower().split('x')[0])
+    except (TypeError, ValueError):
+        return 5
+    return n if 1 <= n <= MAX_SIZE else 5
+
+
+def state_at(board, index) -> str:
+    bit = 1 << index
+    if board[0] & bit:
+        return 'team1'
+    if board[1] & bit:
+        return 'team2'
+    return 'normal'
+
+
+def with_cell(board, index, state):
+    """اللوحة بعد تلوين خلية واحدة."""
+    bit = 1 << index
+    team1, team2 = board[0] & ~bit, board[1] & ~bit
+    if state == 'team1':
+        team1 |= bit
+    elif state == 'team2':
+        team2 |= bit
+    return team1, team2
+
+
+def masks(cells: dict):
+    """{index: state} → (set1, clear1, set2, clear2) لتطبيقها ذرياً على الأعمدة: (col & ~clear) | set."""
+    set1 = clear1 = set2 = clear2 = 0
+    for index, state in cells.items():
+        bit = 1 << int(index)
+        if state == 'team1':
+            set1 |= bit
+            clear2 |= bit
+        elif state == 'team2':
+            set2 |= bit
+            clear1 |= bit
+        else:
+            clear1 |= bit
+            clear2 |= bit
+    return set1, clear1, set2, clear2
+
+
+def cell_index(key, letters=None):
+    """مفتاح cell_states القديم (رقم الخلية أو الحرف) → رقم الخلية؛ الحرف يأخذ أول ظهور له في الترتيب."""
+    try:
+        index = int(key)
+    except (TypeError, ValueError):
+        if letters and key in letters:
+            return list(letters).index(key)
+        return None
+    return index if 0 <= index < MAX_SIZE * MAX_SIZE else None
+
+
+def from_states(cell_states, letters=None):
+    """قاموس cell_states (صفوف قديمة) → لوحة؛ مفاتيح الأرقام تغلب مفاتيح الحروف."""
+    board = EMPTY
+    if not isinstance(cell_states, dict):
+        return board
+    ordered = sorted(cell_states.items(), key=lambda kv: str(kv[0]).isdigit())
+    for key, state in ordered:
+        index = cell_index(key, letters)
+        if index is not None and state in STATES:
+            board = with_cell(board, index, state)
+    return board
+
+
+def merge_letters(board, cell_states, letters):
+    """
+    خلايا cell_states بمفاتيح الحروف (صفوف/مسارات قديمة لا تحمل رقم الخلية) → اللوحة بترتيب حروف الجلسة،
+    فقط حيث الخلية غير ملوّنة في اللوحة: البت (من مفتاح رقم) يغلب الحرف كما في from_states.
+    """
+    if not isinstance(cell_states, dict) or not letters:
+        return board
+    for key, state in cell_states.items():
+        if str(key).isdigit() or state not in STATES:
+            continue
+        index = cell_index(key, letters)
+        if index is not None and state_at(board, index) == 'normal':
+            board = with_cell(board, index, state)
+    return board
+
+
+def to_states(board, cells) -> dict:
+    return {str(i): state_at(board, i) for i in range(cells)}
+
+
+def changed(old, new) -> list:
+    """أرقام الخلايا التي اختلفت بين لوحتين."""
+    diff = (old[0] ^ new[0]) | (old[1] ^ new[1])
+    out = []
+    while diff:
+        low = diff & -diff
+        out.append(low.bit_length() - 1)
+        diff ^= low
+    return out
+
+
+# ============================== Win check ==============================
+@lru_cache(maxsize=MAX_SIZE)
+def neighbours(n) -> tuple:
+    """قناع جيران كل خلية في شبكة n×n (الصفوف الفردية مزاحة لليمين)."""
+    out = []
+    for row in range(n):
+        shift = 0 if row % 2 == 0 else 1
+        for col in range(n):
+            mask = 0
+            for r, c in (
+                (row, col - 1), (row, col + 1),
+                (row - 1, col - 1 + shift), (row - 1, col + shift),
+                (row + 1, col - 1 + shift), (row + 1, col + shift),
+            ):
+                if 0 <= r < n and 0 <= c < n:
+                    mask |= 1 << (r * n + c)
+            out.append(mask)
+    return tuple(out)
+
+
+@lru_cache(maxsize=MAX_SIZE)
+def edges(n) -> dict:
+    top = (1 << n) - 1
+    left = sum(1 << (r * n) for r in range(n))
+    return {
+        'top': top, 'bottom': top << (n * (n - 1)),
+        'left': left, 'right': left << (n - 1),
+    }
+
+
+def connects(mask, n, start, goal) -> bool:
+    """هل تصل خلايا mask بين حافتين ('top'/'bottom'/'left'/'right') — فيض بتات من حافة البداية."""
+    table, sides = neighbours(n), edges(n)
+    reached = frontier = mask & sides[start]
+    while frontier:
+        if reached & sides[goal]:
+            return True
+        grown = 0
+        while frontier:
+            low = frontier & -frontier
+            grown |= table[low.bit_length() - 1]
+            frontier ^= low
+        frontier = grown & mask & ~reached
+        reached |= frontier
+    return bool(reached & sides[goal])
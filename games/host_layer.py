@@ -0,0 +1,219 @@
+# games/host_layer.py
+"""
+طبقة قنوات لعدة عمليات على جهاز واحد بدون Redis (CHANNEL_LAYER_SOCKETS=<مجلد>):
+- كل عملية تربط مقبس Unix (datagram) باسمها داخل المجلد المشترك: <node>.sock
+- أسماء القنوات تحمل اسم العملية المالكة (specific..<node>!xxxx) فـ send لقناة عملية أخرى
+  يذهب مباشرة لمقبسها، وقنوات العملية نفسها تُسلَّم من الذاكرة كما في InMemoryChannelLayer
+- عضوية المجموعات محلية لكل عملية (المستهلك ينضم بقناته هو)، و group_send يسلّم محلياً
+  ثم يرسل نسخة واحدة لكل عملية أخرى لتسلّمها لأعضائها — لا سجل مركزي ولا عملية وسيطة
+- الإرسال لا يحتاج مستمعاً: async_to_sync(group_send) من view أو أمر إداري يصل لكل العمال
+- عملية ماتت دون تنظيف: أول إرسال يُرفض (ECONNREFUSED) فيُحذف مقبسها
+- المجلد 0700: فقط مستخدم الخدمة يستطيع الحقن في الطبقة
+حدود: حجم الرسالة الواحدة محدود بمخزن مقبس datagram (~200KB افتراضياً)، ورسائل عملية
+مشغولة جداً تُسقط بعد مهلة قصيرة (مثل ChannelFull في الطبقات الأخرى).
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import socket
+import string
+import tempfile
+import time
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger('games')
+
+# كل كم ثانية نعيد قراءة المجلد لاكتشاف العمال الجدد/المنتهين
+PEER_REFRESH = 0.5
+# محاولات الإرسال لعملية مخزنها ممتلئ قبل إسقاط الرسالة (~100ms إجمالاً)
+SEND_RETRIES = 12
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+NODE_IN_CHANNEL = re.compile(r'\.(p\d+x[a-z0-9]+)!')
+
+
+def _token(n: int) -> str:
+    return ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(n))
+
+
+class _Inbox(asyncio.DatagramProtocol):
+    def __init__(self, layer):
+        self.layer = layer
+
+    def datagram_received(self, data, addr):
+        try:
+            packet = msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            logger.warning(f"Channel layer dropped malformed packet: {e}")
+            return
+        asyncio.ensure_future(self.layer._deliver(packet))
+
+
+class HostChannelLayer(InMemoryChannelLayer):
+
+    def __init__(self, path=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ImproperlyConfigured("HostChannelLayer يحتاج مقابس Unix")
+        super().__init__(
+            expiry=expiry, group_expiry=group_expiry,
+            capacity=capacity, channel_capacity=channel_capacity, **kwargs,
+        )
+        self.path = path or os.path.join(tempfile.gettempdir(), 'wesh_aljawab-channels')
+        self._reset()
+
+    def _reset(self):
+        """حالة العملية: تُعاد بعد fork حتى لا يرث العامل اسم/مقبس الأب."""
+        self._pid = os.getpid()
+        self.node = f"p{self._pid}x{_token(6)}"
+        self.channels = {}
+        self.groups = {}
+        self._transport = None
+        self._loop = None
+        self._sender = None
+        self._peers = []
+        self._peers_at = 0.0
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _socket_path(self, node) -> str:
+        return os.path.join(self.path, f"{node}.sock")
+
+    def _owner(self, channel):
+        match = NODE_IN_CHANNEL.search(channel)
+        return match.group(1) if match else None
+
+    # ============================ Inbox ============================
+    async def _listen(self):
+        self._check_fork()
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._transport is not None:
+            try:
+                self._transport.close()
+            except Exception:
+                pass
+        self._loop = loop
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        path = self._socket_path(self.node)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        except OSError:
+            pass
+        sock.bind(path)
+        sock.setblocking(False)
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: _Inbox(self), sock=sock)
+
+    async def _deliver(self, packet):
+        try:
+            if packet.get('op') == 'group':
+                await InMemoryChannelLayer.group_send(self, packet['group'], packet['message'])
+            else:
+                await InMemoryChannelLayer.send(self, packet['channel'], packet['message'])
+        except ChannelFull:
+            pass
+        except Exception as e:
+            logger.error(f"Channel layer delivery error: {e}")
+
+    # ============================ Outbox ============================
+    def _sender_socket(self):
+        if self._sender is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+            except OSError:
+                pass
+            sock.setblocking(False)
+            self._sender = sock
+        return self._sender
+
+    def _peer_paths(self) -> list:
+        now = time.monotonic()
+        if now - self._peers_at > PEER_REFRESH:
+            own = f"{self.node}.sock"
+            try:
+                names = os.listdir(self.path)
+            except FileNotFoundError:
+                names = []
+            self._peers = [os.path.join(self.path, n) for n in names if n.endswith('.sock') and n != own]
+            self._peers_at = now
+        return self._peers
+
+    def _forget(self, path):
+        """مقبس عملية انتهت: نحذفه حتى لا يرسل له أحد بعد الآن."""
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        self._peers = [p for p in self._peers if p != path]
+
+    async def _post(self, path, data: bytes):
+        sock = self._sender_socket()
+        for attempt in range(SEND_RETRIES):
+            try:
+                sock.sendto(data, path)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(0.001 * (attempt + 1))
+            except ConnectionRefusedError:
+                self._forget(path)
+                return
+            except FileNotFoundError:
+                self._peers = [p for p in self._peers if p != path]
+                return
+            except OSError as e:
+                logger.error(f"Channel layer send to {path} failed ({len(data)} bytes): {e}")
+                return
+        logger.warning(f"Channel layer peer {path} is not draining; message dropped")
+
+    # ============================ Layer API ============================
+    async def new_channel(self, prefix="specific."):
+        await self._listen()
+        return f"{prefix}.{self.node}!{_token(12)}"
+
+    async def receive(self, channel):
+        await self._listen()
+        return await super().receive(channel)
+
+    async def send(self, channel, message):
+        self._check_fork()
+        node = self._owner(channel)
+        if node is None or node == self.node:
+            return await super().send(channel, message)
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        data = msgpack.packb({'op': 'send', 'channel': channel, 'message': message}, use_bin_type=True)
+        await self._post(self._socket_path(node), data)
+
+    async def group_send(self, group, message):
+        self._check_fork()
+        await super().group_send(group, message)
+        data = msgpack.packb({'op': 'group', 'group': group, 'message': message}, use_bin_type=True)
+        for path in self._peer_paths():
+            await self._post(path, data)
+
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+            self._loop = None
+            try:
+                os.unlink(self._socket_path(self.node))
+            except OSError:
+                pass
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
@@ -0,0 +1,143 @@
+# games/letters_questions.py
+"""
+فهرس أسئلة خلية الحروف لكل حزمة: الحرف → نوع السؤال → (السؤال، الإجابة، المجال).
+- يُبنى باستعلام واحد (values_list) بدل get() لكل نوع سؤال في كل طلب get_question
+- طبقتان: LRU داخل العملية (LETTERS_INDEX_CACHE_SIZE حزمة) ثم الكاش المشترك بين العمليات
+- المفاتيح مربوطة بنسخة محتوى الحزمة في الكاش؛ حفظ/حذف سؤال (الأدمن/الاستيراد) يرفع النسخة
+  فكل العمليات تترك الفهرس القديم دون أن نحذفه من كل واحدة
+- الهاء: ه و هـ حرف واحد — الشكل المطلوب أولاً ثم الشكل الآخر لكل نوع سؤال
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('games')
+
+Entry = namedtuple('Entry', ('question', 'answer', 'category'))
+
+DEFAULT_CACHE_SIZE = 64
+SHARED_TIMEOUT = 6 * 60 * 60
+_HEH = ('ه', 'هـ')
+
+
+def _cache_size() -> int:
+    try:
+        size = int(getattr(settings, 'GAME_SETTINGS', {}).get('LETTERS_INDEX_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_CACHE_SIZE
+    return max(1, size)
+
+
+def variants(letter) -> tuple:
+    """الحرف ثم الشكل الآخر للهاء إن وُجد."""
+    if letter in _HEH:
+        return (letter, _HEH[1] if letter == _HEH[0] else _HEH[0])
+    return (letter,)
+
+
+class LettersIndex:
+    """نسخة ثابتة لحزمة واحدة — أي تعديل ينتج نسخة جديدة بنسخة محتوى جديدة."""
+
+    def __init__(self, package_id, rows):
+        self.package_id = package_id
+        self._by_letter = {}
+        for letter, qtype, question, answer, category in rows:
+            self._by_letter.setdefault(letter, {})[qtype] = Entry(question, answer, category or '')
+
+    def __len__(self):
+        return sum(len(types) for types in self._by_letter.values())
+
+    def questions(self, letter) -> dict:
+        """{نوع السؤال: Entry} للحرف، مع إكمال الأنواع الناقصة من الشكل الآخر للهاء."""
+        out = {}
+        for form in reversed(variants(letter)):
+            out.update(self._by_letter.get(form, {}))
+        return out
+
+    def get(self, letter, question_type):
+        for form in variants(letter):
+            entry = self._by_letter.get(form, {}).get(question_type)
+            if entry is not None:
+                return entry
+        return None
+
+    def dump(self) -> list:
+        return [
+            (letter, qtype, *entry)
+            for letter, types in self._by_letter.items()
+            for qtype, entry in types.items()
+        ]
+
+
+def _load(package_id) -> LettersIndex:
+    from games.models import LettersGameQuestion
+
+    return LettersIndex(package_id, LettersGameQuestion.objects.filter(
+        package_id=package_id
+    ).values_list('letter', 'question_type', 'question', 'answer', 'category'))
+
+
+# ========================= Content version (shared) =========================
+def _version_key(package_id) -> str:
+    return f'letters_qidx_v:{package_id}'
+
+
+def _index_key(package_id, version) -> str:
+    return f'letters_qidx:{package_id}:{version}'
+
+
+def version(package_id):
+    """نسخة محتوى الحزمة؛ تبدأ بطابع زمني حتى لا تعود نسخة قديمة بعد طرد المفتاح من الكاش."""
+    key = _version_key(package_id)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, int(time.time() * 1000), None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(package_id):
+    key = _version_key(package_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+    with _lock:
+        _local.pop(package_id, None)
+
+
+# =========================== Process registry ===========================
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def get(package_id) -> LettersIndex:
+    """فهرس الحزمة: من ذاكرة العملية، ثم الكاش المشترك، ثم استعلام واحد."""
+    current = version(package_id)
+    with _lock:
+        hit = _local.get(package_id)
+        if hit is not None and hit[0] == current:
+            _local.move_to_end(package_id)
+            return hit[1]
+
+    index = None
+    if current is not None:
+        rows = cache.get(_index_key(package_id, current))
+        if rows is not None:
+            index = LettersIndex(package_id, rows)
+    if index is None:
+        index = _load(package_id)
+        if current is not None:
+            # تحميل بدأ قبل الإبطال يُخزَّن تحت النسخة القديمة فلا يقرؤه أحد
+            cache.set(_index_key(package_id, current), index.dump(), SHARED_TIMEOUT)
+
+    with _lock:
+        _local[package_id] = (current, index)
+        _local.move_to_end(package_id)
+        while len(_local) > _cache_size():
+            _local.popitem(last=False)
+    return index
@@ -0,0 +1,331 @@
+# games/live_letters.py
+"""
+حالة جلسة خلية الحروف داخل عملية ASGI (نسخة لكل عامل فيه مستهلك للجلسة):
+- أوامر المقدم (تلوين خلية / نقاط / الحرف الحالي) تُطبَّق في الذاكرة وتُبث فوراً مع origin العملية
+- العمال الآخرون يطبّقون البث على نسختهم (observe_*) دون أن يكتبوه، فتبقى لقطاتهم وفحص الفوز محدّثة
+  ولا يعيد أحدهم كتابة حالة قديمة؛ الكتابة لـ DB من العامل الذي طبّق الأمر فقط
+- التغييرات تُكتب إلى DB على دفعات كل LIVE_STATE_FLUSH_MS أو عند قطع الاتصال
+- فشل كتابة آخر مستهلك لا يُسقط الحالة: تبقى مسجّلة وتُعاد المحاولة حتى تنجح
+- الكتابة تدمج الفروقات فقط داخل DB (progress_store) فلا تمسح تغييرات جاءت من مسار HTTP
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from games import hexboard, win_paths, ws_groups
+
+logger = logging.getLogger('games')
+
+DEFAULT_FLUSH_MS = 250
+# إعادة محاولة كتابة حالة آخر مستهلك إن فشلت: المهلة تتضاعف بين الحدّين
+RETRY_MIN_S = 1.0
+RETRY_MAX_S = 30.0
+
+
+def _flush_interval() -> float:
+    try:
+        ms = int(getattr(settings, 'GAME_SETTINGS', {}).get('LIVE_STATE_FLUSH_MS', DEFAULT_FLUSH_MS))
+    except (TypeError, ValueError):
+        ms = DEFAULT_FLUSH_MS
+    return max(0, ms) / 1000.0
+
+
+class LettersSessionState:
+    """الحالة الحيّة لجلسة واحدة — نسخة واحدة لكل جلسة داخل العملية."""
+
+    WINNING_SCORE = 10
+
+    def __init__(self, session_id):
+        self.session_id = str(session_id)
+        self._key = (ws_groups.origin(), self.session_id)
+
+        self.cell_states = {}
+        self.used_letters = []
+        # (team1_cells, team2_cells) بأرقام الخلايا
+        self.board = hexboard.EMPTY
+        # متتبّع الفوز (win_paths) يُبنى من اللوحة عند أول تلوين ومع تغيّر حجم الشبكة
+        self._wins = None
+        self.current_letter = None
+        self.team1_score = 0
+        self.team2_score = 0
+        self.winner_team = None
+        self.is_completed = False
+
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._retry_task = None
+        self._refs = 0
+
+        # التغييرات التي لم تُكتب بعد
+        self._dirty_cells = {}
+        self._dirty_letters = []
+        self._dirty_board = {}
+        self._dirty_scores = False
+        self._dirty_current_letter = False
+
+    # ============================ Loading ============================
+    async def ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            data = await sync_to_async(self._load_from_db)()
+            # ما وصل من أوامر قبل اكتمال التحميل له الأولوية
+            cells = dict(data['cell_states'])
+            cells.update(self.cell_states)
+            self.cell_states = cells
+            for letter in self.used_letters:
+                if letter not in data['used_letters']:
+                    data['used_letters'].append(letter)
+            self.used_letters = data['used_letters']
+            board = data['board']
+            for index, state in self._dirty_board.items():
+                board = hexboard.with_cell(board, index, state)
+            self.board = board
+            self._wins = None
+            if not self._dirty_current_letter:
+                self.current_letter = data['current_letter']
+            if not self._dirty_scores:
+                self.team1_score = data['team1_score']
+                self.team2_score = data['team2_score']
+                self.winner_team = data['winner_team']
+                self.is_completed = data['is_completed']
+            self._loaded = True
+
+    def _load_from_db(self):
+        from games.models import GameSession, LettersGameProgress
+
+        session = GameSession.objects.only(
+            'id', 'team1_score', 'team2_score', 'winner_team', 'is_completed'
+        ).get(id=self.session_id)
+        progress, _ = LettersGameProgress.objects.get_or_create(
+            session_id=self.session_id,
+            defaults={'cell_states': {}, 'used_letters': []}
+        )
+        return {
+            'cell_states': progress.cell_states if isinstance(progress.cell_states, dict) else {},
+            'used_letters': list(progress.used_letters) if isinstance(progress.used_letters, list) else [],
+            'board': (progress.team1_cells, progress.team2_cells),
+            'current_letter': progress.current_letter,
+            'team1_score': session.team1_score,
+            'team2_score': session.team2_score,
+            'winner_team': session.winner_team,
+            'is_completed': session.is_completed,
+        }
+
+    # ======================= Host commands (write) =======================
+    def apply_cell(self, letter, state, cell_index=None, grid_size=None):
+        """يرجع {'team', 'path'} إن ربط هذا التلوين حافتي فريق لأول مرة."""
+        key = str(cell_index) if cell_index is not None else letter
+        self.cell_states[key] = state
+        self._dirty_cells[key] = state
+        won = None
+        index = hexboard.cell_index(cell_index)
+        if index is not None:
+            won = self._tracker(grid_size).apply(index, state)
+            self.board = hexboard.with_cell(self.board, index, state)
+            self._dirty_board[index] = state
+        if letter not in self.used_letters:
+            self.used_letters.append(letter)
+            self._dirty_letters.append(letter)
+        self._schedule_flush()
+        return won
+
+    def _tracker(self, grid_size):
+        n = hexboard.side(grid_size)
+        if self._wins is None or self._wins.n != n:
+            self._wins = win_paths.WinTracker(n, self.board)
+        return self._wins
+
+    def apply_scores(self, team1_score, team2_score):
+        self.team1_score = team1_score
+        self.team2_score = team2_score
+        if team1_score >= self.WINNING_SCORE and team1_score > team2_score:
+            self.winner_team = 'team1'
+            self.is_completed = True
+        elif team2_score >= self.WINNING_SCORE and team2_score > team1_score:
+            self.winner_team = 'team2'
+            self.is_completed = True
+        self._dirty_scores = True
+        self._schedule_flush()
+        return self.winner_team, self.is_completed
+
+    def select_letter(self, letter):
+        if self.current_letter == letter:
+            return
+        self.current_letter = letter
+        self._dirty_current_letter = True
+        self._schedule_flush()
+
+    # ============ External changes (HTTP views / another worker — written there) ============
+    def observe_cell(self, letter, state, cell_index=None):
+        if not letter or state not in ('normal', 'team1', 'team2'):
+            return
+        key = str(cell_index) if cell_index is not None else letter
+        self.cell_states[key] = state
+        # القيمة الأحدث كتبها مصدرها؛ فرقنا المعلّق لنفس الخلية قديم فلا نعيد كتابته فوقها
+        self._dirty_cells.pop(key, None)
+        index = hexboard.cell_index(cell_index)
+        if index is not None:
+            self._dirty_board.pop(index, None)
+            if self._wins is not None:
+                # فوز جاء من مسار آخر أُعلن هناك — نحدّث المتتبّع فقط
+                self._wins.apply(index, state)
+            self.board = hexboard.with_cell(self.board, index, state)
+        if letter not in self.used_letters:
+            self.used_letters.append(letter)
+
+    def observe_letter(self, letter):
+        if letter:
+            self.current_letter = letter
+            self._dirty_current_letter = False
+
+    def observe_scores(self, team1_score, team2_score, winner_team=None, is_completed=None):
+        if team1_score is None or team2_score is None:
+            return
+        self.team1_score = team1_score
+        self.team2_score = team2_score
+        if is_completed is not None:
+            self.winner_team = winner_team
+            self.is_completed = bool(is_completed)
+
+    def observe_reset(self):
+        # جولة جديدة صفّرت التقدم في DB: نتخلص من أي فروقات معلّقة حتى لا تُعاد كتابتها
+        self.cell_states = {}
+        self.used_letters = []
+        self.board = hexboard.EMPTY
+        self._wins = None
+        self._dirty_cells = {}
+        self._dirty_letters = []
+        self._dirty_board = {}
+
+    # ============================== Flushing ==============================
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        try:
+            await asyncio.sleep(_flush_interval())
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(
+            self._dirty_cells or self._dirty_letters or self._dirty_board
+            or self._dirty_scores or self._dirty_current_letter
+        )
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.is_dirty:
+                return
+
+            cells, self._dirty_cells = self._dirty_cells, {}
+            letters, self._dirty_letters = self._dirty_letters, []
+            board, self._dirty_board = self._dirty_board, {}
+            scores = None
+            if self._dirty_scores:
+                scores = (self.team1_score, self.team2_score, self.winner_team, self.is_completed)
+                self._dirty_scores = False
+            current_letter = None
+            write_letter = self._dirty_current_letter
+            if write_letter:
+                current_letter = self.current_letter
+                self._dirty_current_letter = False
+
+            try:
+                await sync_to_async(self._write)(cells, letters, board, scores, write_letter, current_letter)
+            except Exception as e:
+                logger.error(f"Live state flush error for session {self.session_id}: {e}")
+                # أعد الفروقات للدفعة القادمة دون أن تطغى على ما هو أحدث
+                for k, v in cells.items():
+                    self._dirty_cells.setdefault(k, v)
+                for letter in letters:
+                    if letter not in self._dirty_letters:
+                        self._dirty_letters.append(letter)
+                for index, state in board.items():
+                    self._dirty_board.setdefault(index, state)
+                if scores is not None:
+                    self._dirty_scores = True
+                if write_letter:
+                    self._dirty_current_letter = True
+
+    def _write(self, cells, letters, board, scores, write_letter, current_letter):
+        from games import progress_store
+        from games.models import GameSession
+
+        with transaction.atomic():
+            if cells or letters or board or write_letter:
+                fields = {'current_letter': current_letter} if write_letter else {}
+                progress_store.apply_cells(self.session_id, cells, letters, board, **fields)
+
+            if scores is not None:
+                t1, t2, winner, completed = scores
+                GameSession.objects.filter(id=self.session_id).update(
+                    team1_score=t1, team2_score=t2,
+                    winner_team=winner, is_completed=completed,
+                )
+
+
+# =========================== Process registry ===========================
+# المفتاح (origin, session_id): نسخة واحدة لكل جلسة في العملية (أو لكل عامل محاكى)
+_states = {}
+
+
+def acquire(session_id) -> LettersSessionState:
+    """يرجع حالة الجلسة المشتركة (وينشئها عند أول مستهلك)."""
+    sid = str(session_id)
+    state = _states.get((ws_groups.origin(), sid))
+    if state is None:
+        state = LettersSessionState(sid)
+        _states[state._key] = state
+    state._refs += 1
+    return state
+
+
+def get(session_id):
+    return _states.get((ws_groups.origin(), str(session_id)))
+
+
+def copies(session_id):
+    """كل نسخ الجلسة في العملية — أكثر من واحدة فقط مع عمال محاكين (ws_loadtest)."""
+    sid = str(session_id)
+    return [state for key, state in _states.items() if key[1] == sid]
+
+
+async def release(state: LettersSessionState):
+    """يُستدعى عند قطع الاتصال: نكتب المعلّق ونحرّر الحالة عند آخر مستهلك."""
+    state._refs = max(0, state._refs - 1)
+    await state.flush()
+    _forget(state)
+
+
+def _forget(state: LettersSessionState):
+    if state._refs or _states.get(state._key) is not state:
+        return
+    if state.is_dirty:
+        # فشلت الكتابة: تبقى الحالة مسجّلة (ومستهلك جديد يلتقطها كما هي) ونعيد المحاولة
+        if state._retry_task is None or state._retry_task.done():
+            state._retry_task = asyncio.ensure_future(_retry_flush(state))
+        return
+    if state._flush_task and not state._flush_task.done():
+        state._flush_task.cancel()
+    del _states[state._key]
+
+
+async def _retry_flush(state: LettersSessionState):
+    delay = max(RETRY_MIN_S, _flush_interval())
+    while state._refs == 0 and state.is_dirty:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RETRY_MAX_S)
+        await state.flush()
+    _forget(state)
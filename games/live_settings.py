@@ -0,0 +1,110 @@
+# games/live_settings.py
+"""
+لقطة إعدادات الجلسة (GameSettings) المشتركة داخل العملية:
+- تُحمَّل مرة واحدة عند أول اتصال للجلسة
+- تُحدَّث في مكانها عند broadcast_settings_update أو عند حفظ GameSettings في نفس العملية
+- كل تغيير فعلي يرفع رقم الإصدار (version)
+- مسار البث للمتسابقين يقرأ منها فقط بدون أي استعلام DB
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger('games')
+
+SNAPSHOT_FIELDS = (
+    'team1_name', 'team2_name', 'team1_color', 'team2_color',
+    'grid_size', 'buzz_timer_seconds',
+    'penalty_timer_enabled', 'penalty_timer_seconds',
+    'show_grid_to_contestants',
+    'nohost_mode', 'nohost_allow_cell_color', 'nohost_hide_answer',
+    'show_name', 'show_subtitle',
+)
+
+
+def settings_values(obj) -> dict:
+    return {f: getattr(obj, f) for f in SNAPSHOT_FIELDS}
+
+
+class SettingsSnapshot:
+    """لقطة واحدة لكل جلسة؛ values تُستبدل كاملة عند كل تحديث (آمنة للقراءة من أي thread)."""
+
+    def __init__(self, session_id):
+        self.session_id = str(session_id)
+        self.values = {}
+        self.version = 0
+        self._refs = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.version > 0
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    @property
+    def buzz_timer(self) -> int:
+        try:
+            return max(1, int(self.values.get('buzz_timer_seconds') or 3))
+        except (TypeError, ValueError):
+            return 3
+
+    def replace(self, values: dict):
+        self.values = {f: values.get(f) for f in SNAPSHOT_FIELDS}
+        self.version += 1
+
+    def apply(self, changes: dict) -> bool:
+        """دمج تحديث جزئي؛ يرفع الإصدار فقط إذا تغيّر شيء (كل مستهلكي الجلسة يستقبلون نفس الحدث)."""
+        updates = {k: v for k, v in (changes or {}).items() if k in SNAPSHOT_FIELDS and self.values.get(k) != v}
+        if not updates:
+            return False
+        merged = dict(self.values)
+        merged.update(updates)
+        self.values = merged
+        self.version += 1
+        return True
+
+
+# =========================== Process registry ===========================
+_snapshots = {}
+
+
+async def acquire(session) -> SettingsSnapshot:
+    """يرجع لقطة الجلسة المشتركة، ويحمّلها من DB عند أول مستهلك فقط."""
+    sid = str(session.id)
+    snap = _snapshots.get(sid)
+    if snap is None:
+        snap = SettingsSnapshot(sid)
+        _snapshots[sid] = snap
+    snap._refs += 1
+
+    if not snap.loaded:
+        def _load():
+            from games.models import GameSettings
+            return settings_values(GameSettings.get_or_create_for_session(session))
+        try:
+            values = await sync_to_async(_load)()
+            if not snap.loaded:
+                snap.replace(values)
+        except Exception as e:
+            logger.error(f"Settings snapshot load error for session {sid}: {e}")
+    return snap
+
+
+def peek(session_id):
+    """اللقطة المحمّلة في هذه العملية (جلسة لها اتصال WS مفتوح) أو None — بدون تحميل."""
+    snap = _snapshots.get(str(session_id))
+    return snap if snap is not None and snap.loaded else None
+
+
+def release(snap: SettingsSnapshot):
+    snap._refs = max(0, snap._refs - 1)
+    if snap._refs == 0 and _snapshots.get(snap.session_id) is snap:
+        del _snapshots[snap.session_id]
+
+
+def refresh_from_instance(instance):
+    """يُستدعى من post_save لـ GameSettings: نحدّث اللقطة إن كانت محمّلة في هذه العملية."""
+    snap = _snapshots.get(str(instance.session_id))
+    if snap is not None:
+        snap.apply(settings_values(instance))
@@ -0,0 +1,390 @@
+# games/live_time.py
+"""
+ساعة تحدّي الوقت (مثل ساعة الشطرنج) داخل عملية ASGI — نسخة لكل عامل فيه مستهلك للجلسة:
+- الوقت المتبقي لكل جانب بالمللي ثانية، ويُحسب من time.monotonic() (لا يتأثر بتعديل ساعة النظام)
+- stop&switch / start / pause / reset عمليات في الذاكرة بدون أي await (لا أقفال صفوف ولا رحلة لـ DB)
+- كل تغيير يرفع version ويجعل العامل الذي طبّقه مالك الساعة (owner = ws_groups.origin())؛
+  المؤقتات المجدولة (انتهاء الوقت / tick) تتجاهل نفسها إن تغيّرت النسخة
+- العمال الآخرون يطبّقون إطار timer_state على نسختهم (observe) إن كان أحدث بـ (version, owner)،
+  فيقبلون ضغطة المتسابق على الجانب الصحيح؛ مؤقتات العجلة يشغّلها المالك وحده
+- TimeGameProgress نقطة حفظ فقط: تُكتب بـ update() على دفعات كل LIVE_STATE_FLUSH_MS وعند قطع آخر اتصال
+"""
+import asyncio
+import logging
+import math
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from games import ws_groups
+
+logger = logging.getLogger('games')
+
+DEFAULT_FLUSH_MS = 250
+DEFAULT_TICK_MS = 1000
+SIDES = ('A', 'B')
+
+
+def _setting_ms(name, default) -> int:
+    try:
+        return max(0, int(getattr(settings, 'GAME_SETTINGS', {}).get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def tick_interval() -> float:
+    """فترة إطارات timer_tick أثناء الجريان (0 = تعطيل، العملاء يكملون العد محلياً)."""
+    return _setting_ms('TIME_CLOCK_TICK_MS', DEFAULT_TICK_MS) / 1000.0
+
+
+def _other(side):
+    return 'B' if side == 'A' else 'A'
+
+
+class TimeClock:
+    """ساعة جلسة واحدة — نسخة واحدة لكل جلسة داخل العملية."""
+
+    def __init__(self, session_id):
+        self.session_id = str(session_id)
+        # العامل الذي يحمل هذه النسخة (مؤقتات العجلة تعمل خارج سياق المستهلك فلا نسأل origin() هناك)
+        self.worker = ws_groups.origin()
+
+        self.current_index = 1
+        self.a_ms = 60000
+        self.b_ms = 60000
+        self.active_side = None
+        self.is_running = False
+        self.player_a_name = ''
+        self.player_b_name = ''
+        self.version = 0
+        # العامل الذي طبّق آخر تغيير (None = حالة محمّلة من DB لم يغيّرها أحد بعد)
+        self.owner = None
+        # ألغاز الحزمة (تُحمَّل من المستهلك مرة واحدة وتعيش مع الساعة)
+        self.riddles = None
+
+        # لحظة بدء الجانب النشط (monotonic) ومقابلها على ساعة الحائط لنقطة الحفظ
+        self._started_mono = None
+        self._started_wall = None
+
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._dirty = False
+        self._refs = 0
+
+    # ============================ Loading ============================
+    async def ensure_loaded(self, total=1):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            data = await sync_to_async(self._load_from_db)(total)
+            self.current_index = data['current_index']
+            # إطار من عامل آخر وصل أثناء التحميل أحدث من نقطة الحفظ
+            if self.owner is None:
+                self.a_ms = data['a_ms']
+                self.b_ms = data['b_ms']
+                self.active_side = data['active_side']
+                self.is_running = False
+                if data['is_running'] and self.active_side in SIDES and self._left(self.active_side) > 0:
+                    self._run(self.active_side)
+            self._loaded = True
+
+    def _load_from_db(self, total):
+        from games.models import TimeGameProgress
+
+        progress, _ = TimeGameProgress.objects.get_or_create(
+            session_id=self.session_id,
+            defaults={
+                'current_index': 1,
+                'a_time_left_seconds': 60,
+                'b_time_left_seconds': 60,
+                'is_running': False,
+                'last_started_at': None,
+            }
+        )
+        a_ms = progress.a_time_left_seconds * 1000
+        b_ms = progress.b_time_left_seconds * 1000
+        # نقطة حفظ لساعة كانت تجري: نخصم ما مضى منذ آخر تشغيل
+        if progress.is_running and progress.last_started_at:
+            elapsed = max(0, int((timezone.now() - progress.last_started_at).total_seconds() * 1000))
+            if progress.active_side == 'A':
+                a_ms = max(0, a_ms - elapsed)
+            else:
+                b_ms = max(0, b_ms - elapsed)
+        index = progress.current_index
+        if index < 1 or index > max(1, total):
+            index = 1
+        return {
+            'current_index': index,
+            'a_ms': a_ms,
+            'b_ms': b_ms,
+            'active_side': progress.active_side if progress.active_side in SIDES else None,
+            'is_running': progress.is_running,
+        }
+
+    # ============================ Clock math ============================
+    def _left(self, side, now=None) -> int:
+        left = self.a_ms if side == 'A' else self.b_ms
+        if self.is_running and side == self.active_side and self._started_mono is not None:
+            now = time.monotonic() if now is None else now
+            left -= int((now - self._started_mono) * 1000)
+        return max(0, left)
+
+    def _settle(self, now):
+        """يثبّت الوقت المنقضي للجانب الجاري في رصيده."""
+        if self.is_running and self.active_side in SIDES:
+            left = self._left(self.active_side, now)
+            if self.active_side == 'A':
+                self.a_ms = left
+            else:
+                self.b_ms = left
+        self.is_running = False
+        self._started_mono = None
+        self._started_wall = None
+
+    def _run(self, side):
+        self.active_side = side
+        self.is_running = True
+        self._started_mono = time.monotonic()
+        self._started_wall = timezone.now()
+
+    def _changed(self):
+        self.version += 1
+        self.owner = self.worker
+        self._dirty = True
+        self._schedule_flush()
+
+    def remaining_ms(self) -> int:
+        """المتبقي للجانب الجاري (0 إن كانت الساعة متوقفة)."""
+        if not self.is_running or self.active_side not in SIDES:
+            return 0
+        return self._left(self.active_side)
+
+    # ============================ Commands ============================
+    def start(self, side) -> bool:
+        if side not in SIDES:
+            return False
+        self._settle(time.monotonic())
+        if self._left(side) > 0:
+            self._run(side)
+        else:
+            self.active_side = None
+        self._changed()
+        return True
+
+    def pause(self):
+        self._settle(time.monotonic())
+        self._changed()
+
+    def reset(self, seconds_each, start_side='A', a_name='', b_name=''):
+        self._settle(time.monotonic())
+        self.a_ms = self.b_ms = max(1, int(seconds_each)) * 1000
+        self.player_a_name = a_name or self.player_a_name
+        self.player_b_name = b_name or self.player_b_name
+        self._run('B' if start_side == 'B' else 'A')
+        self._changed()
+
+    def stop_and_switch(self, side, name='') -> bool:
+        """
+        ضغطة المتسابق: يُخصم وقته حتى لحظة الاستلام ويبدأ الخصم من رصيده.
+        False إن لم يكن الدور له أو كانت الساعة متوقفة (ضغطة مكررة مثلاً).
+        """
+        if name:
+            if side == 'A' and not self.player_a_name:
+                self.player_a_name = name
+            elif side == 'B' and not self.player_b_name:
+                self.player_b_name = name
+        if not self.is_running or self.active_side != side:
+            return False
+
+        self._settle(time.monotonic())
+        nxt = _other(side)
+        if self._left(side) > 0 and self._left(nxt) > 0:
+            self._run(nxt)
+        else:
+            self.active_side = None
+        self._changed()
+        return True
+
+    def flag(self, version) -> bool:
+        """انتهى وقت الجانب الجاري (من مؤقت العجلة) — يتجاهل المؤقتات القديمة."""
+        if version != self.version or not self.is_running:
+            return False
+        if self.remaining_ms() > 0:
+            return False
+        self._settle(time.monotonic())
+        self.active_side = None
+        self._changed()
+        return True
+
+    # ============ External changes (another worker — checkpointed there) ============
+    def observe(self, state, origin) -> bool:
+        """
+        لقطة timer_state بثّها عامل آخر: تُطبَّق إن كانت أحدث من نسختنا
+        (version أعلى، والتعادل بين أمرين متزامنين على عاملين يُحسم بـ origin فيتفق الجميع).
+        """
+        try:
+            version = int(state.get('v'))
+            a_ms = max(0, int(state.get('a_ms')))
+            b_ms = max(0, int(state.get('b_ms')))
+        except (TypeError, ValueError):
+            return False
+        if (version, origin or '') <= (self.version, self.owner or ''):
+            return False
+        side = state.get('active_side')
+        self.is_running = False
+        self._started_mono = None
+        self._started_wall = None
+        self.a_ms, self.b_ms = a_ms, b_ms
+        self.active_side = side if side in SIDES else None
+        self.player_a_name = state.get('player_a_name') or ''
+        self.player_b_name = state.get('player_b_name') or ''
+        # الرصيد في اللقطة محسوب لحظة بثّها؛ نكمل الخصم من لحظة استلامها
+        if state.get('is_running') and self.active_side in SIDES:
+            self._run(self.active_side)
+        self.version = version
+        self.owner = origin
+        return True
+
+    def observe_index(self, index, total):
+        try:
+            self.current_index = max(1, min(int(index), max(1, total)))
+        except (TypeError, ValueError):
+            pass
+
+    @property
+    def is_owner(self) -> bool:
+        """مؤقتات العجلة لهذه الساعة تعمل هنا (آخر تغيير طُبّق هنا، أو لم يغيّرها أحد بعد)."""
+        return self.owner is None or self.owner == self.worker
+
+    def set_index(self, index, total) -> int:
+        index = max(1, min(int(index), max(1, total)))
+        if index != self.current_index:
+            self.current_index = index
+            self._dirty = True
+            self._schedule_flush()
+        return self.current_index
+
+    # ============================ Frames ============================
+    def snapshot(self) -> dict:
+        """حالة كاملة لإطار timer_state (الثواني للتوافق + المللي ثانية للدقة)."""
+        now = time.monotonic()
+        a_ms = self._left('A', now)
+        b_ms = self._left('B', now)
+        return {
+            'active_side': self.active_side,
+            'a_left': math.ceil(a_ms / 1000),
+            'b_left': math.ceil(b_ms / 1000),
+            'a_ms': a_ms,
+            'b_ms': b_ms,
+            'is_running': self.is_running,
+            'last_started_at': self._started_wall.isoformat() if self._started_wall else None,
+            'player_a_name': self.player_a_name,
+            'player_b_name': self.player_b_name,
+            'v': self.version,
+        }
+
+    def tick(self) -> dict:
+        """إطار مختصر لتصحيح العد المحلي أثناء الجريان."""
+        now = time.monotonic()
+        return {
+            's': self.active_side,
+            'a': self._left('A', now),
+            'b': self._left('B', now),
+            'v': self.version,
+        }
+
+    # ============================== Flushing ==============================
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        try:
+            await asyncio.sleep(_setting_ms('LIVE_STATE_FLUSH_MS', DEFAULT_FLUSH_MS) / 1000.0)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    def _checkpoint(self) -> dict:
+        # الرصيد المحفوظ هو رصيد لحظة البدء + last_started_at؛ نفس دلالة الأعمدة القديمة
+        fields = {
+            'current_index': self.current_index,
+            'is_running': self.is_running,
+            'last_started_at': self._started_wall,
+            'updated_at': timezone.now(),
+        }
+        if self.active_side in SIDES:
+            fields['active_side'] = self.active_side
+        a_ms, b_ms = self.a_ms, self.b_ms
+        if self.is_running and self._started_wall is not None:
+            # أجزاء الثانية المستهلكة قبل نقطة الحفظ تُحمَّل على last_started_at
+            if self.active_side == 'A':
+                a_ms = math.ceil(a_ms / 1000) * 1000
+                fields['last_started_at'] = self._started_wall + timedelta(milliseconds=a_ms - self.a_ms)
+            else:
+                b_ms = math.ceil(b_ms / 1000) * 1000
+                fields['last_started_at'] = self._started_wall + timedelta(milliseconds=b_ms - self.b_ms)
+        fields['a_time_left_seconds'] = math.ceil(a_ms / 1000)
+        fields['b_time_left_seconds'] = math.ceil(b_ms / 1000)
+        return fields
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            fields = self._checkpoint()
+            try:
+                await sync_to_async(self._write)(fields)
+            except Exception as e:
+                logger.error(f"Time clock checkpoint error for session {self.session_id}: {e}")
+                self._dirty = True
+
+    def _write(self, fields):
+        from games.models import TimeGameProgress
+
+        TimeGameProgress.objects.filter(session_id=self.session_id).update(**fields)
+
+
+# =========================== Process registry ===========================
+# المفتاح (origin, session_id): ساعة واحدة لكل جلسة في العملية (أو لكل عامل محاكى)
+_clocks = {}
+
+
+def acquire(session_id) -> TimeClock:
+    """يرجع ساعة الجلسة المشتركة (وينشئها عند أول مستهلك)."""
+    key = (ws_groups.origin(), str(session_id))
+    clock = _clocks.get(key)
+    if clock is None:
+        clock = TimeClock(session_id)
+        _clocks[key] = clock
+    clock._refs += 1
+    return clock
+
+
+def get(session_id):
+    return _clocks.get((ws_groups.origin(), str(session_id)))
+
+
+def copies(session_id):
+    """كل نسخ الساعة في العملية — أكثر من واحدة فقط مع عمال محاكين (ws_loadtest)."""
+    sid = str(session_id)
+    return [clock for key, clock in _clocks.items() if key[1] == sid]
+
+
+async def release(clock: TimeClock):
+    """يُستدعى عند قطع الاتصال: نحفظ المعلّق ونحرّر الساعة عند آخر مستهلك."""
+    clock._refs = max(0, clock._refs - 1)
+    await clock.flush()
+    key = (clock.worker, clock.session_id)
+    if clock._refs == 0 and _clocks.get(key) is clock:
+        if clock._flush_task and not clock._flush_task.done():
+            clock._flush_task.cancel()
+        del _clocks[key]
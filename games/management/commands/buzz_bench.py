@@ -0,0 +1,86 @@
+import asyncio
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from games import buzzer
+
+
+class Command(BaseCommand):
+    help = "قياس زمن قرار حَكَم البازر (نافذة الجمع + ترتيب RTT) لعدة جولات متزامنة."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200)
+        parser.add_argument('--contestants', type=int, default=8)
+        parser.add_argument('--sessions', type=int, default=20, help='جلسات متوازية في نفس الوقت')
+        parser.add_argument('--window-ms', type=int, default=None)
+        parser.add_argument('--backend', choices=['local', 'configured'], default='local')
+
+    def handle(self, *args, **opts):
+        if opts['backend'] == 'local':
+            buzzer._backend = buzzer.LocalBackend()
+        backend = buzzer.get_backend()
+        if opts['window_ms'] is not None:
+            settings.GAME_SETTINGS['BUZZ_WINDOW_MS'] = opts['window_ms']
+
+        window = buzzer.window_ms()
+        results = asyncio.run(self._run(opts['rounds'], opts['contestants'], opts['sessions']))
+        overheads = sorted(results['overhead_ms'])
+
+        def pct(p):
+            return overheads[min(len(overheads) - 1, int(len(overheads) * p / 100))]
+
+        self.stdout.write(f"backend={type(backend).__name__} window={window}ms "
+                          f"rounds={opts['rounds']} sessions={opts['sessions']} contestants={opts['contestants']}")
+        self.stdout.write(f"decision latency beyond window: "
+                          f"mean={statistics.mean(overheads):.3f}ms p50={pct(50):.3f}ms "
+                          f"p95={pct(95):.3f}ms p99={pct(99):.3f}ms max={overheads[-1]:.3f}ms")
+        self.stdout.write(f"buzzes={results['buzzes']} decisions={results['decisions']} "
+                          f"throughput={results['buzzes'] / results['elapsed']:.0f} buzz/s")
+        if results['split'] or results['decisions'] != opts['rounds'] * opts['sessions']:
+            self.stdout.write(self.style.ERROR(f"inconsistent decisions: split={results['split']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("every round produced exactly one winner"))
+
+    async def _run(self, rounds, contestants, sessions):
+        overhead, buzzes, decisions, split = [], 0, 0, 0
+        window = buzzer.window_ms()
+        started = time.perf_counter()
+
+        async def one_round(r, s):
+            key = f"bench_{s}_{r}"
+            pressed = []
+
+            async def press(i):
+                # انتشار عشوائي داخل النافذة + RTT مختلف لكل اتصال
+                await asyncio.sleep(random.uniform(0, window / 2000.0))
+                pressed.append(time.perf_counter())
+                return await buzzer.arbitrate(
+                    key, {'name': f"p{i}", 'team': 'team1' if i % 2 else 'team2'},
+                    rtt_ms=random.uniform(10, 250), ttl_seconds=5,
+                )
+
+            out = await asyncio.gather(*(press(i) for i in range(contestants)))
+            # من أول ضغطة (فتح النافذة) حتى وصول القرار لآخر متسابق
+            elapsed_ms = (time.perf_counter() - min(pressed)) * 1000.0
+            winners = {w['id'] for _, w in out if w}
+            accepted = sum(1 for ok, _ in out if ok)
+            await buzzer.reset_async(key)
+            return elapsed_ms - window, accepted, len(winners)
+
+        for r in range(rounds):
+            out = await asyncio.gather(*(one_round(r, s) for s in range(sessions)))
+            for ms, accepted, distinct in out:
+                overhead.append(max(0.0, ms))
+                buzzes += contestants
+                decisions += accepted
+                if accepted != 1 or distinct != 1:
+                    split += 1
+
+        return {
+            'overhead_ms': overhead, 'buzzes': buzzes, 'decisions': decisions,
+            'split': split, 'elapsed': time.perf_counter() - started,
+        }
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("مقارنة الكاش المشترك بين العمليات (games.shared_cache) مع LocMem و Redis: "
+            "سرعة get/set/add في عملية واحدة، وسباق add من عدة عمال على نفس الأقفال (هل يفوز أكثر من عامل؟).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=20000, help='عمليات لكل نوع في اختبار السرعة')
+        parser.add_argument('--workers', type=int, default=4, help='عمليات متوازية في سباق add')
+        parser.add_argument('--keys', type=int, default=2000, help='أقفال يتسابق عليها العمال')
+        parser.add_argument('--path', default=None, help='ملف الكاش المشترك (افتراضياً ملف مؤقت)')
+        parser.add_argument('--redis', default=None, help='عنوان Redis (افتراضياً REDIS_CACHE_URL إن وُجد)')
+
+    def handle(self, *args, **opts):
+        path = opts['path'] or os.path.join(tempfile.gettempdir(), f"wesh-cache-bench-{os.getpid()}")
+        backends = self._backends(path, opts['redis'] or getattr(settings, 'REDIS_CACHE_URL', ''))
+        try:
+            for name, factory in backends.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self._throughput(factory(), opts['ops'])
+                self._race(factory, opts['workers'], opts['keys'])
+        finally:
+            if not opts['path'] and os.path.exists(path):
+                os.unlink(path)
+
+    def _backends(self, path, redis_url):
+        from django.core.cache.backends.locmem import LocMemCache
+        from games.shared_cache import SharedMemoryCache
+
+        backends = {
+            'locmem': lambda: LocMemCache('cache-bench', {'OPTIONS': {'MAX_ENTRIES': 100000}}),
+            'shared': lambda: SharedMemoryCache(path, {'OPTIONS': {'MAX_ENTRIES': 65536, 'SLOT_SIZE': 1024}}),
+        }
+        if redis_url:
+            try:
+                from django_redis.cache import RedisCache
+
+                def make_redis():
+                    return RedisCache(redis_url, {'OPTIONS': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'}})
+
+                make_redis().get('cache_bench_ping')
+                backends['redis'] = make_redis
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"redis skipped: {e}"))
+        return backends
+
+    def _throughput(self, cache, ops):
+        run = uuid.uuid4().hex[:8]
+        # قيمة بحجم ترتيب حروف الجلسة (letters_order_*)
+        value = list(range(25))
+        timings = {}
+
+        started = time.perf_counter()
+        for i in range(ops):
+            cache.set(f"bench_{run}_{i % 1000}", value, 60)
+        timings['set'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(ops):
+            cache.get(f"bench_{run}_{i % 1000}")
+        timings['get'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(ops):
+            cache.add(f"bench_add_{run}_{i}", 1, 5)
+        timings['add'] = time.perf_counter() - started
+
+        self.stdout.write("  " + "  ".join(
+            f"{op}={ops / elapsed:,.0f}/s ({elapsed / ops * 1e6:.1f}us)" for op, elapsed in timings.items()
+        ))
+
+    def _race(self, factory, workers, keys):
+        ctx = multiprocessing.get_context('fork')
+        run = uuid.uuid4().hex[:8]
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+
+        def contend():
+            cache = factory()
+            barrier.wait()
+            won = [k for k in range(keys) if cache.add(f"race_{run}_{k}", os.getpid(), 30)]
+            results.put(won)
+
+        procs = [ctx.Process(target=contend) for _ in range(workers)]
+        started = time.perf_counter()
+        for p in procs:
+            p.start()
+        winners = Counter()
+        for _ in procs:
+            winners.update(results.get(timeout=120))
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        split = sum(1 for n in winners.values() if n > 1)
+        line = f"  race: {workers} workers x {keys} locks in {elapsed:.2f}s — "
+        if split or len(winners) != keys:
+            self.stdout.write(line + self.style.ERROR(f"{split} locks won by more than one worker"))
+        else:
+            self.stdout.write(line + self.style.SUCCESS("every lock won exactly once"))
@@ -1,22 +1,27 @@
+import time
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from games.models import GameSession
 
-class BaseCommandExpire(BaseCommand):
-    help = "تعطيل الجلسات المنتهية (مجانية بعد 1 ساعة / مدفوعة بعد 72 ساعة)."
+from games import session_reaper
+
+
+class Command(BaseCommand):
+    help = ("تعطيل الجلسات التي تجاوزت expires_at على دفعات، مع إغلاق اتصالاتها وحذف مفاتيح كاشها "
+            "(مرة واحدة، أو --loop كعملية دائمة بدل مهمة daphne الداخلية).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=session_reaper.DEFAULT_BATCH)
+        parser.add_argument('--max-batches', type=int, default=0, help='حد الدفعات لكل دورة (0 = حتى النهاية)')
+        parser.add_argument('--loop', action='store_true', help='تكرار الدورة كل --interval ثانية')
+        parser.add_argument('--interval', type=int, default=60)
 
-    def handle(self, *args, **options):
-        now = timezone.now()
-        # مجانية: 1 ساعة
-        free_qs = GameSession.objects.filter(
-            is_active=True, package__is_free=True,
-            created_at__lt=now - timedelta(hours=1)
-        )
-        # مدفوعة: 72 ساعة
-        paid_qs = GameSession.objects.filter(
-            is_active=True, package__is_free=False,
-            created_at__lt=now - timedelta(hours=72)
-        )
-        total = free_qs.update(is_active=False, is_completed=True) + paid_qs.update(is_active=False, is_completed=True)
-        self.stdout.write(self.style.SUCCESS(f"Sessions expired: {total}"))
\ No newline at end of file
+    def handle(self, *args, **opts):
+        while True:
+            stats = session_reaper.reap(opts['batch_size'], opts['max_batches'] or None)
+            self.stdout.write(self.style.SUCCESS(
+                f"Sessions expired: {stats['rows']} "
+                f"(batches={stats['batches']}, cache_keys={stats['keys']}, {stats['seconds']}s)"
+            ))
+            if not opts['loop']:
+                return
+            time.sleep(max(1, opts['interval']))
@@ -0,0 +1,146 @@
+import shutil
+import subprocess
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from games.sharding import HashRing, node_label, parse_nodes, shard_key
+
+# مفاتيح الكاش (KEY_PREFIX) بلا معرّف جلسة تُوزَّع بالمفتاح كاملاً؛ صناديق القنوات بلا جلسة لحظية (expiry) فلا تُنقل
+CACHE_PREFIX = 'wesh:'
+
+
+class Command(BaseCommand):
+    help = ("حلقة عقد Redis الموزّعة بمعرّف الجلسة: عرض التوزيع، خطة إضافة/إزالة عقدة، "
+            "نقل مفاتيح الجلسات للعقد الجديدة، وتشغيل عدة عقد محلية للتجربة.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', default=None,
+                            help='العقد الحالية (افتراضياً REDIS_SHARDS أو REDIS_URL)')
+        parser.add_argument('--plan', default=None, metavar='URLS',
+                            help='الحلقة الجديدة: كم جلسة تنتقل ولأين')
+        parser.add_argument('--migrate', default=None, metavar='URLS',
+                            help='انقل مفاتيح الجلسات من العقد الحالية لمالكها في الحلقة الجديدة')
+        parser.add_argument('--copy', action='store_true', help='مع --migrate: انسخ بدون حذف من المصدر')
+        parser.add_argument('--sample', type=int, default=100000, help='عدد الجلسات الاصطناعية للقياس')
+        parser.add_argument('--local', type=int, default=0, metavar='N',
+                            help='شغّل N عقدة redis-server محلية (حتى Ctrl-C) واطبع إعداد البيئة')
+        parser.add_argument('--base-port', type=int, default=6380)
+
+    def handle(self, *args, **opts):
+        if opts['local']:
+            return self._local(opts['local'], opts['base_port'])
+
+        current = parse_nodes(opts['nodes']) or list(getattr(settings, 'REDIS_SHARDS', []))
+        if not current and getattr(settings, 'REDIS_URL', ''):
+            current = [settings.REDIS_URL]
+        if not current:
+            raise CommandError("لا توجد عقد: حدّد --nodes أو REDIS_SHARDS")
+        replicas = getattr(settings, 'REDIS_SHARD_REPLICAS', 128)
+        ring = HashRing(current, replicas)
+        sessions = [str(uuid.uuid4()) for _ in range(opts['sample'])]
+
+        self._distribution('current', ring, sessions)
+        target = opts['plan'] or opts['migrate']
+        if not target:
+            return
+        new_ring = HashRing(parse_nodes(target), replicas)
+        self._distribution('target', new_ring, sessions)
+        self._plan(ring, new_ring, sessions)
+        if opts['migrate']:
+            self._migrate(ring, new_ring, opts['copy'])
+
+    # ============================ Reports ============================
+    def _distribution(self, title, ring, sessions):
+        counts = Counter(node_label(ring.node_for(s)) for s in sessions)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{title}: {len(ring.nodes)} nodes"))
+        for node in ring.nodes:
+            label = node_label(node)
+            self.stdout.write(f"  {label:<32} {100.0 * counts[label] / len(sessions):6.2f}% of sessions")
+
+    def _plan(self, ring, new_ring, sessions):
+        moves = Counter(
+            (node_label(ring.node_for(s)), node_label(new_ring.node_for(s)))
+            for s in sessions
+        )
+        moved = sum(n for (src, dst), n in moves.items() if src != dst)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"rebalance: {100.0 * moved / len(sessions):.2f}% of sessions change node"
+        ))
+        for (src, dst), n in sorted(moves.items()):
+            if src != dst:
+                self.stdout.write(f"  {src} -> {dst}: {100.0 * n / len(sessions):.2f}%")
+
+    # ============================ Migration ============================
+    @staticmethod
+    def _placement(key: str):
+        """المفتاح الذي تُحسب به العقدة، أو None لمفتاح لحظي لا يُنقل."""
+        session = shard_key(key)
+        if session != key:
+            return session
+        if key.startswith(CACHE_PREFIX):
+            return key
+        return None
+
+    def _migrate(self, ring, new_ring, copy_only):
+        import redis
+
+        clients = {}
+
+        def client(node):
+            label = node_label(node)
+            if label not in clients:
+                clients[label] = redis.Redis.from_url(node)
+            return clients[label]
+
+        moved = skipped = 0
+        for node in ring.nodes:
+            source = client(node)
+            source_label = node_label(node)
+            for raw in source.scan_iter(count=1000):
+                key = raw.decode('utf8', 'replace')
+                placement = self._placement(key)
+                if placement is None:
+                    skipped += 1
+                    continue
+                destination = new_ring.node_for(placement)
+                if node_label(destination) == source_label:
+                    continue
+                payload = source.dump(raw)
+                if payload is None:
+                    continue
+                ttl = source.pttl(raw)
+                client(destination).restore(raw, max(0, ttl), payload, replace=True)
+                if not copy_only:
+                    source.delete(raw)
+                moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"migrated {moved} keys ({'copied' if copy_only else 'moved'}), "
+            f"left {skipped} transient channel keys in place"
+        ))
+
+    # ============================ Local nodes ============================
+    def _local(self, count, base_port):
+        binary = shutil.which('redis-server')
+        if not binary:
+            raise CommandError("redis-server غير موجود في PATH")
+        ports = [base_port + i for i in range(count)]
+        procs = [
+            subprocess.Popen([binary, '--port', str(p), '--save', '', '--appendonly', 'no'],
+                             stdout=subprocess.DEVNULL)
+            for p in ports
+        ]
+        urls = ','.join(f"redis://127.0.0.1:{p}/0" for p in ports)
+        self.stdout.write(self.style.SUCCESS(f"{count} redis nodes up; run workers with:"))
+        self.stdout.write(f"  FORCE_REDIS=True REDIS_SHARDS={urls}")
+        try:
+            while all(p.poll() is None for p in procs):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for p in procs:
+                p.terminate()
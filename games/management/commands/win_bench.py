@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from games import hexboard, win_paths
+
+
+class Command(BaseCommand):
+    help = ("قياس كشف الفوز في خلية الحروف لكل حجم شبكة: المتتبّع التدريجي (union-find) "
+            "مقابل إعادة الحساب الكاملة مع كل تلوين، مع التحقق من تطابق النتيجتين.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=300, help='جولات عشوائية لكل حجم')
+        parser.add_argument('--uncolor', type=float, default=0.15,
+                            help='نسبة التلوينات التي تعيد خلية ملوّنة إلى normal أو تبدّل فريقها')
+        parser.add_argument('--sizes', default='3,4,5,6,7')
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts['seed'])
+        for n in (int(s) for s in opts['sizes'].split(',') if s.strip()):
+            moves = [self._game(rng, n, opts['uncolor']) for _ in range(opts['games'])]
+            total = sum(len(m) for m in moves)
+
+            started = time.perf_counter()
+            incremental = []
+            for game in moves:
+                tracker = win_paths.WinTracker(n)
+                incremental.append([tracker.apply(i, s) is not None for i, s in game])
+            inc_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            full = []
+            for game in moves:
+                board, winner, wins = hexboard.EMPTY, None, []
+                for i, s in game:
+                    board = hexboard.with_cell(board, i, s)
+                    current = win_paths.check(board, n)
+                    team = current['team'] if current else None
+                    wins.append(team is not None and team != winner)
+                    winner = team
+                full.append(wins)
+            full_time = time.perf_counter() - started
+
+            mismatches = sum(a != b for x, y in zip(incremental, full) for a, b in zip(x, y))
+            line = (f"{n}x{n}: {total} moves, {sum(map(sum, incremental))} wins — "
+                    f"incremental {inc_time / total * 1e6:.1f}us/move, "
+                    f"full recompute {full_time / total * 1e6:.1f}us/move ")
+            if mismatches:
+                self.stdout.write(line + self.style.ERROR(f"{mismatches} mismatched win events"))
+            else:
+                self.stdout.write(line + self.style.SUCCESS("(identical win events)"))
+
+    @staticmethod
+    def _game(rng, n, uncolor):
+        """تلوينات عشوائية حتى تمتلئ اللوحة، مع تراجعات بنسبة uncolor."""
+        cells = list(range(n * n))
+        rng.shuffle(cells)
+        colored, moves = [], []
+        for index in cells:
+            moves.append((index, rng.choice(('team1', 'team2'))))
+            colored.append(index)
+            if rng.random() < uncolor:
+                moves.append((rng.choice(colored), rng.choice(hexboard.STATES)))
+        return moves
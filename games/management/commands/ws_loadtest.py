@@ -0,0 +1,371 @@
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+GAMES = ('letters', 'pictures', 'time', 'feud')
+# اسم اللعبة في GamePackage.game_type
+PACKAGE_TYPES = {'letters': 'letters', 'pictures': 'images', 'time': 'time', 'feud': 'feud'}
+
+
+class Client:
+    """اتصال WebSocket داخل العملية (بدون شبكة) يعدّ الإطارات ويوقظ من ينتظر نوعاً معيناً."""
+
+    def __init__(self, app, path):
+        from channels.testing import WebsocketCommunicator
+
+        self.comm = WebsocketCommunicator(app, path)
+        self.received = 0
+        self.sent = 0
+        self._waiters = []
+        self._pump_task = None
+
+    async def connect(self) -> float:
+        started = time.perf_counter()
+        connected, _ = await self.comm.connect(timeout=10)
+        if not connected:
+            raise RuntimeError(f"connect refused: {self.comm.scope['path']}")
+        elapsed = (time.perf_counter() - started) * 1000.0
+        self._pump_task = asyncio.ensure_future(self._pump())
+        return elapsed
+
+    async def _pump(self):
+        while True:
+            out = await self.comm.receive_output(timeout=3600)
+            if out.get('type') != 'websocket.send':
+                return
+            self.received += 1
+            try:
+                kind = json.loads(out.get('text') or '{}').get('type')
+            except ValueError:
+                continue
+            for waiter in list(self._waiters):
+                if waiter[0] == kind and not waiter[1].done():
+                    waiter[1].set_result(time.perf_counter())
+                    self._waiters.remove(waiter)
+
+    def expect(self, kind):
+        """يُسجَّل قبل الإرسال؛ النتيجة لحظة وصول أول إطار من هذا النوع."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((kind, future))
+        return future
+
+    async def send(self, message):
+        self.sent += 1
+        await self.comm.send_to(text_data=json.dumps(message))
+
+    async def close(self):
+        if self._pump_task:
+            self._pump_task.cancel()
+        try:
+            await self.comm.disconnect(timeout=10)
+        except Exception:
+            pass
+
+
+def worker_app(app, worker):
+    """تطبيق ASGI لعامل محاكى: كل ما يشغّله الاتصال يرى origin وحالة حيّة خاصة بهذا العامل."""
+    from games import ws_groups
+
+    async def application(scope, receive, send):
+        ws_groups.simulated_worker.set(worker)
+        return await app(scope, receive, send)
+    return application
+
+
+class Room:
+    def __init__(self, game, session_id, contestants):
+        self.game = game
+        self.session_id = session_id
+        self.contestants_count = contestants
+        self.host = self.display = None
+        self.contestants = []
+
+    def clients(self):
+        return [self.host, self.display, *self.contestants]
+
+    async def open(self, apps, connect_ms):
+        """apps: تطبيق لكل عامل؛ المقدم على الأول والعرض على الثاني والمتسابقون بالتناوب."""
+        base = f"/ws/{self.game}/{self.session_id}/"
+        self.host = Client(apps[0], base + "?role=host")
+        self.display = Client(apps[1 % len(apps)], base + "?role=display")
+        self.contestants = [
+            Client(apps[i % len(apps)], base + "?role=contestant") for i in range(self.contestants_count)
+        ]
+        for client in self.clients():
+            connect_ms.append(await client.connect())
+
+
+class Command(BaseCommand):
+    help = ("حِمل WebSocket اصطناعي على المستهلكات الأربعة داخل عملية واحدة (بدون شبكة): "
+            "N جلسة × (مقدم + عرض + M متسابق) على قاعدة اختبار مؤقتة، "
+            "ويقيس زمن الاتصال وزمن وصول الحدث لشاشة العرض والرسائل/ث واستعلامات DB لكل رسالة.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=10, help='جلسات متزامنة لكل لعبة')
+        parser.add_argument('--contestants', type=int, default=4, help='متسابقون لكل جلسة')
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--games', default=','.join(GAMES), help='letters,pictures,time,feud')
+        parser.add_argument('--layer', choices=['memory', 'configured'], default='memory',
+                            help='memory = InMemoryChannelLayer، configured = CHANNEL_LAYERS الحالية (Redis محلي مثلاً)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='عمال محاكون داخل العملية (origin وحالة حيّة لكل عامل)؛ المقدم والعرض على عاملين مختلفين')
+        parser.add_argument('--timeout', type=float, default=5.0, help='أقصى انتظار لحدث واحد (ثوانٍ)')
+        parser.add_argument('--max-p95-ms', type=float, default=None,
+                            help='يفشل الأمر إن تجاوز p95 لأي حدث هذا الحد (لبوابات CI)')
+
+    def handle(self, *args, **opts):
+        games = [g.strip() for g in opts['games'].split(',') if g.strip()]
+        unknown = set(games) - set(GAMES)
+        if unknown:
+            self.stderr.write(self.style.ERROR(f"unknown games: {', '.join(sorted(unknown))}"))
+            return
+
+        if opts['layer'] == 'memory':
+            from channels.layers import channel_layers
+            settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+            channel_layers.backends = {}
+
+        # قاعدة اختبار مؤقتة: لا نلمس بيانات حقيقية ولا نحتاج شبكة
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        failed = False
+        try:
+            for game in games:
+                report = async_to_sync(self._run_game)(game, opts)
+                failed = self._report(game, report, opts) or failed
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if failed:
+            raise SystemExit(1)
+
+    # ============================ Fixtures ============================
+    def _fixtures(self, game, sessions):
+        from games.models import (
+            FamilyFeudAnswer, FamilyFeudQuestion, GamePackage, GameSession, PictureRiddle, TimeRiddle,
+        )
+
+        package = GamePackage.objects.create(
+            game_type=PACKAGE_TYPES[game], package_number=900 + GAMES.index(game), is_free=False, price=1,
+        )
+        if game == 'pictures':
+            PictureRiddle.objects.bulk_create([
+                PictureRiddle(package=package, order=i, image_url=f"https://example.com/{i}.png", answer=f"a{i}")
+                for i in range(1, 11)
+            ])
+        elif game == 'time':
+            TimeRiddle.objects.bulk_create([
+                TimeRiddle(package=package, order=i, image_url=f"https://example.com/{i}.png", answer=f"a{i}")
+                for i in range(1, 11)
+            ])
+        elif game == 'feud':
+            for order in (1, 2):
+                question = FamilyFeudQuestion.objects.create(package=package, order=order, question_text=f"q{order}")
+                FamilyFeudAnswer.objects.bulk_create([
+                    FamilyFeudAnswer(question=question, rank=r, text=f"a{r}", points=50 - r * 5)
+                    for r in range(1, 6)
+                ])
+        return [
+            str(GameSession.objects.create(package=package, game_type=PACKAGE_TYPES[game]).id)
+            for _ in range(sessions)
+        ]
+
+    # ============================ Scripts ============================
+    async def _action(self, room, send, expect, latencies, name, timeout):
+        """يرسل (send) ويقيس حتى يصل expect لشاشة العرض."""
+        arrived = room.display.expect(expect)
+        started = time.perf_counter()
+        await send()
+        try:
+            at = await asyncio.wait_for(arrived, timeout)
+        except asyncio.TimeoutError:
+            latencies.setdefault('timeouts', []).append(name)
+            return
+        latencies.setdefault(name, []).append((at - started) * 1000.0)
+
+    async def _buzz_storm(self, room, latencies, timeout):
+        """كل المتسابقين يضغطون معاً؛ الزمن من أول ضغطة حتى إعلان الفائز على العرض."""
+        async def storm():
+            await asyncio.gather(*(
+                c.send({'type': 'contestant_buzz', 'contestant_name': f"p{i}",
+                        'team': 'team1' if i % 2 else 'team2', 'timestamp': time.time()})
+                for i, c in enumerate(room.contestants)
+            ))
+        await self._action(room, storm, 'contestant_buzz_accepted', latencies, 'buzz', timeout)
+        await self._action(room, lambda: room.host.send({'type': 'buzz_reset'}),
+                           'buzz_reset_by_host', latencies, 'buzz_reset', timeout)
+
+    async def _script(self, room, rounds, latencies, timeout):
+        host = room.host
+        if room.game == 'time':
+            await self._action(room, lambda: host.send({'type': 'timer_reset', 'seconds_each': 600, 'start_side': 'A'}),
+                               'timer_state', latencies, 'timer_reset', timeout)
+        for r in range(rounds):
+            if room.game == 'letters':
+                if room.contestants:
+                    await self._buzz_storm(room, latencies, timeout)
+                await self._action(room, lambda: host.send({
+                    'type': 'update_cell_state', 'letter': f"L{r % 25}", 'cell_index': r % 25,
+                    'state': 'team1' if r % 2 else 'team2',
+                }), 'cell_state_updated', latencies, 'cell_click', timeout)
+                await self._action(room, lambda: host.send({'type': 'update_scores', 'team1_score': r, 'team2_score': 0}),
+                                   'scores_updated', latencies, 'scores', timeout)
+                await self._action(room, lambda: host.send({'type': 'letter_selected', 'letter': f"L{(r + 1) % 25}"}),
+                                   'letter_selected', latencies, 'letter_select', timeout)
+            elif room.game == 'pictures':
+                if room.contestants:
+                    await self._buzz_storm(room, latencies, timeout)
+                await self._action(room, lambda: host.send({'type': 'puzzle_nav', 'dir': 'next' if r % 2 == 0 else 'prev'}),
+                                   'puzzle_updated', latencies, 'puzzle_nav', timeout)
+            elif room.game == 'time':
+                side = 'A' if r % 2 == 0 else 'B'
+                tapper = room.contestants[r % 2 % len(room.contestants)] if room.contestants else None
+                if tapper is not None:
+                    await self._action(room, lambda: tapper.send({'type': 'contestant_stop_and_switch', 'side': side}),
+                                       'timer_state', latencies, 'stop_and_switch', timeout)
+                else:
+                    await self._action(room, lambda: host.send({'type': 'timer_start', 'side': side}),
+                                       'timer_state', latencies, 'timer_start', timeout)
+            elif room.game == 'feud':
+                if room.contestants:
+                    await self._buzz_storm(room, latencies, timeout)
+                await self._action(room, lambda: host.send({'type': 'set_question', 'index': r % 2 + 1}),
+                                   'question_changed', latencies, 'set_question', timeout)
+                for rank in (1, 2, 3):
+                    await self._action(room, lambda: host.send({'type': 'reveal_answer', 'rank': rank}),
+                                       'answer_revealed', latencies, 'reveal', timeout)
+
+    async def _run_game(self, game, opts):
+        from channels.routing import URLRouter
+        from asgiref.sync import sync_to_async
+        from games import routing
+
+        app = URLRouter(routing.websocket_urlpatterns)
+        workers = max(1, opts['workers'])
+        apps = [worker_app(app, w) for w in range(workers)] if workers > 1 else [app]
+        session_ids = await sync_to_async(self._fixtures)(game, opts['sessions'])
+        rooms = [Room(game, sid, opts['contestants']) for sid in session_ids]
+
+        connect_ms, latencies = [], {}
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        # استعلامات المستهلكات (sync_to_async) تمر على اتصال خيط handle()، وأي اتصال جديد يُفتح أثناء القياس
+        def attach(sender=None, connection=connection, **kwargs):
+            connection.execute_wrappers.append(count)
+
+        def detach():
+            connection_created.disconnect(attach)
+            for conn in connections.all(initialized_only=True):
+                if count in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(count)
+
+        await sync_to_async(attach)()
+        connection_created.connect(attach)
+        try:
+            await asyncio.gather(*(room.open(apps, connect_ms) for room in rooms))
+            connect_queries = queries[0]
+            queries[0] = 0
+
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                self._script(room, opts['rounds'], latencies, opts['timeout']) for room in rooms
+            ))
+            clients = [c for room in rooms for c in room.clients()]
+            diverged = self._diverged(game, rooms)
+            # القطع يكتب المعلّق (write-behind) — يُحسب ضمن كلفة الرسائل
+            await asyncio.gather(*(c.close() for c in clients))
+            elapsed = time.perf_counter() - started
+        finally:
+            await sync_to_async(detach)()
+
+        return {
+            'connect_ms': connect_ms,
+            'connect_queries': connect_queries,
+            'latencies': latencies,
+            'sent': sum(c.sent for c in clients),
+            'received': sum(c.received for c in clients),
+            'queries': queries[0],
+            'elapsed': elapsed,
+            'clients': len(clients),
+            'workers': workers,
+            'diverged': diverged,
+        }
+
+    @staticmethod
+    def _diverged(game, rooms):
+        """جلسات اختلفت فيها نسخ الحالة الحيّة بين العمال بعد انتهاء السيناريو."""
+        from games import live_letters, live_time
+
+        if game == 'letters':
+            copies = live_letters.copies
+
+            def view(state):
+                return (dict(state.cell_states), state.board, state.current_letter,
+                        state.team1_score, state.team2_score, state.winner_team, state.is_completed)
+        elif game == 'time':
+            copies = live_time.copies
+
+            def view(clock):
+                # المللي ثانية تختلف بزمن توصيل الإطار؛ المقارنة على الحالة والنسخة
+                return (clock.current_index, clock.active_side, clock.is_running, clock.version, clock.owner)
+        else:
+            return []
+
+        diverged = []
+        for room in rooms:
+            views = [view(state) for state in copies(room.session_id)]
+            if any(v != views[0] for v in views[1:]):
+                diverged.append(room.session_id)
+        return diverged
+
+    # ============================ Report ============================
+    def _report(self, game, report, opts) -> bool:
+        def pct(values, p):
+            return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+        connect = sorted(report['connect_ms'])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{game}: sessions={opts['sessions']} contestants={opts['contestants']} "
+            f"rounds={opts['rounds']} clients={report['clients']} workers={report['workers']}"
+        ))
+        self.stdout.write(f"  connect: p50={pct(connect, 50):.2f}ms p95={pct(connect, 95):.2f}ms "
+                          f"max={connect[-1]:.2f}ms queries/connect={report['connect_queries'] / len(connect):.2f}")
+
+        failed = False
+        timeouts = report['latencies'].pop('timeouts', [])
+        for name, values in sorted(report['latencies'].items()):
+            values.sort()
+            p95 = pct(values, 95)
+            self.stdout.write(f"  {name:<16} n={len(values):<6} mean={statistics.mean(values):.2f}ms "
+                              f"p50={pct(values, 50):.2f}ms p95={p95:.2f}ms p99={pct(values, 99):.2f}ms "
+                              f"max={values[-1]:.2f}ms")
+            if opts['max_p95_ms'] is not None and p95 > opts['max_p95_ms']:
+                failed = True
+
+        elapsed = max(report['elapsed'], 1e-9)
+        self.stdout.write(f"  messages: sent={report['sent']} received={report['received']} "
+                          f"throughput={(report['sent'] + report['received']) / elapsed:.0f} msg/s "
+                          f"db_queries/msg={report['queries'] / max(1, report['sent']):.3f}")
+        if timeouts:
+            failed = True
+            self.stdout.write(self.style.ERROR(f"  timeouts: {len(timeouts)} ({', '.join(sorted(set(timeouts)))})"))
+        elif failed:
+            self.stdout.write(self.style.ERROR(f"  p95 above {opts['max_p95_ms']}ms"))
+        elif not report['diverged']:
+            self.stdout.write(self.style.SUCCESS("  every event reached the display"))
+        if report['diverged']:
+            failed = True
+            self.stdout.write(self.style.ERROR(
+                f"  live state diverged across workers in {len(report['diverged'])} session(s)"
+            ))
+        return failed
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+# حتى 7x7 — منسوخة هنا عمداً: الهجرة لا تستورد كود التطبيق الحي
+MAX_CELLS = 49
+
+
+def fill_boards(apps, schema_editor):
+    """
+    الصفوف الحالية: مفاتيح أرقام الخلايا تتحول لبتات. مفاتيح الحروف القديمة تبقى في cell_states
+    (ترتيب حروف الجلسة في الكاش لا في DB) وتُدمج في اللوحة عند بناء اللقطة (hexboard.merge_letters).
+    """
+    LettersGameProgress = apps.get_model('games', 'LettersGameProgress')
+    for progress in LettersGameProgress.objects.exclude(cell_states={}).only('id', 'cell_states').iterator():
+        if not isinstance(progress.cell_states, dict):
+            continue
+        team1 = team2 = 0
+        for key, state in progress.cell_states.items():
+            try:
+                index = int(key)
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < MAX_CELLS:
+                continue
+            bit = 1 << index
+            team1, team2 = team1 & ~bit, team2 & ~bit
+            if state == 'team1':
+                team1 |= bit
+            elif state == 'team2':
+                team2 |= bit
+        if team1 or team2:
+            LettersGameProgress.objects.filter(id=progress.id).update(team1_cells=team1, team2_cells=team2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0029_alter_gamesession_team1_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lettersgameprogress',
+            name='team1_cells',
+            field=models.BigIntegerField(default=0, verbose_name='خلايا الفريق الأول'),
+        ),
+        migrations.AddField(
+            model_name='lettersgameprogress',
+            name='team2_cells',
+            field=models.BigIntegerField(default=0, verbose_name='خلايا الفريق الثاني'),
+        ),
+        migrations.RunPython(fill_boards, migrations.RunPython.noop),
+    ]
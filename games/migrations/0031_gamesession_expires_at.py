@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:53
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# قواعد session_control.compute_deadline منسوخة هنا عمداً: الهجرة لا تستورد كود التطبيق الحي
+FREE_SESSION_TTL = timedelta(hours=1)
+TIME_PAID_TTL = timedelta(hours=72)
+FREE_TTL_GAMES = ('letters', 'images')
+
+
+def deadline(created_at, game_type, is_free, purchase, trial):
+    if game_type == 'time':
+        return created_at + (FREE_SESSION_TTL if (is_free or trial) else TIME_PAID_TTL)
+    if purchase is not None:
+        completed, purchase_end, purchase_free = purchase
+        if not completed:
+            return created_at
+        if purchase_free is False:
+            return None
+        return purchase_end or created_at
+    if is_free and game_type in FREE_TTL_GAMES:
+        return created_at + FREE_SESSION_TTL
+    return None
+
+
+def fill_expires_at(apps, schema_editor):
+    """الجلسات النشطة الحالية: الحزمة والشراء وحزمته بـ join واحد."""
+    GameSession = apps.get_model('games', 'GameSession')
+    TimeSessionPackage = apps.get_model('games', 'TimeSessionPackage')
+    trials = set(
+        TimeSessionPackage.objects.filter(package__package_number=0).values_list('session_id', flat=True)
+    )
+    rows = GameSession.objects.filter(is_active=True).values_list(
+        'id', 'created_at', 'game_type', 'package__is_free', 'purchase_id',
+        'purchase__is_completed', 'purchase__expires_at', 'purchase__package__is_free',
+    )
+    batch = []
+    for sid, created_at, game_type, is_free, purchase_id, completed, purchase_end, purchase_free in rows.iterator():
+        purchase = (completed, purchase_end, purchase_free) if purchase_id else None
+        expires_at = deadline(created_at, game_type, bool(is_free), purchase, sid in trials)
+        if expires_at is not None:
+            batch.append(GameSession(id=sid, expires_at=expires_at))
+    GameSession.objects.bulk_update(batch, ['expires_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0030_lettersgameprogress_team_cells'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='تنتهي في'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['is_active', 'expires_at'], name='games_games_is_acti_537e4f_idx'),
+        ),
+        migrations.RunPython(fill_expires_at, migrations.RunPython.noop),
+    ]
@@ -481,6 +481,17 @@ class UserPurchase(models.Model):
 #  جلسات اللعب
 # =========================
 
+class GameSessionQuerySet(models.QuerySet):
+    def live(self, now=None):
+        """نشطة ولم يحن موعدها — مسح نطاق على فهرس (is_active, expires_at)."""
+        now = now or timezone.now()
+        return self.filter(is_active=True).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+
+    def expired(self, now=None):
+        """ما زالت نشطة لكن تجاوزت expires_at (للتنظيف الدوري)."""
+        return self.filter(is_active=True, expires_at__lte=now or timezone.now())
+
+
 class GameSession(models.Model):
     """جلسة لعب (جلسة واحدة لكل شراء بفضل OneToOneField)"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -522,6 +533,10 @@ class GameSession(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # يُحسب عند الإنشاء/اكتمال الشراء (session_control.compute_deadline)؛ فارغ = لا تنتهي
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="تنتهي في")
+
+    objects = GameSessionQuerySet.as_manager()
 
     class Meta:
         verbose_name = "جلسة لعب"
@@ -531,6 +546,7 @@ class GameSession(models.Model):
             models.Index(fields=['game_type', 'created_at']),
             models.Index(fields=['is_active']),
             models.Index(fields=['package', 'is_active']),
+            models.Index(fields=['is_active', 'expires_at']),
         ]
 
     def clean(self):
@@ -551,8 +567,38 @@ class GameSession(models.Model):
             self.contestants_link = f"contestants-{str(self.id)[:8]}"
         if self.package and self.game_type != self.package.game_type:
             self.game_type = self.package.game_type
+        if self._state.adding and self.expires_at is None:
+            self.expires_at = self.compute_expires_at()
         super().save(*args, **kwargs)
 
+    def compute_expires_at(self):
+        from games import session_control
+
+        trial = False
+        if self.game_type == 'time' and self.pk and not self._state.adding:
+            # جولة التجربة: كل حزمها رقم 0 (تُربط بعد إنشاء الجلسة ثم refresh_expiry)
+            trial = TimeSessionPackage.objects.filter(session_id=self.pk, package__package_number=0).exists()
+        purchase = None
+        if self.purchase_id:
+            p = self.purchase
+            purchase = (p.is_completed, p.expires_at, p.package.is_free if p.package_id else None)
+        return session_control.compute_deadline(
+            self.created_at or timezone.now(),
+            self.game_type,
+            bool(self.package_id and self.package.is_free),
+            purchase,
+            trial,
+        )
+
+    def refresh_expiry(self):
+        """إعادة الحساب عند التفعيل (اكتمال الشراء/ربط حزم الوقت)؛ يرجع True إن تغيّر الموعد."""
+        expires_at = self.compute_expires_at()
+        if expires_at == self.expires_at:
+            return False
+        self.expires_at = expires_at
+        self.save(update_fields=['expires_at'])
+        return True
+
     def __str__(self):
         host_txt = self.host.username if self.host else "بدون مُضيف"
         return f"جلسة {self.get_game_type_display()} - {host_txt}"
@@ -560,36 +606,20 @@ class GameSession(models.Model):
     # انتهاء الجلسات المجانية
     @property
     def letters_free_expires_at(self):
-        if self.package and self.package.game_type == 'letters' and self.package.is_free and not self.purchase_id:
-            base = self.created_at or timezone.now()
-            return base + timedelta(minutes=self.LETTERS_FREE_TTL_MINUTES)
-        return None
+        return self.expires_at if self.game_type == 'letters' else None
 
     @property
     def images_free_expires_at(self):
-        if self.package and self.package.game_type == 'images' and self.package.is_free and not self.purchase_id:
-            base = self.created_at or timezone.now()
-            return base + timedelta(minutes=self.IMAGES_FREE_TTL_MINUTES)
-        return None
+        return self.expires_at if self.game_type == 'images' else None
 
     @property
     def is_time_expired(self) -> bool:
         """
-        التحقق من انتهاء صلاحية الجلسة:
-        - المدفوع: لا ينتهي (يعتمد على purchase.is_expired الذي دائماً False)
+        التحقق من انتهاء صلاحية الجلسة من expires_at المخزّن (بدون تحميل package/purchase):
+        - المدفوع: لا ينتهي (expires_at فارغ)
         - المجاني: ساعة واحدة
         """
-        # لو مربوطة بشراء، نعتمد على صلاحية الشراء
-        if self.purchase_id:
-            return self.purchase.is_expired
-        
-        # جلسات مجانية بدون شراء
-        if self.letters_free_expires_at:
-            return timezone.now() >= self.letters_free_expires_at
-        if self.images_free_expires_at:
-            return timezone.now() >= self.images_free_expires_at
-        
-        return False
+        return self.expires_at is not None and timezone.now() >= self.expires_at
 
     def mark_session_expired_if_needed(self, auto_save=True) -> bool:
         if not self.is_completed and self.is_time_expired:
@@ -612,6 +642,9 @@ class LettersGameProgress(models.Model):
     )
     cell_states = models.JSONField(default=dict, verbose_name="حالة الخلايا")
     used_letters = models.JSONField(default=list, verbose_name="الحروف المستخدمة")
+    # اللوحة كـ bitboard (games/hexboard.py): بت لكل رقم خلية
+    team1_cells = models.BigIntegerField(default=0, verbose_name="خلايا الفريق الأول")
+    team2_cells = models.BigIntegerField(default=0, verbose_name="خلايا الفريق الثاني")
     current_letter = models.CharField(max_length=3, null=True, blank=True, verbose_name="الحرف الحالي")
     current_question_type = models.CharField(max_length=10, default='main', verbose_name="نوع السؤال الحالي")
 
@@ -1024,22 +1057,34 @@ class GameSettings(models.Model):
     def __str__(self):
         return f"إعدادات جلسة {self.session_id}"
 
-    @classmethod
-    def get_or_create_for_session(cls, session):
-        """جلب أو إنشاء الإعدادات مع الأخذ من أسماء الجلسة الأصلية"""
+    @staticmethod
+    def defaults_for(session):
         feud_defaults = {
             'team1_name': 'الفريق الذهبي',
             'team2_name': 'الفريق الأزرق',
             'team1_color': '#f59e0b',
             'team2_color': '#60a5fa',
         }
-        game_defaults = feud_defaults if (session.package and session.package.game_type == 'feud') else {
+        return feud_defaults if (session.package and session.package.game_type == 'feud') else {
             'team1_name': session.team1_name,
             'team2_name': session.team2_name,
         }
+
+    @classmethod
+    def get_or_create_for_session(cls, session):
+        """جلب أو إنشاء الإعدادات مع الأخذ من أسماء الجلسة الأصلية"""
         obj, _ = cls.objects.get_or_create(
-            session=session,
-            defaults=game_defaults
+            session_id=session.id,
+            defaults=cls.defaults_for(session)
+        )
+        return obj
+
+    @classmethod
+    async def aget_or_create_for_session(cls, session):
+        """نسخة async (الـ views غير المتزامنة)؛ session قد تكون لقطة session_cache."""
+        obj, _ = await cls.objects.aget_or_create(
+            session_id=session.id,
+            defaults=cls.defaults_for(session)
         )
         return obj
 
@@ -1240,8 +1285,8 @@ class FamilyFeudProgress(models.Model):
     def __str__(self):
         return f"FeudProgress(session={self.session_id}, q={self.current_question_index}, phase={self.phase})"
 
-    def reset_round(self):
-        """تصفير بيانات الجولة عند الانتقال لسؤال جديد"""
+    def reset_round(self, multiplier=None):
+        """تصفير بيانات الجولة عند الانتقال لسؤال جديد (multiplier من الكتالوج يغني عن الاستعلام)"""
         self.team1_strikes = 0
         self.team2_strikes = 0
         self.round_points = 0
@@ -1250,7 +1295,7 @@ class FamilyFeudProgress(models.Model):
         self.phase = 'question'
         self.last_buzzer_name = ''
         self.last_buzzer_team = ''
-        self.current_multiplier = self._get_question_multiplier()
+        self.current_multiplier = multiplier if multiplier is not None else self._get_question_multiplier()
 
     @property
     def total_strikes(self):
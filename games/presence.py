@@ -0,0 +1,343 @@
+# games/presence.py
+"""
+حضور المتسابقين لكل جلسة (من متصل الآن وعلى أي فريق):
+- المتسابق يعلن اسمه وفريقه مرة بعد الاتصال (contestant_join)، أو بأول ضغطة من عميل قديم
+- connect/disconnect يحدّثان القائمة، وكل تغيير يُبث للمقدم والعرض كفرق (roster_changed)
+  والمقدم/العرض يأخذ القائمة كاملة (roster) عند اتصاله
+- الاسم نفسه قد يكون على أكثر من تبويب: لا يُعلن خروجه إلا بإغلاق آخر اتصال له
+- صفوف Contestant تُكتب مرة واحدة على دفعات: bulk_create(ignore_conflicts=True) للأسماء
+  و update() واحد لكل فريق لمن غيّر فريقه — الضغطة نفسها لا تلمس DB
+- مسار HTTP المتزامن يستخدم record_sync: نفس الكتابة فورية، ومرة واحدة لكل اسم في العملية
+- القائمة (اتصال → اسم وفريق) في مخزن مشترك بين العمال مثل البازر: hash في Redis، أو transform
+  في الكاش المشترك، فالقائمة والعدد عند المقدم يشملان كل العمال؛ مع الكاش المحلي تبقى داخل العملية
+  (عامل واحد). مدخلات عامل مات بلا disconnect تسقط بانتهاء ROSTER_TTL من آخر تغيير
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger('games')
+
+DEFAULT_FLUSH_MS = 250
+TEAMS = ('team1', 'team2')
+# Contestant.name max_length
+MAX_NAME = 50
+# ذاكرة ما كُتب في DB: (session_id, name) → team
+WRITTEN_LIMIT = 4096
+ROSTER_TTL = 12 * 60 * 60
+
+
+def _flush_delay() -> float:
+    try:
+        return max(0, int(getattr(settings, 'GAME_SETTINGS', {}).get('LIVE_STATE_FLUSH_MS', DEFAULT_FLUSH_MS))) / 1000.0
+    except (TypeError, ValueError):
+        return DEFAULT_FLUSH_MS / 1000.0
+
+
+def clean(name, team):
+    """(name, team) بعد التحقق، أو None إن كان الطلب غير صالح."""
+    name = (name or '').strip()[:MAX_NAME]
+    if not name or team not in TEAMS:
+        return None
+    return name, team
+
+
+# ============================ Persistence ============================
+_written = {}
+
+
+def _unwritten(session_id, pending: dict) -> dict:
+    return {n: t for n, t in pending.items() if _written.get((session_id, n)) != t}
+
+
+def _remember(session_id, pending: dict):
+    if len(_written) >= WRITTEN_LIMIT:
+        _written.clear()
+    for name, team in pending.items():
+        _written[(session_id, name)] = team
+
+
+def _persist(session_id, pending: dict):
+    """إدراج بلا قراءة (الموجود يُتجاهل) ثم تصحيح الفريق لمن تغيّر فريقه فقط."""
+    from games.models import Contestant
+
+    Contestant.objects.bulk_create(
+        [Contestant(session_id=session_id, name=n, team=t) for n, t in pending.items()],
+        ignore_conflicts=True,
+    )
+    by_team = {}
+    for name, team in pending.items():
+        by_team.setdefault(team, []).append(name)
+    for team, names in by_team.items():
+        Contestant.objects.filter(session_id=session_id, name__in=names).exclude(team=team).update(team=team)
+
+
+def record_sync(session_id, name, team):
+    """للـ views المتزامنة (البازر عبر HTTP): أول ظهور للاسم فقط يكتب في DB."""
+    sid = str(session_id)
+    pending = _unwritten(sid, {name: team})
+    if not pending:
+        return
+    _persist(sid, pending)
+    _remember(sid, pending)
+
+
+async def record(session_id, name, team):
+    """نسخة record_sync للـ views غير المتزامنة: الاسم المعروف لا يغادر حلقة الأحداث."""
+    sid = str(session_id)
+    pending = _unwritten(sid, {name: team})
+    if not pending:
+        return
+    await sync_to_async(_persist)(sid, pending)
+    _remember(sid, pending)
+
+
+# =============================== Stores ===============================
+# update(sid, channel, member أو None للحذف) → (قبل، بعد) بصيغة {channel: (name, team)}
+class LocalStore:
+    """داخل العملية — يكفي عند وجود عامل واحد."""
+
+    blocking = False
+
+    def __init__(self):
+        self._sessions = {}
+
+    def update(self, session_id, channel_name, member):
+        sockets = self._sessions.setdefault(session_id, {})
+        before = dict(sockets)
+        if member is None:
+            sockets.pop(channel_name, None)
+        else:
+            sockets[channel_name] = member
+        if not sockets:
+            del self._sessions[session_id]
+        return before, dict(sockets)
+
+    def sockets(self, session_id) -> dict:
+        return dict(self._sessions.get(session_id, {}))
+
+
+class RedisStore:
+    """hash لكل جلسة على عقدتها (pick: المفتاح → اتصال)؛ القراءة والتعديل في معاملة واحدة."""
+
+    blocking = True
+
+    def __init__(self, pick):
+        self._pick = pick
+
+    @staticmethod
+    def _key(session_id):
+        return f"wesh:presence:{session_id}"
+
+    @staticmethod
+    def _decode(raw) -> dict:
+        return {
+            (c.decode('utf8') if isinstance(c, bytes) else c): tuple(json.loads(v))
+            for c, v in raw.items()
+        }
+
+    def update(self, session_id, channel_name, member):
+        key = self._key(session_id)
+        pipe = self._pick(key).pipeline()
+        pipe.hget(key, channel_name)
+        if member is None:
+            pipe.hdel(key, channel_name)
+        else:
+            pipe.hset(key, channel_name, json.dumps(member))
+            pipe.expire(key, ROSTER_TTL)
+        pipe.hgetall(key)
+        results = pipe.execute()
+        after = self._decode(results[-1])
+        before = {c: m for c, m in after.items() if c != channel_name}
+        if results[0] is not None:
+            before[channel_name] = tuple(json.loads(results[0]))
+        return before, after
+
+    def sockets(self, session_id) -> dict:
+        key = self._key(session_id)
+        return self._decode(self._pick(key).hgetall(key))
+
+
+class SharedCacheStore:
+    """مشترك بين عمال الجهاز الواحد عبر games.shared_cache: كل تغيير transform ذرية على مفتاح الجلسة."""
+
+    blocking = True
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def update(self, session_id, channel_name, member):
+        def step(sockets):
+            before = sockets or {}
+            after = dict(before)
+            if member is None:
+                after.pop(channel_name, None)
+            else:
+                after[channel_name] = member
+            return (after or None), (before, after)
+
+        return self.cache.transform(f"presence:{session_id}", step, timeout=ROSTER_TTL)
+
+    def sockets(self, session_id) -> dict:
+        return self.cache.get(f"presence:{session_id}") or {}
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        cache_backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+        if 'django_redis' in cache_backend:
+            try:
+                from django.core.cache import cache
+                from django_redis import get_redis_connection
+                from games.sharding import SessionShardClient
+
+                client = getattr(cache, 'client', None)
+                if isinstance(client, SessionShardClient):
+                    shards = dict(client._serverdict)
+                    _store = RedisStore(lambda key: shards[client.get_server_name(key)])
+                else:
+                    conn = get_redis_connection('default')
+                    _store = RedisStore(lambda key: conn)
+            except Exception as e:
+                logger.error(f"Presence: Redis store unavailable, using local: {e}")
+                _store = LocalStore()
+        elif cache_backend == 'games.shared_cache.SharedMemoryCache':
+            from django.core.cache import cache
+
+            _store = SharedCacheStore(cache)
+        else:
+            _store = LocalStore()
+    return _store
+
+
+async def _call(method, *args):
+    if get_store().blocking:
+        return await sync_to_async(method)(*args)
+    return method(*args)
+
+
+def _by_name(sockets: dict) -> dict:
+    return {name: team for name, team in sockets.values()}
+
+
+def _diff(before: dict, after: dict):
+    before, after = _by_name(before), _by_name(after)
+    joined = [{'name': n, 'team': t} for n, t in after.items() if before.get(n) != t]
+    left = [{'name': n, 'team': t} for n, t in before.items() if n not in after]
+    if not joined and not left:
+        return None
+    return {'joined': joined, 'left': left, 'count': len(after)}
+
+
+# ============================== Roster ==============================
+class Roster:
+    """قائمة جلسة واحدة — نسخة واحدة لكل جلسة داخل العملية، والاتصالات نفسها في المخزن المشترك."""
+
+    def __init__(self, session_id):
+        self.session_id = str(session_id)
+        # اتصالات هذه العملية: channel_name → (name, team) للمتسابقين المعلنين فقط
+        self._mine = {}
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._refs = 0
+
+    async def members(self) -> list:
+        sockets = await _call(get_store().sockets, self.session_id)
+        return [{'name': n, 'team': t} for n, t in sorted(_by_name(sockets).items())]
+
+    async def join(self, channel_name, name, team):
+        """يسجّل الاتصال باسمه وفريقه؛ يرجع الفرق للبث أو None إن لم يتغير شيء."""
+        if self._mine.get(channel_name) == (name, team):
+            return None
+        self._mine[channel_name] = (name, team)
+        self.note(name, team)
+        return await self._update(channel_name, (name, team))
+
+    async def leave(self, channel_name):
+        if self._mine.pop(channel_name, None) is None:
+            return None
+        return await self._update(channel_name, None)
+
+    async def _update(self, channel_name, member):
+        try:
+            return _diff(*await _call(get_store().update, self.session_id, channel_name, member))
+        except Exception as e:
+            logger.error(f"Roster store error for session {self.session_id}: {e}")
+            return None
+
+    def note(self, name, team):
+        if not _unwritten(self.session_id, {name: team}):
+            return
+        self._pending[name] = team
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        try:
+            await asyncio.sleep(_flush_delay())
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending = _unwritten(self.session_id, self._pending)
+            self._pending = {}
+            if not pending:
+                return
+            try:
+                await sync_to_async(_persist)(self.session_id, pending)
+                _remember(self.session_id, pending)
+            except Exception as e:
+                logger.error(f"Roster persist error for session {self.session_id}: {e}")
+                for name, team in pending.items():
+                    self._pending.setdefault(name, team)
+
+
+# =========================== Process registry ===========================
+_rosters = {}
+
+
+def acquire(session_id) -> Roster:
+    sid = str(session_id)
+    roster = _rosters.get(sid)
+    if roster is None:
+        roster = _rosters[sid] = Roster(sid)
+    roster._refs += 1
+    return roster
+
+
+def get(session_id):
+    return _rosters.get(str(session_id))
+
+
+async def release(roster: Roster):
+    """عند قطع الاتصال: نكتب المعلّق ونحرّر القائمة عند آخر مستهلك."""
+    roster._refs = max(0, roster._refs - 1)
+    await roster.flush()
+    if roster._refs == 0 and _rosters.get(roster.session_id) is roster:
+        if roster._flush_task and not roster._flush_task.done():
+            roster._flush_task.cancel()
+        del _rosters[roster.session_id]
+
+
+# ============================ Client frames ============================
+async def roster_message(roster: Roster) -> dict:
+    return {'type': 'roster', 'contestants': await roster.members()}
+
+
+def changed_message(event) -> dict:
+    return {
+        'type': 'roster_changed',
+        'joined': event.get('joined', []),
+        'left': event.get('left', []),
+        'count': event.get('count', 0),
+    }
@@ -0,0 +1,123 @@
+# games/progress_store.py
+"""
+كتابة تقدّم خلية الحروف (LettersGameProgress) داخل DB مباشرة بدون قراءة الصف:
+- الخلايا تُدمج في cell_states بتعبير واحد (jsonb || على Postgres، json_patch على SQLite)
+- الحروف تُلحق بـ used_letters مرة واحدة فقط (إزالة التكرار مع حفظ الترتيب داخل نفس UPDATE)
+- لوحة الـ bitboard (team1_cells/team2_cells) تُحدَّث في نفس الجملة: (col & ~clear) | set
+- جملة UPDATE واحدة مهما كان عدد الخلايا، فلا يمسح مسار (HTTP/WS/مقدّم آخر) تغييرات غيره
+- الصف غير الموجود يُنشأ بإدراج يتجاهل التعارض ثم يُعاد نفس التحديث
+- aapply_cells/areset_cells نفس الجمل عبر الـ ORM غير المتزامن (views_async)
+"""
+import json
+
+from django.db import connection
+from django.db.models import F, JSONField
+from django.db.models.expressions import RawSQL
+
+from games import hexboard
+
+# Postgres: دمج الكائن (وإن كان العمود ليس كائناً يُستبدل)، والقائمة بلا تكرار بترتيب أول ظهور
+_PG_CELLS = (
+    "(CASE WHEN jsonb_typeof({col}) = 'object' THEN {col} ELSE '{{}}'::jsonb END) || %s::jsonb"
+)
+_PG_LETTERS = (
+    "(SELECT COALESCE(jsonb_agg(value ORDER BY pos), '[]'::jsonb) FROM ("
+    "SELECT value, MIN(pos) AS pos FROM jsonb_array_elements("
+    "(CASE WHEN jsonb_typeof({col}) = 'array' THEN {col} ELSE '[]'::jsonb END) || %s::jsonb"
+    ") WITH ORDINALITY AS e(value, pos) GROUP BY value) AS letters)"
+)
+
+# SQLite (JSON1): نفس المنطق على نص JSON
+_SQLITE_CELLS = (
+    "json_patch(CASE WHEN json_type({col}) = 'object' THEN {col} ELSE '{{}}' END, %s)"
+)
+_SQLITE_LETTERS = (
+    "(SELECT json_group_array(value) FROM ("
+    "SELECT value FROM ("
+    "SELECT value, CAST(key AS INTEGER) AS pos FROM json_each(CASE WHEN json_type({col}) = 'array' THEN {col} ELSE '[]' END) "
+    "UNION ALL SELECT value, 1000000 + CAST(key AS INTEGER) FROM json_each(%s)"
+    ") GROUP BY value ORDER BY MIN(pos)))"
+)
+
+
+def _expressions():
+    qn = connection.ops.quote_name
+    if connection.vendor == 'postgresql':
+        cells, letters = _PG_CELLS, _PG_LETTERS
+    else:
+        cells, letters = _SQLITE_CELLS, _SQLITE_LETTERS
+    return cells.format(col=qn('cell_states')), letters.format(col=qn('used_letters'))
+
+
+def _values(cells, letters, board, fields):
+    cells_sql, letters_sql = _expressions()
+    values = dict(fields)
+    if cells:
+        values['cell_states'] = RawSQL(
+            cells_sql, [json.dumps(cells, ensure_ascii=False)], output_field=JSONField()
+        )
+    if letters:
+        values['used_letters'] = RawSQL(
+            letters_sql, [json.dumps(list(letters), ensure_ascii=False)], output_field=JSONField()
+        )
+    if board:
+        set1, clear1, set2, clear2 = hexboard.masks(board)
+        values['team1_cells'] = F('team1_cells').bitand(~clear1).bitor(set1)
+        values['team2_cells'] = F('team2_cells').bitand(~clear2).bitor(set2)
+    return values
+
+
+def _empty_row(session_id):
+    from games.models import LettersGameProgress
+
+    return LettersGameProgress(session_id=session_id, cell_states={}, used_letters=[], team1_cells=0, team2_cells=0)
+
+
+def apply_cells(session_id, cells=None, letters=None, board=None, **fields):
+    """
+    يدمج cells ({مفتاح الخلية: الحالة}) ويضيف letters غير المستخدمة في UPDATE واحد،
+    ويطبّق board ({رقم الخلية: الحالة}) على بتات اللوحة.
+    fields حقول عادية تُكتب معها (current_letter مثلاً). يرجع True إن كُتب شيء.
+    """
+    from games.models import LettersGameProgress
+
+    values = _values(cells, letters, board, fields)
+    if not values:
+        return False
+
+    rows = LettersGameProgress.objects.filter(session_id=session_id)
+    if rows.update(**values):
+        return True
+    LettersGameProgress.objects.bulk_create([_empty_row(session_id)], ignore_conflicts=True)
+    return bool(rows.update(**values))
+
+
+async def aapply_cells(session_id, cells=None, letters=None, board=None, **fields):
+    """نفس apply_cells عبر الـ ORM غير المتزامن (للـ views غير المتزامنة)."""
+    from games.models import LettersGameProgress
+
+    values = _values(cells, letters, board, fields)
+    if not values:
+        return False
+
+    rows = LettersGameProgress.objects.filter(session_id=session_id)
+    if await rows.aupdate(**values):
+        return True
+    await LettersGameProgress.objects.abulk_create([_empty_row(session_id)], ignore_conflicts=True)
+    return bool(await rows.aupdate(**values))
+
+
+_RESET = dict(cell_states={}, used_letters=[], team1_cells=0, team2_cells=0)
+
+
+def reset_cells(session_id):
+    """جولة جديدة: تصفير الخلايا والحروف (بدون إنشاء صف غير موجود)."""
+    from games.models import LettersGameProgress
+
+    return LettersGameProgress.objects.filter(session_id=session_id).update(**_RESET)
+
+
+async def areset_cells(session_id):
+    from games.models import LettersGameProgress
+
+    return await LettersGameProgress.objects.filter(session_id=session_id).aupdate(**_RESET)
@@ -0,0 +1,233 @@
+# games/session_cache.py
+"""
+لقطة GameSession للقراءة في مسارات الـ API الساخنة (بدل get() ثم session.package ثم session.purchase):
+- لقطة ثابتة: المعرفات، أسماء الفرق، الروابط، و expires_at المخزّن؛
+  is_time_expired يُقارن بالوقت عند كل طلب فلا يتقادم
+- البحث بالمعرف أو display_link أو contestants_link؛ الرابط يشير لمعرف الجلسة فقط
+- طبقتان: ذاكرة العملية (SESSION_CACHE_LOCAL_MS) ثم الكاش المشترك، ثم استعلام واحد (values مع الحزمة)
+- بيانات الحزمة مخزّنة وحدها حتى يُبطلها حفظ الحزمة دون معرفة جلساتها
+- الإبطال عبر signals: حفظ/حذف الجلسة أو الحزمة أو الشراء؛ العمليات الأخرى تلتقط التغيير
+  بعد انتهاء نافذة ذاكرتها القصيرة
+- للكتابة (نقاط، أسماء، select_for_update) نبقى على الموديل نفسه
+- aresolve للـ views غير المتزامنة: إصابة ذاكرة العملية لا تمر بأي thread
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+DEFAULT_LOCAL_MS = 2000
+LOCAL_MAX = 2048
+SHARED_TIMEOUT = 5 * 60
+
+_PACKAGE_FIELDS = ('id', 'game_type', 'is_free', 'is_active', 'package_number', 'question_theme')
+_SESSION_FIELDS = (
+    'id', 'package_id', 'game_type', 'host_id', 'purchase_id', 'is_active', 'is_completed',
+    'team1_name', 'team2_name', 'display_link', 'contestants_link', 'created_at', 'expires_at',
+)
+
+
+class PackageRef(namedtuple('PackageRef', _PACKAGE_FIELDS)):
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_game_type_display(self):
+        from games.models import GamePackage
+
+        return dict(GamePackage.GAME_TYPES).get(self.game_type, self.game_type)
+
+
+class SessionRef(namedtuple('SessionRef', _SESSION_FIELDS + ('package',))):
+    """بديل قراءة فقط لـ GameSession في الـ views والقوالب (session.id / session.package.is_free ...)."""
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_time_expired(self) -> bool:
+        return self.expires_at is not None and timezone.now() >= self.expires_at
+
+
+def _local_seconds() -> float:
+    try:
+        ms = int(getattr(settings, 'GAME_SETTINGS', {}).get('SESSION_CACHE_LOCAL_MS', DEFAULT_LOCAL_MS))
+    except (TypeError, ValueError):
+        ms = DEFAULT_LOCAL_MS
+    return max(0, ms) / 1000.0
+
+
+def _session_key(session_id) -> str:
+    return f'gs_ref:{session_id}'
+
+
+def _package_key(package_id) -> str:
+    return f'gs_pkg:{package_id}'
+
+
+def _link_key(kind, link) -> str:
+    return f'gs_link:{kind}:{link}'
+
+
+# =========================== Process tier ===========================
+_local = OrderedDict()     # session_id → (expires_at monotonic, SessionRef)
+_links = {}                # (kind, link) → session_id
+_lock = threading.Lock()
+
+
+def _remember(ref):
+    if _local_seconds() <= 0:
+        return
+    with _lock:
+        _local[ref.id] = (time.monotonic() + _local_seconds(), ref)
+        _local.move_to_end(ref.id)
+        _links[('d', ref.display_link)] = ref.id
+        _links[('c', ref.contestants_link)] = ref.id
+        while len(_local) > LOCAL_MAX:
+            _, (_, old) = _local.popitem(last=False)
+            _links.pop(('d', old.display_link), None)
+            _links.pop(('c', old.contestants_link), None)
+
+
+def _recall(session_id):
+    with _lock:
+        hit = _local.get(session_id)
+        if hit is None:
+            return None
+        if hit[0] < time.monotonic():
+            del _local[session_id]
+            return None
+        _local.move_to_end(session_id)
+        return hit[1]
+
+
+# ============================ Loading ============================
+def _load(**lookup):
+    """استعلام واحد للجلسة مع حقول الحزمة والشراء؛ يملأ الطبقتين."""
+    from games.models import GameSession
+
+    row = GameSession.objects.filter(**lookup).values(
+        *_SESSION_FIELDS, *(f'package__{f}' for f in _PACKAGE_FIELDS[1:]),
+    ).first()
+    if row is None:
+        return None
+    package = PackageRef(row['package_id'], *(row[f'package__{f}'] for f in _PACKAGE_FIELDS[1:]))
+    facts = tuple(row[f] for f in _SESSION_FIELDS)
+    cache.set_many({
+        _session_key(row['id']): facts,
+        _package_key(package.id): tuple(package),
+        _link_key('d', row['display_link']): row['id'],
+        _link_key('c', row['contestants_link']): row['id'],
+    }, SHARED_TIMEOUT)
+    ref = SessionRef(*facts, package)
+    _remember(ref)
+    return ref
+
+
+def _from_shared(session_id):
+    facts = cache.get(_session_key(session_id))
+    if facts is None:
+        return None
+    package = cache.get(_package_key(facts[1]))
+    if package is None:
+        return None
+    ref = SessionRef(*facts, PackageRef(*package))
+    _remember(ref)
+    return ref
+
+
+def _normalize_id(session_id):
+    if isinstance(session_id, uuid.UUID):
+        return session_id
+    try:
+        return uuid.UUID(str(session_id))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+# ============================ Public API ============================
+def resolve(session_id, active=True, game_type=None):
+    """لقطة الجلسة أو None (غير موجودة/معرف غير صالح/غير نشطة عند active/نوع لعبة مختلف)."""
+    sid = _normalize_id(session_id)
+    if sid is None:
+        return None
+    ref = _recall(sid) or _from_shared(sid) or _load(id=sid)
+    return _filtered(ref, active, game_type)
+
+
+async def aresolve(session_id, active=True, game_type=None):
+    """resolve من سياق async: ذاكرة العملية بدون خيط، والطبقات الأخرى عبر sync_to_async."""
+    sid = _normalize_id(session_id)
+    if sid is None:
+        return None
+    ref = _recall(sid)
+    if ref is None:
+        return await sync_to_async(resolve)(sid, active, game_type)
+    return _filtered(ref, active, game_type)
+
+
+def by_display_link(link, active=True, game_type=None):
+    return _by_link('d', 'display_link', link, active, game_type)
+
+
+def by_contestants_link(link, active=True, game_type=None):
+    return _by_link('c', 'contestants_link', link, active, game_type)
+
+
+def _by_link(kind, field, link, active, game_type):
+    if not link:
+        return None
+    with _lock:
+        sid = _links.get((kind, link))
+    ref = _recall(sid) if sid is not None else None
+    if ref is None or getattr(ref, field) != link:
+        sid = cache.get(_link_key(kind, link))
+        ref = _from_shared(sid) if sid is not None else None
+        if ref is None or getattr(ref, field) != link:
+            ref = _load(**{field: link})
+    return _filtered(ref, active, game_type)
+
+
+def _filtered(ref, active, game_type):
+    if ref is None:
+        return None
+    if active and not ref.is_active:
+        return None
+    if game_type and ref.game_type != game_type:
+        return None
+    return ref
+
+
+def invalidate(session_id, display_link=None, contestants_link=None):
+    sid = _normalize_id(session_id)
+    with _lock:
+        hit = _local.pop(sid, None)
+        if hit is not None:
+            display_link = display_link or hit[1].display_link
+            contestants_link = contestants_link or hit[1].contestants_link
+        for key in (('d', display_link), ('c', contestants_link)):
+            if _links.get(key) == sid:
+                del _links[key]
+    keys = [_session_key(sid)]
+    if display_link:
+        keys.append(_link_key('d', display_link))
+    if contestants_link:
+        keys.append(_link_key('c', contestants_link))
+    cache.delete_many(keys)
+
+
+def invalidate_package(package_id):
+    cache.delete(_package_key(package_id))
+    with _lock:
+        for sid, (_, ref) in list(_local.items()):
+            if ref.package_id == package_id:
+                del _local[sid]
@@ -0,0 +1,158 @@
+# games/session_control.py
+"""
+تحكّم بحياة اتصالات الجلسة خارج مسار الرسائل:
+- الموعد النهائي مخزّن في GameSession.expires_at (compute_deadline عند الإنشاء/التفعيل)
+- مؤقت واحد في العجلة لكل جلسة يبث broadcast_session_expired لمجموعة التحكم عند الموعد؛
+  الموعد جزء من token المؤقت، ويُعاد فحص expires_at عند إطلاقه فلا يُغلق موعد قديم جلسة مُدّدت
+- تغيّر expires_at (تفعيل الشراء/ربط حزم الوقت) يبث broadcast_session_deadline فيعيد كل عامل جدولة مؤقته
+- تعطيل الجلسة (is_active=False) من الأدمن/الـ views يبث نفس الحدث فوراً (revoke)
+- مجموعة التحكم session_control_<id> مستقلة عن نوع اللعبة؛ كل مستهلك ينضم لها ويغلق بـ 4401
+  فلا يحتاج receive() لفحص الصلاحية مع كل إطار
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from games import session_reaper, timer_wheel, ws_groups
+
+logger = logging.getLogger('games')
+
+FREE_SESSION_TTL = timedelta(hours=1)
+TIME_PAID_TTL = timedelta(hours=72)
+# الأنواع التي تنتهي جلساتها المجانية بدون شراء (letters_free_expires_at / images_free_expires_at)
+FREE_TTL_GAMES = ('letters', 'images')
+EXPIRED_EVENT = {'type': 'broadcast_session_expired'}
+DEADLINE_EVENT = 'broadcast_session_deadline'
+
+# مجموعة التحكم → الموعد المجدول له مؤقت في هذه العملية
+_armed = {}
+
+
+def control_group(session_id) -> str:
+    return f"session_control_{session_id}"
+
+
+def compute_deadline(created_at, game_type, is_free, purchase=None, trial=False):
+    """
+    موعد الانتهاء المخزّن في GameSession.expires_at (None = لا تنتهي) — نفس قواعد is_time_expired قبل التخزين:
+    - تحدّي الوقت (views_time): التجربة أو الحزمة المجانية ساعة، غيرها TIME_PAID_TTL
+    - مرتبطة بشراء (is_completed, expires_at, is_free لحزمة الشراء أو None) كـ UserPurchase.is_expired:
+      غير مكتمل = منتهية، حزمة مدفوعة = لا تنتهي، غير ذلك = انتهاء الشراء (فارغ = منتهية)
+    - بدون شراء: الحروف/الصور المجانية ساعة من الإنشاء، وغيرها (فاميلي فيود وغيره) لا تنتهي
+    اتصالات WebSocket تُغلق عند نفس الموعد؛ قبل التخزين كانت المستهلكات تغلق أي جلسة بحزمة مجانية
+    بعد ساعة، أما الآن فالجلسة المجانية التي لا ينتهي مسار HTTP لها (فاميلي فيود بدون شراء) تبقى مفتوحة.
+    """
+    if game_type == 'time':
+        return created_at + (FREE_SESSION_TTL if (is_free or trial) else TIME_PAID_TTL)
+    if purchase is not None:
+        completed, purchase_end, purchase_free = purchase
+        if not completed:
+            return created_at
+        if purchase_free is False:
+            return None
+        return purchase_end or created_at
+    if is_free and game_type in FREE_TTL_GAMES:
+        return created_at + FREE_SESSION_TTL
+    return None
+
+
+def deadline(session):
+    """لحظة انتهاء الجلسة أو None (المدفوع لا ينتهي)."""
+    return session.expires_at
+
+
+def is_closed(session) -> bool:
+    """فحص الاتصال الوحيد: معطّلة أو تجاوزت موعدها."""
+    if not session.is_active:
+        return True
+    end = deadline(session)
+    return end is not None and timezone.now() >= end
+
+
+def _load_deadline(session_id):
+    from games.models import GameSession
+
+    return GameSession.objects.filter(pk=session_id).values_list('is_active', 'expires_at').first()
+
+
+def _arm(channel_layer, session_id, end):
+    """يجدول الإغلاق عند end في هذه العملية (أو يلغيه إن صارت لا تنتهي)؛ نفس الموعد لا يُجدول مرتين."""
+    group = control_group(session_id)
+    key = f"{group}:expiry"
+    if end is None:
+        timer_wheel.cancel(key)
+        _armed.pop(group, None)
+        return
+    if _armed.get(group) == end and timer_wheel.pending(key):
+        return
+    _armed[group] = end
+    timer_wheel.schedule(
+        key, max(0.0, (end - timezone.now()).total_seconds()),
+        _expire, channel_layer, session_id, end,
+        token=f"expiry_{int(end.timestamp() * 1000)}",
+    )
+
+
+async def _expire(channel_layer, session_id, end):
+    """عند الموعد: نعيد قراءة الجلسة — موعد أبعد يُجدول من جديد بدل إغلاق جلسة صالحة."""
+    group = control_group(session_id)
+    if _armed.get(group) == end:
+        del _armed[group]
+    row = await sync_to_async(_load_deadline)(session_id)
+    if row is not None and row[0]:
+        current = row[1]
+        if current is None:
+            return
+        if current > end:
+            _arm(channel_layer, session_id, current)
+            return
+    await ws_groups.group_send(channel_layer, group, dict(EXPIRED_EVENT))
+
+
+async def watch(consumer):
+    """بعد accept: الانضمام لمجموعة التحكم وجدولة الإغلاق عند الموعد (token يمنع التكرار بين العمال)."""
+    await consumer.channel_layer.group_add(control_group(consumer.session_id), consumer.channel_name)
+    session_reaper.ensure_running()
+    end = deadline(consumer.session)
+    if end is not None:
+        _arm(consumer.channel_layer, consumer.session_id, end)
+
+
+async def deadline_changed(consumer, event):
+    """broadcast_session_deadline: يحدّث نسخة المستهلك من الجلسة ويعيد جدولة مؤقت هذه العملية."""
+    ts = event.get('expires_at')
+    end = None if ts is None else datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+    consumer.session.expires_at = end
+    _arm(consumer.channel_layer, consumer.session_id, end)
+
+
+async def unwatch(consumer):
+    await consumer.channel_layer.group_discard(control_group(consumer.session_id), consumer.channel_name)
+
+
+def _send_sync(session_id, event):
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        ws_groups.group_send_sync(layer, control_group(session_id), event)
+    except Exception as e:
+        logger.error(f"Session control broadcast failed for {session_id}: {e}")
+
+
+def revoke(session_id):
+    """من سياق متزامن (signal/أدمن/أمر إداري): أغلق كل اتصالات الجلسة الآن."""
+    _send_sync(session_id, dict(EXPIRED_EVENT))
+
+
+def notify_deadline(session):
+    """من سياق متزامن: expires_at تغيّر — المنتهية تُغلق الآن، وغيرها يعيد كل عامل جدولة مؤقته."""
+    if is_closed(session):
+        revoke(session.pk)
+        return
+    end = deadline(session)
+    _send_sync(session.pk, {'type': DEADLINE_EVENT, 'expires_at': None if end is None else end.timestamp()})
@@ -0,0 +1,135 @@
+# games/session_reaper.py
+"""
+تعطيل الجلسات المنتهية (expires_at) على دفعات محدودة الحجم:
+- keyset pagination على (expires_at, id) فوق فهرس (is_active, expires_at) — بدون OFFSET ولا تحميل الكل
+- كل دفعة: UPDATE واحد (is_active=False, is_completed=True) ثم لأن update لا يطلق signals:
+  إغلاق اتصالات الجلسة (session_control.revoke) وإسقاط لقطتها (session_cache) وحذف مفاتيح كاشها
+  وتصفير قفلي البازر عبر buzzer.reset (تعيش في خلفية التحكيم لا في كاش Django)
+- يعمل كأمر إداري (expire_sessions، مرة أو --loop) أو كـ task داخل عملية daphne
+  (SESSION_REAPER_INTERVAL_S > 0: تبدأ مع أول اتصال WS، وقفل في الكاش يجعل دورة واحدة تعمل لكل فترة بين العمال)
+- إحصاءات كل دورة (صفوف/دفعات/مفاتيح/زمن) في السجل وفي last_stats
+"""
+import asyncio
+import logging
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from games import buzzer, session_cache, session_control
+from games.utils_letters import CACHE_KEY_ORDER
+
+logger = logging.getLogger('games')
+
+DEFAULT_BATCH = 200
+LEASE_KEY = 'session_reaper_lease'
+
+last_stats = {}
+
+
+def interval_seconds() -> int:
+    try:
+        return max(0, int(getattr(settings, 'GAME_SETTINGS', {}).get('SESSION_REAPER_INTERVAL_S', 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def session_keys(session_id) -> list:
+    """مفاتيح الكاش الخاصة بالجلسة (توكن المضيف، ترتيب الحروف، مؤقت البازر)."""
+    return [
+        f"host_token_{session_id}",
+        CACHE_KEY_ORDER.format(sid=session_id),
+        f"buzz_timer_{session_id}",
+    ]
+
+
+def reset_buzzers(session_id):
+    """قفلا البازر (الحروف/الصور والفاميلي فيود) في خلفية التحكيم الحالية."""
+    for key in (buzzer.lock_key(session_id), buzzer.lock_key(session_id, 'feud')):
+        try:
+            buzzer.reset(key)
+        except Exception as e:
+            logger.error(f"Session reaper: buzzer reset failed for {key}: {e}")
+
+
+def _batches(now, batch_size):
+    from games.models import GameSession
+
+    after = None
+    while True:
+        qs = GameSession.objects.expired(now).order_by('expires_at', 'id')
+        if after is not None:
+            qs = qs.filter(Q(expires_at__gt=after[0]) | Q(expires_at=after[0], id__gt=after[1]))
+        rows = list(qs.values_list('expires_at', 'id', 'display_link', 'contestants_link')[:batch_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][:2]
+
+
+def reap(batch_size=DEFAULT_BATCH, max_batches=None, now=None) -> dict:
+    """دورة واحدة: يرجع {'rows', 'batches', 'keys', 'seconds'}."""
+    from games.models import GameSession
+
+    started = time.perf_counter()
+    now = now or timezone.now()
+    stats = {'rows': 0, 'batches': 0, 'keys': 0}
+    for rows in _batches(now, max(1, batch_size)):
+        ids = [row[1] for row in rows]
+        stats['rows'] += GameSession.objects.filter(
+            id__in=ids, is_active=True, expires_at__lte=now
+        ).update(is_active=False, is_completed=True)
+        keys = []
+        for _, sid, display_link, contestants_link in rows:
+            session_control.revoke(sid)
+            session_cache.invalidate(sid, display_link, contestants_link)
+            reset_buzzers(sid)
+            keys.extend(session_keys(sid))
+        cache.delete_many(keys)
+        stats['keys'] += len(keys)
+        stats['batches'] += 1
+        if max_batches and stats['batches'] >= max_batches:
+            break
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    last_stats.clear()
+    last_stats.update(stats, at=now.isoformat())
+    if stats['rows']:
+        logger.info(
+            f"Session reaper: expired {stats['rows']} sessions in {stats['batches']} batches "
+            f"({stats['keys']} cache keys) in {stats['seconds']}s"
+        )
+    return stats
+
+
+# ======================= In-process (daphne) mode =======================
+_task = None
+
+
+def ensure_running():
+    """من سياق async (اتصال WS): يبدأ task التنظيف مرة واحدة لكل عملية إن كان مفعّلاً."""
+    global _task
+    if not interval_seconds():
+        return
+    if _task is not None and not _task.done() and _task.get_loop() is asyncio.get_running_loop():
+        return
+    _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def _run():
+    while True:
+        interval = interval_seconds()
+        if not interval:
+            return
+        try:
+            # عامل واحد فقط لكل فترة (مع كاش مشترك)
+            if await sync_to_async(cache.add)(LEASE_KEY, os.getpid(), timeout=interval):
+                await sync_to_async(reap)()
+        except Exception as e:
+            logger.error(f"Session reaper error: {e}")
+        await asyncio.sleep(interval)
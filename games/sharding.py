@@ -0,0 +1,105 @@
+# games/sharding.py
+"""
+توزيع Redis على عدة عقد بحلقة hash متّسقة، ومفتاح التوزيع هو معرّف الجلسة:
+- أي اسم مجموعة أو مفتاح كاش يحمل UUID جلسة (<type>_session_<id>[_<role>]، session_control_<id>،
+  buzz_lock_*، buzz_timer_*، letters_order_*، ...) يذهب لعقدة تلك الجلسة — كل ما يخص الغرفة في مكان واحد
+  (سكربتات Lua للبازر تلمس مفاتيح عقدة واحدة)
+- غير ذلك (قنوات العمليات، مفاتيح عامة) يوزَّع بالاسم كاملاً
+- الحلقة مبنية من عناوين العقد (بدون كلمات المرور) لا من ترتيبها: إضافة عقدة تنقل ~1/N من الجلسات فقط
+- الإعداد: REDIS_SHARDS=redis://a:6379/0,redis://b:6379/0 — وإعادة التوزيع عبر manage.py redis_shards
+"""
+import bisect
+import hashlib
+import re
+from urllib.parse import urlsplit
+
+from channels_redis.core import RedisChannelLayer
+from django_redis.client import ShardClient
+
+DEFAULT_REPLICAS = 128
+
+SESSION_ID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I)
+
+
+def shard_key(name) -> str:
+    """معرّف الجلسة داخل الاسم إن وُجد، وإلا الاسم نفسه."""
+    if isinstance(name, bytes):
+        name = name.decode('utf8', 'replace')
+    name = str(name)
+    match = SESSION_ID.search(name)
+    return match.group(0).lower() if match else name
+
+
+def node_label(node) -> str:
+    """هوية العقدة على الحلقة: host:port/db فقط حتى لا يغيّر تدوير كلمة المرور التوزيع."""
+    if isinstance(node, dict):
+        if 'address' in node:
+            node = node['address']
+        else:
+            return f"{node.get('host', 'localhost')}:{node.get('port', 6379)}/{node.get('db', 0)}"
+    parts = urlsplit(str(node))
+    if not parts.hostname:
+        return str(node)
+    return f"{parts.hostname}:{parts.port or 6379}{parts.path or '/0'}"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """كل عقدة replicas نقطة على الحلقة؛ المفتاح لأول نقطة بعده."""
+
+    def __init__(self, nodes, replicas=DEFAULT_REPLICAS):
+        self.nodes = list(nodes)
+        points = sorted(
+            (_hash(f"{node_label(node)}#{r}"), index)
+            for index, node in enumerate(self.nodes)
+            for r in range(replicas)
+        )
+        self._points = [p for p, _ in points]
+        self._owners = [i for _, i in points]
+
+    def index_for(self, name) -> int:
+        if len(self.nodes) <= 1:
+            return 0
+        i = bisect.bisect(self._points, _hash(shard_key(name)))
+        return self._owners[i % len(self._points)]
+
+    def node_for(self, name):
+        return self.nodes[self.index_for(name)]
+
+
+class SessionShardedChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer يختار العقدة من الحلقة بدل crc32 % N:
+    مجموعات الجلسة (وكل أدوارها) على عقدة واحدة، وصناديق العمليات موزعة بأسمائها.
+    """
+
+    def __init__(self, *args, shard_replicas=DEFAULT_REPLICAS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = HashRing(self.hosts, shard_replicas)
+
+    def consistent_hash(self, value):
+        return self.ring.index_for(value)
+
+
+class SessionShardClient(ShardClient):
+    """عميل django_redis موزّع: المفاتيح بمعرّف الجلسة (أو {hash tag} صريح) على نفس الحلقة."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        replicas = self._options.get('SHARD_REPLICAS', DEFAULT_REPLICAS)
+        self._session_ring = HashRing(self._server, replicas)
+
+    def get_server_name(self, _key):
+        key = str(_key)
+        tagged = self._findhash.match(key)
+        if tagged is not None and tagged.groups():
+            key = tagged.groups()[0]
+        return self._session_ring.node_for(key)
+
+
+def parse_nodes(value) -> list:
+    """REDIS_SHARDS من البيئة: عناوين مفصولة بفواصل أو مسافات."""
+    return [n for n in re.split(r'[,\s]+', value or '') if n]
@@ -0,0 +1,346 @@
+# games/shared_cache.py
+"""
+كاش مشترك بين عمليات الجهاز الواحد بدون Redis (SHARED_CACHE_PATH=/dev/shm/wesh-cache):
+- ملف mmap واحد: جدول hash بخانات ثابتة الحجم (MAX_ENTRIES × SLOT_SIZE)، عنونة مفتوحة
+  داخل نافذة PROBE خانات من موقع المفتاح — كل بحث يقرأ PROBE خانة على الأكثر
+- كل عملية تحت قفل واحد (flock للعمليات + threading.Lock لخيوط العملية نفسها) فـ add
+  و incr و transform ذرية عبر كل العمال: قفل البازر وقفل إنشاء الجلسة لا يُكسبان مرتين
+- TTL بوقت الساعة (time.time) يُفحص عند القراءة، والخانة المنتهية تُعاد للاستخدام
+- امتلاء النافذة: تُطرد الخانة الأقدم استخداماً فيها (LRU تقريبي بعدّاد استخدام مشترك)
+- القيمة الأكبر من الخانة (فهرس أسئلة الحروف ~9KB مثلاً) تُقسَّم على عدة خانات بمفاتيح مشتقة
+  (المفتاح + بايت صفري + رقم الجزء) وتحمل خانة المفتاح عددها وطولها فقط؛ القراءة تجمعها
+  تحت نفس القفل، ونقص جزء طُرد = المفتاح غير موجود. أكثر من MAX_CHUNKS خانة (1/16 من الجدول
+  افتراضياً) لا تُخزَّن (تحذير في السجل)
+- تغيير MAX_ENTRIES/SLOT_SIZE يعيد تهيئة الملف (كاش: فقدانه مقبول)
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger('games')
+
+MAGIC = b'WESHC001'
+# magic, slots, slot_size, probe, clock
+HEADER = struct.Struct('<8sIIIQ')
+DATA_OFFSET = 64
+# state, key_len, value_len, key_hash, expires (0 = بلا انتهاء), last_used
+SLOT = struct.Struct('<BHIQdQ')
+
+EMPTY, USED, FREE = 0, 1, 2
+
+# خانة رأس لقيمة مقسّمة: magic, عدد الأجزاء, الطول الكلي (pickle يبدأ بـ \x80 فلا تلتبس به)
+CHAIN = struct.Struct('<4sII')
+CHAIN_MAGIC = b'WCH1'
+
+DEFAULT_SLOTS = 4096
+DEFAULT_SLOT_SIZE = 1024
+DEFAULT_PROBE = 16
+
+
+def _default_path() -> str:
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'wesh-cache')
+
+
+def _key_hash(key: bytes) -> int:
+    # ثابت بين العمليات (hash() عشوائي لكل عملية)
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _chunk_key(key: bytes, i: int) -> bytes:
+    # \0 لا يظهر في مفاتيح الكاش المتحقق منها فلا يصطدم بمفتاح حقيقي
+    return key + b'\0' + str(i).encode()
+
+
+class SharedMemoryCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS') or {}
+        self.path = location or _default_path()
+        self.slots = max(1, int(self._max_entries or DEFAULT_SLOTS))
+        self.slot_size = max(SLOT.size + 64, int(options.get('SLOT_SIZE', DEFAULT_SLOT_SIZE)))
+        self.probe = max(1, min(self.slots, int(options.get('PROBE', DEFAULT_PROBE))))
+        self.max_chunks = max(1, int(options.get('MAX_CHUNKS', self.slots // 16)))
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    # ============================ File ============================
+    def _open(self):
+        """فتح/تهيئة الملف — مرة لكل عملية (بعد fork يُعاد الفتح لأن flock مشترك مع الأب)."""
+        size = DATA_OFFSET + self.slots * self.slot_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(fd).st_size
+            header = os.pread(fd, HEADER.size, 0) if current >= HEADER.size else b''
+            expected = (MAGIC, self.slots, self.slot_size, self.probe)
+            if current != size or HEADER.unpack(header)[:4] != expected:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HEADER.pack(*expected, 0), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _tick(self, mm) -> int:
+        offset = HEADER.size - 8
+        clock = struct.unpack_from('<Q', mm, offset)[0] + 1
+        struct.pack_into('<Q', mm, offset, clock)
+        return clock
+
+    # ============================ Slots ============================
+    def _offset(self, index) -> int:
+        return DATA_OFFSET + index * self.slot_size
+
+    def _find(self, mm, key: bytes, h: int, now: float):
+        """(خانة المفتاح الحي أو None، أول خانة متاحة أو None، الخانة الأقدم استخداماً)."""
+        start = h % self.slots
+        available = oldest = None
+        oldest_used = None
+        for step in range(self.probe):
+            index = (start + step) % self.slots
+            offset = self._offset(index)
+            state, key_len, _, slot_hash, expires, used = SLOT.unpack_from(mm, offset)
+            if state == EMPTY:
+                # لا توجد خانة مستخدمة بعد أول خانة لم تُستخدم قط
+                return None, (index if available is None else available), oldest
+            expired = state == USED and expires and expires <= now
+            if state == USED and slot_hash == h and mm[offset + SLOT.size:offset + SLOT.size + key_len] == key:
+                if expired:
+                    mm[offset] = FREE
+                    return None, (index if available is None else available), oldest
+                return index, available, oldest
+            if state == FREE or expired:
+                if available is None:
+                    available = index
+                continue
+            if oldest_used is None or used < oldest_used:
+                oldest, oldest_used = index, used
+        return None, available, oldest
+
+    def _read(self, mm, index) -> bytes:
+        offset = self._offset(index)
+        _, key_len, value_len, _, _, _ = SLOT.unpack_from(mm, offset)
+        start = offset + SLOT.size + key_len
+        return mm[start:start + value_len]
+
+    def _write(self, mm, index, key: bytes, h: int, value: bytes, expires: float):
+        offset = self._offset(index)
+        SLOT.pack_into(mm, offset, USED, len(key), len(value), h, expires, self._tick(mm))
+        start = offset + SLOT.size
+        mm[start:start + len(key)] = key
+        mm[start + len(key):start + len(key) + len(value)] = value
+
+    def _touch_slot(self, mm, index):
+        offset = self._offset(index)
+        struct.pack_into('<Q', mm, offset + SLOT.size - 8, self._tick(mm))
+
+    def _chunks(self, mm, index, key: bytes, now: float):
+        """خانات أجزاء القيمة في index بالترتيب: [] لقيمة في خانة واحدة، None إن نقص جزء."""
+        data = self._read(mm, index)
+        if not data.startswith(CHAIN_MAGIC):
+            return []
+        count = CHAIN.unpack_from(data)[1]
+        slots = []
+        for i in range(count):
+            part = _chunk_key(key, i)
+            found = self._find(mm, part, _key_hash(part), now)[0]
+            if found is None:
+                return None
+            slots.append(found)
+        return slots
+
+    def _load(self, mm, index, key: bytes, now: float):
+        """بايتات القيمة (مجمّعة إن كانت مقسّمة)، أو None إن نقص منها جزء."""
+        data = self._read(mm, index)
+        if not data.startswith(CHAIN_MAGIC):
+            return data
+        total = CHAIN.unpack_from(data)[2]
+        slots = self._chunks(mm, index, key, now)
+        if slots is None:
+            return None
+        for slot in slots:
+            self._touch_slot(mm, slot)
+        data = b''.join(self._read(mm, slot) for slot in slots)
+        return data if len(data) == total else None
+
+    def _free(self, mm, index, key: bytes, now: float):
+        """يحرّر الخانة وخانات أجزائها."""
+        for slot in self._chunks(mm, index, key, now) or ():
+            mm[self._offset(slot)] = FREE
+        mm[self._offset(index)] = FREE
+
+    def _prepare(self, key, version, value, timeout):
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        return raw, data, (0.0 if expires is None else expires)
+
+    def _store(self, mm, raw, h, data, expires, found, available, oldest) -> bool:
+        index = found if found is not None else (available if available is not None else oldest)
+        if index is None:
+            return False
+        self._write(mm, index, raw, h, data, expires)
+        return True
+
+    def _save(self, mm, key, raw, h, data, expires, found, available, oldest) -> bool:
+        """يكتب القيمة في خانتها أو مقسّمة على عدة خانات؛ الفشل يترك المفتاح غير موجود."""
+        now = time.time()
+        if found is not None:
+            for slot in self._chunks(mm, found, raw, now) or ():
+                mm[self._offset(slot)] = FREE
+        if SLOT.size + len(raw) + len(data) <= self.slot_size:
+            return self._store(mm, raw, h, data, expires, found, available, oldest)
+
+        room = self.slot_size - SLOT.size - len(_chunk_key(raw, self.max_chunks))
+        count = -(-len(data) // room) if room > 0 else self.max_chunks + 1
+        if count > self.max_chunks:
+            logger.warning(
+                f"Shared cache value for {key!r} is {len(data)} bytes; exceeds {self.max_chunks} slots of {self.slot_size}"
+            )
+            if found is not None:
+                mm[self._offset(found)] = FREE
+            return False
+        written = []
+        for i in range(count):
+            part = _chunk_key(raw, i)
+            ph = _key_hash(part)
+            index = self._find(mm, part, ph, now)
+            if not self._store(mm, part, ph, data[i * room:(i + 1) * room], expires, *index):
+                break
+            written.append(part)
+        # كتابة الأجزاء قد تعيد استخدام خانة المفتاح نفسه (الأقدم في نافذتها) فنبحث عنه من جديد
+        head = self._find(mm, raw, h, now)
+        if len(written) == count and self._store(mm, raw, h, CHAIN.pack(CHAIN_MAGIC, count, len(data)), expires, *head):
+            return True
+        for part in written:
+            index = self._find(mm, part, _key_hash(part), now)[0]
+            if index is not None:
+                mm[self._offset(index)] = FREE
+        if head[0] is not None:
+            mm[self._offset(head[0])] = FREE
+        return False
+
+    # ============================ Cache API ============================
+    def get(self, key, default=None, version=None):
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        h = _key_hash(raw)
+        now = time.time()
+        with self._locked() as mm:
+            found, _, _ = self._find(mm, raw, h, now)
+            if found is None:
+                return default
+            self._touch_slot(mm, found)
+            data = self._load(mm, found, raw, now)
+        return default if data is None else pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, data, expires = self._prepare(key, version, value, timeout)
+        h = _key_hash(raw)
+        with self._locked() as mm:
+            self._save(mm, key, raw, h, data, expires, *self._find(mm, raw, h, time.time()))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, data, expires = self._prepare(key, version, value, timeout)
+        h = _key_hash(raw)
+        with self._locked() as mm:
+            found, available, oldest = self._find(mm, raw, h, time.time())
+            if found is not None:
+                return False
+            return self._save(mm, key, raw, h, data, expires, None, available, oldest)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        h = _key_hash(raw)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        with self._locked() as mm:
+            found, _, _ = self._find(mm, raw, h, now)
+            if found is None:
+                return False
+            for index in [found, *(self._chunks(mm, found, raw, now) or ())]:
+                struct.pack_into('<d', mm, self._offset(index) + SLOT.size - 16, 0.0 if expires is None else expires)
+            return True
+
+    def delete(self, key, version=None):
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        h = _key_hash(raw)
+        now = time.time()
+        with self._locked() as mm:
+            found, _, _ = self._find(mm, raw, h, now)
+            if found is None:
+                return False
+            self._free(mm, found, raw, now)
+            return True
+
+    def has_key(self, key, version=None):
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        h = _key_hash(raw)
+        with self._locked() as mm:
+            return self._find(mm, raw, h, time.time())[0] is not None
+
+    def incr(self, key, delta=1, version=None):
+        def bump(value):
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            return value + delta, value + delta
+
+        return self.transform(key, bump, version=version, keep_ttl=True)
+
+    def transform(self, key, func, timeout=DEFAULT_TIMEOUT, version=None, keep_ttl=False):
+        """
+        قراءة-تعديل-كتابة ذرية عبر العمليات: func(القيمة الحالية أو None) → (قيمة جديدة، نتيجة).
+        القيمة الجديدة None تحذف المفتاح. ترجع النتيجة.
+        """
+        raw = self.make_and_validate_key(key, version=version).encode('utf8')
+        h = _key_hash(raw)
+        now = time.time()
+        with self._locked() as mm:
+            found, available, oldest = self._find(mm, raw, h, now)
+            data = self._load(mm, found, raw, now) if found is not None else None
+            current = pickle.loads(data) if data is not None else None
+            new_value, result = func(current)
+            if new_value is None:
+                if found is not None:
+                    self._free(mm, found, raw, now)
+                return result
+            data = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
+            if keep_ttl and found is not None:
+                expires = SLOT.unpack_from(mm, self._offset(found))[4]
+            else:
+                expires = self.get_backend_timeout(timeout)
+                expires = 0.0 if expires is None else expires
+            self._save(mm, key, raw, h, data, expires, found, available, oldest)
+            return result
+
+    def clear(self):
+        with self._locked() as mm:
+            mm[DATA_OFFSET:] = bytes(self.slots * self.slot_size)
+
+    def close(self, **kwargs):
+        # الملف يبقى مفتوحاً طوال حياة العملية (Django يستدعي close بعد كل طلب)
+        pass
@@ -0,0 +1,125 @@
+# games/signals.py
+import logging
+
+from django.apps import apps
+from django.db.models.signals import class_prepared, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    FamilyFeudAnswer, FamilyFeudQuestion, GamePackage, GameSession, GameSettings,
+    LettersGameQuestion, UserPurchase,
+)
+from . import feud_catalog, letters_questions, live_settings, session_cache, session_control
+
+logger = logging.getLogger('games')
+
+
+@receiver(post_save, sender=GameSettings)
+def refresh_live_settings(sender, instance, **kwargs):
+    """تحديث لقطة الإعدادات الحيّة في هذه العملية بعد أي حفظ (API/الأدمن/WS)."""
+    try:
+        live_settings.refresh_from_instance(instance)
+    except Exception:
+        # لا نفشل الحفظ بسبب الكاش
+        pass
+
+
+@receiver([post_save, post_delete], sender=FamilyFeudQuestion)
+def invalidate_feud_catalog(sender, instance, **kwargs):
+    """أي تعديل على أسئلة الحزمة (الأدمن/الاستيراد) يرفع نسخة كتالوجها: كل العمليات تعيد تحميله."""
+    try:
+        feud_catalog.invalidate(instance.package_id)
+    except Exception as e:
+        # لا نفشل الحفظ بسبب الكاش
+        logger.error(f"Feud catalog invalidation failed for package {instance.package_id}: {e}")
+
+
+@receiver([post_save, post_delete], sender=FamilyFeudAnswer)
+def invalidate_feud_catalog_answers(sender, instance, **kwargs):
+    try:
+        feud_catalog.invalidate_question(instance.question_id)
+    except Exception as e:
+        logger.error(f"Feud catalog invalidation failed for question {instance.question_id}: {e}")
+
+
+@receiver([post_save, post_delete], sender=LettersGameQuestion)
+def invalidate_letters_index(sender, instance, **kwargs):
+    """رفع نسخة محتوى الحزمة: فهارس get_question في كل العمليات تُعاد بناؤها عند الطلب التالي."""
+    try:
+        letters_questions.invalidate(instance.package_id)
+    except Exception as e:
+        # لا نفشل الحفظ بسبب الكاش
+        logger.error(f"Letters index invalidation failed for package {instance.package_id}: {e}")
+
+
+@receiver(post_save)
+def invalidate_session_snapshot(sender, instance, **kwargs):
+    """
+    لقطة session_cache (أسماء الفرق/النشاط/الروابط/الحزمة) تُعاد قراءتها بعد أي حفظ.
+    مثل revoke_deactivated_session: الأدمن يحفظ عبر proxy models فنفحص النوع بدل sender.
+    """
+    try:
+        if isinstance(instance, GameSession):
+            session_cache.invalidate(instance.pk, instance.display_link, instance.contestants_link)
+        elif isinstance(instance, GamePackage):
+            session_cache.invalidate_package(instance.pk)
+    except Exception as e:
+        # لا نفشل الحفظ/الحذف بسبب الكاش
+        logger.error(f"Session snapshot invalidation failed for {type(instance).__name__} {instance.pk}: {e}")
+
+
+def invalidate_deleted_snapshot(sender, instance, **kwargs):
+    invalidate_session_snapshot(sender, instance)
+
+
+# الحذف بـ sender محدد: مستقبِل عام لـ post_delete يلغي الحذف السريع لكل الموديلات.
+# الأدمن يحذف عبر proxy models (LettersSession، FeudPackage، ...) وإشارتها تُرسل بالـ proxy نفسه،
+# فنربط كل موديل من عائلة GameSession/GamePackage: الموجود الآن، وما يُعرَّف لاحقاً (admin.py)
+def _connect_delete(model):
+    if issubclass(model, (GameSession, GamePackage)):
+        post_delete.connect(
+            invalidate_deleted_snapshot, sender=model,
+            dispatch_uid=f"invalidate_deleted_snapshot:{model._meta.label}",
+        )
+
+
+@receiver(class_prepared)
+def connect_proxy_delete(sender, **kwargs):
+    _connect_delete(sender)
+
+
+for _model in apps.get_models():
+    _connect_delete(_model)
+
+
+@receiver(post_save, sender=UserPurchase)
+def refresh_purchase_session_expiry(sender, instance, **kwargs):
+    """اكتمال/انتهاء الشراء (التفعيل) يعيد حساب expires_at للجلسة المرتبطة؛ حفظها يُبطل لقطتها."""
+    for session in GameSession.objects.filter(purchase_id=instance.pk).select_related('package', 'purchase__package'):
+        session.refresh_expiry()
+
+
+@receiver(post_save)
+def revoke_deactivated_session(sender, instance, update_fields=None, **kwargs):
+    """
+    تعطيل جلسة (الأدمن يحفظ عبر proxy models فلا نقيّد sender) يغلق اتصالاتها فوراً.
+    حفظ لا يلمس is_active (نقاط/أسماء) لا يبث شيئاً.
+    """
+    if not isinstance(instance, GameSession) or instance.is_active:
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    session_control.revoke(instance.pk)
+
+
+@receiver(post_save)
+def reschedule_session_expiry(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    تغيّر expires_at (refresh_expiry أو حفظ كامل من الأدمن) يصل لمؤقت الإغلاق في كل العمال
+    فلا يغلق الموعد القديم جلسة مُدّدت. المعطّلة يتكفل بها revoke_deactivated_session.
+    """
+    if not isinstance(instance, GameSession) or created or not instance.is_active:
+        return
+    if update_fields is not None and 'expires_at' not in update_fields:
+        return
+    session_control.notify_deadline(instance)
@@ -0,0 +1,13 @@
+# games/templatetags/ws_wire.py
+from django import template
+from django.utils.html import json_script
+
+from games.ws_protocol import CODE_TYPES
+
+register = template.Library()
+
+
+@register.simple_tag
+def ws_type_codes():
+    """جدول رقم → نوع رسائل الخادم لعملاء msgpack (مصدره TYPE_CODES في ws_protocol)."""
+    return json_script({code: name for code, name in CODE_TYPES.items() if code < 64}, 'ws-type-codes')
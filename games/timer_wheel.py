@@ -0,0 +1,139 @@
+# games/timer_wheel.py
+"""
+عجلة مؤقتات واحدة لكل عملية (hashed timer wheel) بدل asyncio.create_task لكل socket:
+- كل مؤقت له مفتاح (مثلاً "letters_session_<id>:buzz_unlock")؛ إعادة الجدولة بنفس المفتاح تستبدل السابق
+- المؤقت ملك العملية لا الـ socket: قطع اتصال من ضغط البازر لا يُضيّع فتح الزر
+- task واحدة فقط تدور ما دام هناك مؤقتات معلّقة، وتتوقف عند الفراغ
+- token (اختياري): قبل التنفيذ نحجز timer_fired_<key>_<token> في الكاش (cache.add)،
+  فلو جدول أكثر من عامل نفس الحدث يُنفَّذ مرة واحدة فقط (مع Redis)
+"""
+import asyncio
+import logging
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger('games')
+
+TICK_SECONDS = 0.05
+SLOTS = 512
+CLAIM_TTL = 60
+
+
+class _Timer:
+    __slots__ = ('key', 'slot', 'rounds', 'callback', 'args', 'token')
+
+    def __init__(self, key, slot, rounds, callback, args, token):
+        self.key = key
+        self.slot = slot
+        self.rounds = rounds
+        self.callback = callback
+        self.args = args
+        self.token = token
+
+
+class TimerWheel:
+    def __init__(self, tick=TICK_SECONDS, slots=SLOTS):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [dict() for _ in range(slots)]
+        self._timers = {}
+        self._cursor = 0
+        self._task = None
+        self._loop = None
+        self._last_tick = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    # ============================ API ============================
+    def schedule(self, key, delay, callback, *args, token=None):
+        """callback(*args) — coroutine function تُنفَّذ بعد delay ثانية تقريباً (دقة tick)."""
+        self._bind_loop()
+        self.cancel(key)
+        ticks = max(1, math.ceil(max(0.0, float(delay)) / self.tick))
+        slot = (self._cursor + ticks) % self.slots
+        timer = _Timer(key, slot, (ticks - 1) // self.slots, callback, args, token)
+        self._wheel[slot][key] = timer
+        self._timers[key] = timer
+        if self._task is None or self._task.done():
+            self._last_tick = time.monotonic()
+            self._task = self._loop.create_task(self._run())
+
+    def cancel(self, key) -> bool:
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        self._wheel[timer.slot].pop(key, None)
+        return True
+
+    def pending(self, key) -> bool:
+        return key in self._timers
+
+    # ========================== Internals ==========================
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # loop جديد (اختبارات/إعادة تشغيل): مؤقتات الـ loop القديم لن تعمل أصلاً
+            self._wheel = [dict() for _ in range(self.slots)]
+            self._timers = {}
+            self._cursor = 0
+            self._task = None
+            self._loop = loop
+
+    async def _run(self):
+        try:
+            while self._timers:
+                await asyncio.sleep(self.tick)
+                now = time.monotonic()
+                # نلحق بالـ ticks الفائتة لو تأخر الـ loop
+                due = max(1, int((now - self._last_tick) / self.tick))
+                self._last_tick += due * self.tick
+                for _ in range(min(due, self.slots)):
+                    self._advance()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._task = None
+
+    def _advance(self):
+        self._cursor = (self._cursor + 1) % self.slots
+        bucket = self._wheel[self._cursor]
+        if not bucket:
+            return
+        for key, timer in list(bucket.items()):
+            if timer.rounds > 0:
+                timer.rounds -= 1
+                continue
+            del bucket[key]
+            self._timers.pop(key, None)
+            self._loop.create_task(self._fire(timer))
+
+    async def _fire(self, timer):
+        try:
+            if timer.token is not None:
+                claimed = await sync_to_async(cache.add)(
+                    f"timer_fired_{timer.key}_{timer.token}", 1, timeout=CLAIM_TTL
+                )
+                if not claimed:
+                    return
+            await timer.callback(*timer.args)
+        except Exception as e:
+            logger.error(f"Timer {timer.key} error: {e}")
+
+
+wheel = TimerWheel()
+
+
+def schedule(key, delay, callback, *args, token=None):
+    wheel.schedule(key, delay, callback, *args, token=token)
+
+
+def cancel(key) -> bool:
+    return wheel.cancel(key)
+
+
+def pending(key) -> bool:
+    return wheel.pending(key)
@@ -3,6 +3,7 @@ from django.urls import path
 from . import views
 from . import views_time  # فيوزات تحدّي الوقت
 from . import views_imposter
+from . import views_async  # نسخ async لـ APIs الحروف اللحظية (النسخ المتزامنة باقية في views)
 
 app_name = 'games'
 
@@ -24,16 +25,16 @@ urlpatterns = [
     # APIs لخلية الحروف
     path('api/get-question/', views.get_question, name='api_get_question'),
     path('api/get-session-letters/', views.get_session_letters, name='api_get_session_letters'),
-    path('api/update-cell-state/', views.update_cell_state, name='api_update_cell_state'),
-    path('api/update-scores/', views.update_scores, name='api_update_scores'),
+    path('api/update-cell-state/', views_async.update_cell_state, name='api_update_cell_state'),
+    path('api/update-scores/', views_async.update_scores, name='api_update_scores'),
     path('api/session-state/', views.session_state, name='api_session_state'),
     path('api/add-contestant/', views.add_contestant, name='api_add_contestant'),
     path('api/check-eligibility/', views.api_check_free_session_eligibility, name='api_check_free_session_eligibility'),
     path('api/session-expiry-info/', views.api_session_expiry_info, name='api_session_expiry_info'),
     path('api/user-session-stats/', views.api_user_session_stats, name='api_user_session_stats'),
-    path('api/contestant-buzz/', views.api_contestant_buzz_http, name='api_contestant_buzz_http'),
-    path('api/letters-new-round/', views.letters_new_round, name='api_letters_new_round'),
-    path('api/letters-select-letter/', views.api_letters_select_letter, name='api_letters_select_letter'),
+    path('api/contestant-buzz/', views_async.api_contestant_buzz_http, name='api_contestant_buzz_http'),
+    path('api/letters-new-round/', views_async.letters_new_round, name='api_letters_new_round'),
+    path('api/letters-select-letter/', views_async.api_letters_select_letter, name='api_letters_select_letter'),
 
     # =========================
     # تحدّي الصور (Images)
@@ -76,7 +77,7 @@ path(
 ),
 
 path('api/settings/', views.api_get_settings, name='api_get_settings'),
-path('api/settings/save/', views.api_save_settings, name='api_save_settings'),
+path('api/settings/save/', views_async.api_save_settings, name='api_save_settings'),
 
 # صفحة بداية الحزمة (قبل الإعداد)
 path(
@@ -3,7 +3,7 @@ from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import Http404, JsonResponse, HttpResponseBadRequest
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
@@ -24,6 +24,9 @@ import secrets
 from django.http import HttpResponse
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from games import (
+    buzzer, hexboard, letters_questions, presence, progress_store, session_cache, win_paths, ws_groups,
+)
 
 from .models import (
     GamePackage, GameSession, UserPurchase, LettersGameProgress,
@@ -32,6 +35,19 @@ from .models import (
 
 logger = logging.getLogger('games')
 
+
+def _session_or_404(session_id=None, display_link=None, contestants_link=None, **kwargs):
+    """لقطة الجلسة من session_cache (للقراءة فقط) أو 404 — بديل get_object_or_404(GameSession, ...)."""
+    if display_link is not None:
+        session = session_cache.by_display_link(display_link, **kwargs)
+    elif contestants_link is not None:
+        session = session_cache.by_contestants_link(contestants_link, **kwargs)
+    else:
+        session = session_cache.resolve(session_id, **kwargs)
+    if session is None:
+        raise Http404("الجلسة غير موجودة أو غير نشطة")
+    return session
+
 # ===============================
 # Helpers: انتهاء الجلسة/الوقت
 # ===============================
@@ -53,13 +69,12 @@ def _expired_text(session):
 
 
 def get_session_time_remaining(session):
-    if not session.package.is_free:
+    if session.expires_at is None:
         return None  # مدفوع = صلاحية دائمة
-    expiry_time = session.created_at + timedelta(hours=1)
     now = timezone.now()
-    if now >= expiry_time:
+    if now >= session.expires_at:
         return timedelta(0)
-    return expiry_time - now
+    return session.expires_at - now
 
 def get_session_expiry_info(session):
     """
@@ -78,9 +93,10 @@ def get_session_expiry_info(session):
             'time_remaining': None
         }
     
-    # المجاني: ساعة واحدة
-    expiry_time = session.created_at + timezone.timedelta(hours=1)
-    time_remaining = expiry_time - timezone.now()
+    # المجاني: ساعة واحدة (expires_at المخزّن)
+    if session.expires_at is None:
+        return {'has_expiry': False, 'message': 'صلاحية دائمة', 'time_remaining': None}
+    time_remaining = session.expires_at - timezone.now()
     
     if time_remaining.total_seconds() <= 0:
         return {
@@ -515,10 +531,12 @@ def letters_session(request, session_id):
     if not arabic_letters:
         arabic_letters = get_letters_for_session(session)
 
-    questions = session.package.letters_questions.all().order_by('letter', 'question_type')
+    index = letters_questions.get(session.package_id)
     questions_by_letter = {}
-    for q in questions:
-        questions_by_letter.setdefault(q.letter, {})[q.question_type] = q
+    for letter in arabic_letters:
+        found = index.questions(letter)
+        if found:
+            questions_by_letter[letter] = found
 
     arabic_letters_json = json.dumps(arabic_letters)
 
@@ -543,7 +561,7 @@ def letters_session(request, session_id):
     })
 
 def letters_display(request, display_link):
-    session = get_object_or_404(GameSession, display_link=display_link, is_active=True)
+    session = _session_or_404(display_link=display_link)
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
             'message': _expired_text(session),
@@ -567,7 +585,7 @@ def letters_display(request, display_link):
     })
 
 def letters_contestants(request, contestants_link):
-    session = get_object_or_404(GameSession, contestants_link=contestants_link, is_active=True)
+    session = _session_or_404(contestants_link=contestants_link)
 
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
@@ -621,18 +639,15 @@ def images_game_home(request):
 
         if free_package:
             free_active_session = (
-                GameSession.objects
+                GameSession.objects.live()
                 .filter(
                     host=request.user,
                     package=free_package,
-                    is_active=True,
                     game_type='images'
                 )
                 .order_by('-created_at')
                 .first()
             )
-            if free_active_session and free_active_session.is_time_expired:
-                free_active_session = None
 
         purchases = UserPurchase.objects.filter(
             user=request.user,
@@ -747,12 +762,10 @@ def get_question(request):
     if not letter or not session_id:
         return JsonResponse({'success': False, 'error': 'المعاملات مطلوبة'}, status=400)
 
-    # تطبيع الهاء: نقبل ه/هـ
-    def _variants(ltr: str):
-        return ['ه', 'هـ'] if ltr in ('ه', 'هـ') else [ltr]
-
     try:
-        session = GameSession.objects.get(id=session_id, is_active=True)
+        session = session_cache.resolve(session_id)
+        if session is None:
+            return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
 
         if session.is_time_expired:
             return JsonResponse({
@@ -766,7 +779,7 @@ def get_question(request):
 
         # حدّد الشكل المعتمد داخل ترتيب الجلسة (إن وُجد)
         chosen_in_session = None
-        for v in _variants(letter):
+        for v in letters_questions.variants(letter):
             if v in letters:
                 chosen_in_session = v
                 break
@@ -776,32 +789,14 @@ def get_question(request):
         is_free_pkg = session.package.is_free
         question_types = ['main', 'alt1', 'alt2'] if is_free_pkg else ['main', 'alt1', 'alt2', 'alt3', 'alt4']
 
-        # جلب السؤال مع محاولة fallback على الشكل الآخر للهاء
+        # من فهرس الحزمة في الذاكرة (مع fallback على الشكل الآخر للهاء)
+        index = letters_questions.get(session.package_id)
+
         def _get_q(qtype):
-            from django.core.exceptions import ObjectDoesNotExist
-            try:
-                q = LettersGameQuestion.objects.get(
-                    package=session.package,
-                    letter=chosen_in_session,
-                    question_type=qtype
-                )
-                return {'question': q.question, 'answer': q.answer, 'category': q.category}
-            except ObjectDoesNotExist:
-                # جرّب الشكل الآخر إن كان الحرف ه/هـ
-                for alt in _variants('هـ' if chosen_in_session == 'ه' else 'ه'):
-                    if alt == chosen_in_session:
-                        continue
-                    try:
-                        q = LettersGameQuestion.objects.get(
-                            package=session.package,
-                            letter=alt,
-                            question_type=qtype
-                        )
-                        return {'question': q.question, 'answer': q.answer, 'category': q.category}
-                    except ObjectDoesNotExist:
-                        pass
-                # ما وجدنا شيء
+            q = index.get(chosen_in_session, qtype)
+            if q is None:
                 return {'question': f'لا يوجد سؤال {qtype} للحرف {chosen_in_session}', 'answer': 'غير متاح', 'category': 'غير محدد'}
+            return {'question': q.question, 'answer': q.answer, 'category': q.category}
 
         questions = {qt: _get_q(qt) for qt in question_types}
 
@@ -818,8 +813,6 @@ def get_question(request):
             }
         })
 
-    except GameSession.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
     except Exception as e:
         logger.error(f'Error fetching question: {e}')
         return JsonResponse({'success': False, 'error': f'خطأ داخلي: {str(e)}'}, status=500)
@@ -832,7 +825,9 @@ def get_session_letters(request):
         return JsonResponse({'success': False, 'error': 'معرف الجلسة مطلوب'}, status=400)
 
     try:
-        session = GameSession.objects.get(id=session_id, is_active=True)
+        session = session_cache.resolve(session_id)
+        if session is None:
+            return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
         if session.is_time_expired:
             return JsonResponse({
                 'success': False,
@@ -855,8 +850,6 @@ def get_session_letters(request):
             }
         })
 
-    except GameSession.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
     except Exception as e:
         logger.error(f'Error fetching session letters: {e}')
         return JsonResponse({'success': False, 'error': f'خطأ داخلي: {str(e)}'}, status=500)
@@ -885,13 +878,8 @@ def update_cell_state(request):
     if state not in ('normal', 'team1', 'team2'):
         return JsonResponse({'success': False, 'error': 'حالة الخلية غير صحيحة'}, status=400)
 
-    # تطبيع الهاء
-    def _variants(ltr: str):
-        return ['ه', 'هـ'] if ltr in ('ه', 'هـ') else [ltr]
-
-    try:
-        session = GameSession.objects.get(id=session_id, is_active=True)
-    except GameSession.DoesNotExist:
+    session = session_cache.resolve(session_id)
+    if session is None:
         return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
 
     if session.is_time_expired:
@@ -904,32 +892,20 @@ def update_cell_state(request):
 
     # تأكد من الحرف داخل ترتيب الجلسة بأي من الشكلين، وثبّت الشكل المعتمد
     letters = get_letters_for_session(session)
-    chosen_in_session = None
-    for v in _variants(letter_in):
-        if v in letters:
-            chosen_in_session = v
-            break
+    chosen_in_session = _session_letter(letters, letter_in)
     if not chosen_in_session:
         return JsonResponse({'success': False, 'error': f'الحرف {letter_in} غير متاح في هذه الجلسة'}, status=400)
 
     try:
-        progress, _ = LettersGameProgress.objects.get_or_create(
-            session=session,
-            defaults={'cell_states': {}, 'used_letters': []}
+        # خزّن على الحرف بالشكل المعتمد داخل ترتيب الجلسة — تحديث ذري بلا قراءة الصف
+        # رقم الخلية من العميل إن أرسله، وإلا أول خلية تحمل الحرف
+        cell_index = hexboard.cell_index(data.get('cell_index'))
+        board_index = cell_index if cell_index is not None else hexboard.cell_index(chosen_in_session, letters)
+        progress_store.apply_cells(
+            session.id, {chosen_in_session: state}, [chosen_in_session],
+            board={board_index: state} if board_index is not None else None,
         )
 
-        if not isinstance(progress.cell_states, dict):
-            progress.cell_states = {}
-        # خزّن على الحرف بالشكل المعتمد داخل ترتيب الجلسة
-        progress.cell_states[chosen_in_session] = state
-
-        if not isinstance(progress.used_letters, list):
-            progress.used_letters = []
-        if chosen_in_session not in progress.used_letters:
-            progress.used_letters.append(chosen_in_session)
-
-        progress.save(update_fields=['cell_states', 'used_letters'])
-
         try:
             channel_layer = get_channel_layer()
             if channel_layer:
@@ -939,11 +915,23 @@ def update_cell_state(request):
                         "type": "broadcast_cell_state",
                         "letter": chosen_in_session,
                         "state": state,
+                        "cell_index": cell_index,
                     }
                 )
         except Exception as e:
             logger.error(f'WS broadcast error (cell_state): {e}')
 
+        if board_index is not None and state != 'normal':
+            try:
+                won = _letters_round_won(session, board_index, state)
+                if won:
+                    ws_groups.group_send_sync(get_channel_layer(), f"letters_session_{session_id}", {
+                        "type": "broadcast_round_won",
+                        **won,
+                    })
+            except Exception as e:
+                logger.error(f'Round win check error: {e}')
+
         logger.info(f'Cell state updated: {chosen_in_session} -> {state} in session {session_id}')
         return JsonResponse({'success': True, 'message': 'تم تحديث حالة الخلية', 'letter': chosen_in_session, 'state': state})
 
@@ -951,6 +939,62 @@ def update_cell_state(request):
         logger.error(f'Error updating cell state: {e}')
         return JsonResponse({'success': False, 'error': f'خطأ داخلي: {str(e)}'}, status=500)
 
+def _session_letter(letters, letter_in):
+    """الشكل المعتمد للحرف داخل ترتيب الجلسة (مع قبول ه/هـ) أو None."""
+    return next((v for v in letters_questions.variants(letter_in) if v in letters), None)
+
+
+def _letters_round_won(session, index, team):
+    """بعد تلوين خلية عبر HTTP: فوز جديد فقط إن كان الفريق متصلاً الآن ولم يكن بدون هذه الخلية."""
+    board = LettersGameProgress.objects.filter(session_id=session.id).values_list('team1_cells', 'team2_cells').first()
+    grid_size = GameSettings.objects.filter(session_id=session.id).values_list('grid_size', flat=True).first()
+    return _round_won_on(board, grid_size, index, team)
+
+
+def _round_won_on(board, grid_size, index, team):
+    if not board:
+        return None
+    n = hexboard.side(grid_size)
+    won = win_paths.check(board, n, teams=(team,))
+    if not won or win_paths.check(hexboard.with_cell(board, index, 'normal'), n, teams=(team,)):
+        return None
+    return won
+
+
+def _save_scores(session_id, team1_score, team2_score):
+    """حفظ النقاط داخل معاملة مع قفل صف الجلسة، وضبط winner_team/is_completed حسب شرط الفوز."""
+    with transaction.atomic():
+        session = GameSession.objects.select_for_update().get(id=session_id, is_active=True)
+
+        session.team1_score = team1_score
+        session.team2_score = team2_score
+
+        winning_score = 10
+        if session.team1_score >= winning_score and session.team1_score > session.team2_score:
+            session.winner_team = 'team1'
+            session.is_completed = True
+        elif session.team2_score >= winning_score and session.team2_score > session.team1_score:
+            session.winner_team = 'team2'
+            session.is_completed = True
+        else:
+            # لو ما تحقق شرط الفوز، نتأكد من إلغاء أي حالة فوز/اكتمال سابقة
+            session.winner_team = None
+            session.is_completed = False
+
+        session.save(update_fields=['team1_score', 'team2_score', 'winner_team', 'is_completed'])
+    return session
+
+
+def _score_event(session):
+    return {
+        "type": "broadcast_score_update",
+        "team1_score": session.team1_score,
+        "team2_score": session.team2_score,
+        "winner": session.winner_team,
+        "is_completed": session.is_completed,
+    }
+
+
 # games/views.py
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -979,9 +1023,8 @@ def update_scores(request):
         return JsonResponse({'success': False, 'error': 'قيم النقاط يجب أن تكون أرقام صحيحة'}, status=400)
 
     # 3) التحقق من وجود الجلسة ونشاطها
-    try:
-        base_session = GameSession.objects.get(id=session_id, is_active=True)
-    except GameSession.DoesNotExist:
+    base_session = session_cache.resolve(session_id)
+    if base_session is None:
         return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
 
     if base_session.is_time_expired:
@@ -994,27 +1037,8 @@ def update_scores(request):
 
 
     # 4) حفظ من داخل معاملة مع قفل الصف لمنع السباقات
-    from django.db import transaction
     try:
-        with transaction.atomic():
-            session = GameSession.objects.select_for_update().get(id=session_id, is_active=True)
-
-            session.team1_score = t1_in
-            session.team2_score = t2_in
-
-            winning_score = 10
-            if session.team1_score >= winning_score and session.team1_score > session.team2_score:
-                session.winner_team = 'team1'
-                session.is_completed = True
-            elif session.team2_score >= winning_score and session.team2_score > session.team1_score:
-                session.winner_team = 'team2'
-                session.is_completed = True
-            else:
-                # لو ما تحقق شرط الفوز، نتأكد من إلغاء أي حالة فوز/اكتمال سابقة
-                session.winner_team = None
-                session.is_completed = False
-
-            session.save(update_fields=['team1_score', 'team2_score', 'winner_team', 'is_completed'])
+        session = _save_scores(session_id, t1_in, t2_in)
     except Exception as e:
         logger.error(f'DB update error (scores) for session {session_id}: {e}')
         return JsonResponse({'success': False, 'error': 'خطأ داخلي أثناء تحديث النقاط'}, status=500)
@@ -1024,14 +1048,7 @@ def update_scores(request):
         channel_layer = get_channel_layer()
         if channel_layer:
             async_to_sync(channel_layer.group_send)(
-                f"{session.game_type}_session_{session_id}",
-                {
-                    "type": "broadcast_score_update",
-                    "team1_score": session.team1_score,
-                    "team2_score": session.team2_score,
-                    "winner": session.winner_team,
-                    "is_completed": session.is_completed,
-                }
+                f"{session.game_type}_session_{session_id}", _score_event(session)
             )
     except Exception as e:
         logger.error(f'WS broadcast error (scores) for session {session_id}: {e}')
@@ -1052,25 +1069,37 @@ def session_state(request):
     if not sid:
         return HttpResponseBadRequest("missing session_id")
 
-    session = get_object_or_404(GameSession, id=sid)
+    session = _session_or_404(sid, active=False)
     if session.is_time_expired:
         return JsonResponse({"detail": "expired"}, status=410)
 
-    progress = LettersGameProgress.objects.filter(session=session).only("cell_states").first()
-    cell_states = progress.cell_states if (progress and isinstance(progress.cell_states, dict)) else {}
+    # النقاط تتغير باستمرار فلا تدخل اللقطة: تُقرأ مع اللوحة في استعلام واحد
+    row = GameSession.objects.filter(id=session.id).values(
+        "team1_score", "team2_score",
+        "letters_progress__id", "letters_progress__cell_states",
+        "letters_progress__team1_cells", "letters_progress__team2_cells",
+    ).first() or {}
+    has_progress = row.get("letters_progress__id") is not None
+    cell_states = row.get("letters_progress__cell_states")
+    board = (
+        (row["letters_progress__team1_cells"], row["letters_progress__team2_cells"])
+        if has_progress else hexboard.EMPTY
+    )
 
     time_remaining_seconds = None
-    if session.package.is_free:
-        end_at = session.created_at + timedelta(hours=1)
-        left = int((end_at - timezone.now()).total_seconds())
+    if session.expires_at is not None:
+        left = int((session.expires_at - timezone.now()).total_seconds())
         time_remaining_seconds = max(0, left)
 
     letters = get_session_order(session.id, session.package.is_free) or []
+    # خلايا cell_states بمفاتيح الحروف (صفوف قديمة لم تحوّلها الهجرة) تُدمج بترتيب حروف الجلسة
+    board = hexboard.merge_letters(board, cell_states, letters)
 
     return JsonResponse({
-        "team1_score": session.team1_score,
-        "team2_score": session.team2_score,
-        "cell_states": cell_states,
+        "team1_score": row.get("team1_score", 0),
+        "team2_score": row.get("team2_score", 0),
+        # اللوحة [team1, team2] كبتات
+        "board": list(board),
         "time_remaining_seconds": time_remaining_seconds,
         "arabic_letters": letters,
     })
@@ -1093,7 +1122,9 @@ def add_contestant(request):
         if len(name) > 50:
             return JsonResponse({'success': False, 'error': 'اسم المتسابق طويل جداً'}, status=400)
 
-        session = GameSession.objects.get(id=session_id, is_active=True)
+        session = session_cache.resolve(session_id)
+        if session is None:
+            return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
         if session.is_time_expired:
             return JsonResponse({
                 'success': False,
@@ -1102,13 +1133,13 @@ def add_contestant(request):
                 'message': 'انتهت صلاحية الجلسة المجانية (ساعة واحدة)'
             }, status=410)
 
-        existing = Contestant.objects.filter(session=session, name=name).first()
+        existing = Contestant.objects.filter(session_id=session.id, name=name).first()
         if existing:
             if existing.team != team:
                 existing.team = team
                 existing.save(update_fields=['team'])
         else:
-            Contestant.objects.create(session=session, name=name, team=team)
+            Contestant.objects.create(session_id=session.id, name=name, team=team)
 
         logger.info(f'New contestant ensured: {name} -> {team} in session {session_id}')
         return JsonResponse({
@@ -1117,8 +1148,6 @@ def add_contestant(request):
             'contestant': {'name': name, 'team': team}
         })
 
-    except GameSession.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
     except Exception as e:
@@ -1213,6 +1242,23 @@ def api_session_expiry_info(request):
 # -------------------------------
 # زر الطنطيط عبر HTTP (3 ثوانٍ)
 # -------------------------------
+def _buzz_timer_key(session_id):
+    return f"buzz_timer_{session_id}"
+
+
+def _buzz_timer(session):
+    timer_cache_key = _buzz_timer_key(session.id)
+    buzz_timer = cache.get(timer_cache_key)
+    if buzz_timer is None:
+        try:
+            s = GameSettings.get_or_create_for_session(session)
+            buzz_timer = max(1, s.buzz_timer_seconds or 3)
+        except Exception:
+            buzz_timer = 3
+        cache.set(timer_cache_key, buzz_timer, timeout=600)
+    return buzz_timer
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @csrf_exempt
@@ -1228,68 +1274,59 @@ def api_contestant_buzz_http(request):
         if not all([session_id, contestant_name, team]):
             return JsonResponse({'success': False, 'error': 'جميع المعاملات مطلوبة'}, status=400)
 
-        try:
-            session = GameSession.objects.get(id=session_id, is_active=True)
-        except GameSession.DoesNotExist:
+        session = session_cache.resolve(session_id)
+        if session is None:
             return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
 
         if session.is_time_expired:
             return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True}, status=410)
 
         # ─── قراءة المؤقت من cache ───────────────────────────
-        timer_cache_key = f"buzz_timer_{session_id}"
-        buzz_timer = cache.get(timer_cache_key)
-        if buzz_timer is None:
-            try:
-                from .models import GameSettings
-                s = GameSettings.get_or_create_for_session(session)
-                buzz_timer = max(1, s.buzz_timer_seconds or 3)
-            except Exception:
-                buzz_timer = 3
-            cache.set(timer_cache_key, buzz_timer, timeout=600)
+        buzz_timer = _buzz_timer(session)
 
         lock_ttl = buzz_timer + 2
 
-        # ─── قفل ذري ─────────────────────────────────────────
-        buzz_lock_key = f"buzz_lock_{session_id}"
+        # ─── حَكَم البازر (نفس قرار مسار WS؛ HTTP بوقت الوصول فقط) ─
         lock_payload = {
             'name': contestant_name,
             'team': team,
             'timestamp': timestamp,
-            'session_id': session_id,
+            'session_id': str(session_id),
             'method': 'HTTP',
         }
 
         try:
-            added = cache.add(buzz_lock_key, lock_payload, timeout=lock_ttl)
-        except Exception:
-            added = False
+            accepted, winner = buzzer.arbitrate_sync(
+                buzzer.lock_key(session_id), lock_payload, ttl_seconds=lock_ttl
+            )
+        except Exception as e:
+            logger.error(f"Buzzer arbitration error (HTTP) for session {session_id}: {e}")
+            accepted, winner = False, None
 
-        if not added:
-            current_buzzer = cache.get(buzz_lock_key) or {}
+        if not accepted:
+            winner = winner or {}
             return JsonResponse({
                 'success': False,
-                'message': f'الزر محجوز من {current_buzzer.get("name","مشارك")}',
-                'locked_by': current_buzzer.get('name'),
-                'locked_team': current_buzzer.get('team')
+                'message': buzzer.rejection_message(winner),
+                'locked_by': winner.get('name'),
+                'locked_team': winner.get('team')
             })
 
-        # ─── تسجيل المتسابق ──────────────────────────────────
-        contestant, created = Contestant.objects.get_or_create(
-            session=session,
-            name=contestant_name,
-            defaults={'team': team}
-        )
-        if not created and contestant.team != team:
-            contestant.team = team
-            contestant.save(update_fields=['team'])
+        # ─── تسجيل المتسابق (أول ضغطة للاسم فقط تكتب في DB) ──
+        member = presence.clean(contestant_name, team)
+        if member:
+            try:
+                presence.record_sync(session_id, *member)
+            except Exception as e:
+                logger.error(f"Contestant record error (HTTP) for session {session_id}: {e}")
 
         # ─── بث عبر WebSocket ────────────────────────────────
         try:
             channel_layer = get_channel_layer()
             if channel_layer:
                 team_display = session.team1_name if team == 'team1' else session.team2_name
-                async_to_sync(channel_layer.group_send)(
+                ws_groups.group_send_sync(
+                    channel_layer,
                     f"letters_session_{session_id}",
                     {
                         'type': 'broadcast_buzz_event',
@@ -1298,7 +1335,8 @@ def api_contestant_buzz_http(request):
                         'team_display': team_display,
                         'timestamp': timestamp,
                         'action': 'buzz_accepted',
-                    }
+                    },
+                    roles=ws_groups.HOST_AND_DISPLAY,
                 )
         except Exception as e:
             logger.error(f"Error sending HTTP buzz to WebSocket: {e}")
@@ -1356,11 +1394,7 @@ def letters_new_round(request):
 
     # 2) تصفير تقدّم الخلايا فقط
     try:
-        progress = LettersGameProgress.objects.filter(session=session).first()
-        if progress:
-            progress.cell_states = {}
-            progress.used_letters = []
-            progress.save(update_fields=['cell_states', 'used_letters'])
+        progress_store.reset_cells(session.id)
     except Exception:
         pass
 
@@ -1450,9 +1484,11 @@ def _broadcast_images_index_async(session_id, idx, count):
         layer = get_channel_layer()
         if not layer:
             return
-        async_to_sync(layer.group_send)(
+        ws_groups.group_send_sync(
+            layer,
             f"images_session_{session_id}",
-            {"type": "broadcast_image_index", "current_index": idx, "count": count}
+            {"type": "broadcast_image_index", "current_index": idx, "count": count},
+            roles=ws_groups.HOST_AND_DISPLAY,
         )
     except Exception as e:
         logger.error(f'WS broadcast async (images) error: {e}')
@@ -1469,7 +1505,7 @@ def _clamp_index(idx, total):
 
 
 def _get_riddles_qs(session):
-    return PictureRiddle.objects.filter(package=session.package).order_by('order') \
+    return PictureRiddle.objects.filter(package_id=session.package_id).order_by('order') \
             .values('order', 'image_url', 'hint', 'answer')
 
 
@@ -1510,10 +1546,9 @@ def create_images_session(request):
     # قفل خفيف ضد الدبل-ضغط
     lock_owner = request.user.id if request.user.is_authenticated else request.META.get('REMOTE_ADDR', 'anon')
     lock_key = f"images_create_lock:{lock_owner}"
-    if cache.get(lock_key):
+    if not cache.add(lock_key, 1, timeout=3):
         messages.info(request, '⏳ يتم إنشاء الجلسة الآن...')
         return redirect('games:images_home')
-    cache.set(lock_key, 1, timeout=3)
 
     try:
         # لازم يكون فيه ألغاز
@@ -1535,10 +1570,10 @@ def create_images_session(request):
                 return redirect('games:images_home')
 
             # لو عنده جلسة مجانية نشطة لنفس الحزمة رجّعه لها
-            existing = (GameSession.objects
-                        .filter(host=request.user, package=package, is_active=True)
+            existing = (GameSession.objects.live()
+                        .filter(host=request.user, package=package)
                         .order_by('-created_at').first())
-            if existing and not existing.is_time_expired:
+            if existing:
                 messages.success(request, 'تم توجيهك إلى جلستك المجانية النشطة.')
                 return redirect('games:images_session', session_id=existing.id)
 
@@ -1548,7 +1583,7 @@ def create_images_session(request):
                 game_type='images',
                 purchase=None,
             )
-            PictureGameProgress.objects.get_or_create(session=session, defaults={'current_index': 1})
+            PictureGameProgress.objects.get_or_create(session_id=session.id, defaults={'current_index': 1})
             messages.success(request, '🎉 تم إنشاء الجلسة المجانية! صالحة لمدة ساعة.')
             return redirect('games:images_session', session_id=session.id)
 
@@ -1633,13 +1668,12 @@ def images_create(request):
         return redirect("games:images_home")
 
     # لو لديه جلسة قديمة مرتبطة بنفس الشراء
-    existing_session = GameSession.objects.filter(
+    existing_session = GameSession.objects.live().filter(
         purchase=purchase,
-        is_active=True,
         game_type="images"
     ).first()
 
-    if existing_session and not existing_session.is_time_expired:
+    if existing_session:
         return redirect("games:images_session", session_id=existing_session.id)
 
     # إنشاء جلسة جديدة
@@ -1660,7 +1694,7 @@ def images_create(request):
 
 
 def images_display(request, display_link):
-    session = get_object_or_404(GameSession, display_link=display_link, is_active=True, game_type='images')
+    session = _session_or_404(display_link=display_link, game_type='images')
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
             'message': _expired_text(session),
@@ -1668,9 +1702,9 @@ def images_display(request, display_link):
             'upgrade_message': 'للاستمتاع بجلسات أطول، تصفح الحزم المدفوعة.'
         })
 
-    riddles = list(PictureRiddle.objects.filter(package=session.package).order_by('order')
+    riddles = list(PictureRiddle.objects.filter(package_id=session.package_id).order_by('order')
                    .values('order', 'image_url'))
-    progress = PictureGameProgress.objects.filter(session=session).first()
+    progress = PictureGameProgress.objects.filter(session_id=session.id).first()
     current_index = progress.current_index if progress else 1
     current_index = max(1, min(current_index, len(riddles)))
 
@@ -1684,7 +1718,7 @@ def images_display(request, display_link):
 
 def images_contestants(request, contestants_link):
     """صفحة المتسابقين (نفس زر الطنطيط والفرق)؛ العرض الفعلي للصورة على شاشة العرض."""
-    session = get_object_or_404(GameSession, contestants_link=contestants_link, is_active=True, game_type='images')
+    session = _session_or_404(contestants_link=contestants_link, game_type='images')
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
             'message': _expired_text(session),
@@ -1704,7 +1738,7 @@ def api_images_get_current(request):
     if not sid:
         return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
 
-    session = get_object_or_404(GameSession, id=sid, is_active=True, game_type='images')
+    session = _session_or_404(sid, game_type='images')
     if session.is_time_expired:
         return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True}, status=410)
 
@@ -1712,7 +1746,7 @@ def api_images_get_current(request):
     if not riddles:
         return JsonResponse({'success': False, 'error': 'لا توجد ألغاز في هذه الحزمة'}, status=400)
 
-    progress = PictureGameProgress.objects.filter(session=session).first()
+    progress = PictureGameProgress.objects.filter(session_id=session.id).first()
     idx = progress.current_index if progress else 1
     payload = _json_current_payload(session, riddles, idx)
     return JsonResponse(payload)
@@ -1731,7 +1765,7 @@ def api_images_set_index(request):
     if not sid or idx is None:
         return JsonResponse({'success': False, 'error': 'session_id و index مطلوبة'}, status=400)
 
-    session = get_object_or_404(GameSession, id=sid, is_active=True, game_type='images')
+    session = _session_or_404(sid, game_type='images')
     if session.is_time_expired:
         return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True}, status=410)
 
@@ -1741,7 +1775,7 @@ def api_images_set_index(request):
         return JsonResponse({'success': False, 'error': 'لا ألغاز'}, status=400)
 
     idx = _clamp_index(idx, total)
-    progress, _ = PictureGameProgress.objects.get_or_create(session=session, defaults={'current_index': 1})
+    progress, _ = PictureGameProgress.objects.get_or_create(session_id=session.id, defaults={'current_index': 1})
     progress.current_index = idx
     progress.save(update_fields=['current_index'])
 
@@ -1768,7 +1802,7 @@ def api_images_next(request):
     if not sid:
         return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
 
-    session = get_object_or_404(GameSession, id=sid, is_active=True, game_type='images')
+    session = _session_or_404(sid, game_type='images')
     if session.is_time_expired:
         return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True}, status=410)
 
@@ -1777,7 +1811,7 @@ def api_images_next(request):
     if total == 0:
         return JsonResponse({'success': False, 'error': 'لا ألغاز'}, status=400)
 
-    progress, _ = PictureGameProgress.objects.get_or_create(session=session, defaults={'current_index': 1})
+    progress, _ = PictureGameProgress.objects.get_or_create(session_id=session.id, defaults={'current_index': 1})
     new_idx = _clamp_index(progress.current_index + 1, total)
     progress.current_index = new_idx
     progress.save(update_fields=['current_index'])
@@ -1805,7 +1839,7 @@ def api_images_prev(request):
     if not sid:
         return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
 
-    session = get_object_or_404(GameSession, id=sid, is_active=True, game_type='images')
+    session = _session_or_404(sid, game_type='images')
     if session.is_time_expired:
         return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True}, status=410)
 
@@ -1814,7 +1848,7 @@ def api_images_prev(request):
     if total == 0:
         return JsonResponse({'success': False, 'error': 'لا ألغاز'}, status=400)
 
-    progress, _ = PictureGameProgress.objects.get_or_create(session=session, defaults={'current_index': 1})
+    progress, _ = PictureGameProgress.objects.get_or_create(session_id=session.id, defaults={'current_index': 1})
     new_idx = _clamp_index(progress.current_index - 1, total)
     progress.current_index = new_idx
     progress.save(update_fields=['current_index'])
@@ -1932,9 +1966,8 @@ def api_get_settings(request):
     if not session_id:
         return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
 
-    try:
-        session = GameSession.objects.get(id=session_id, is_active=True)
-    except GameSession.DoesNotExist:
+    session = session_cache.resolve(session_id)
+    if session is None:
         return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
 
 
@@ -1964,25 +1997,8 @@ def api_get_settings(request):
     })
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def api_save_settings(request):
-    try:
-        data = json.loads(request.body or '{}')
-    except json.JSONDecodeError:
-        return JsonResponse({'success': False, 'error': 'JSON غير صحيح'}, status=400)
-
-    session_id = data.get('session_id')
-    if not session_id:
-        return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
-
-    try:
-        session = GameSession.objects.get(id=session_id, is_active=True)
-    except GameSession.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
-
-    settings = GameSettings.get_or_create_for_session(session)
-
+def _apply_settings(settings, data):
+    """تطبيق حقول الطلب على GameSettings (بدون حفظ)؛ يرجع أسماء الفريقين المرسلة."""
     t1_name = (data.get('team1_name') or '').strip()
     t2_name = (data.get('team2_name') or '').strip()
     if t1_name:
@@ -2036,8 +2052,31 @@ def api_save_settings(request):
     settings.show_name = data.get('show_name', '')[:50]
     settings.show_subtitle = data.get('show_subtitle', '')[:50]
 
+    return t1_name, t2_name
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_save_settings(request):
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'JSON غير صحيح'}, status=400)
+
+    session_id = data.get('session_id')
+    if not session_id:
+        return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
+
+    try:
+        session = GameSession.objects.get(id=session_id, is_active=True)
+    except GameSession.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
+
+    settings = GameSettings.get_or_create_for_session(session)
+    t1_name, t2_name = _apply_settings(settings, data)
+
     settings.save()
-    cache.set(f"buzz_timer_{session_id}", settings.buzz_timer_seconds, timeout=600)
+    cache.set(_buzz_timer_key(session_id), settings.buzz_timer_seconds, timeout=600)
 
     changed_session = False
     if t1_name and session.team1_name != settings.team1_name:
@@ -2118,13 +2157,11 @@ def feud_game_home(request):
 
         if free_package:
             free_active_session = (
-                GameSession.objects
-                .filter(host=request.user, package=free_package, is_active=True, game_type='feud')
+                GameSession.objects.live()
+                .filter(host=request.user, package=free_package, game_type='feud')
                 .order_by('-created_at')
                 .first()
             )
-            if free_active_session and free_active_session.is_time_expired:
-                free_active_session = None
 
         purchases = UserPurchase.objects.filter(
             user=request.user, package__game_type='feud'
@@ -2189,10 +2226,10 @@ def create_feud_session(request):
             with transaction.atomic():
                 FreeTrialUsage.objects.create(user=request.user, game_type='feud')
         except IntegrityError:
-            existing = GameSession.objects.filter(
-                host=request.user, package=package, is_active=True
+            existing = GameSession.objects.live().filter(
+                host=request.user, package=package
             ).order_by('-created_at').first()
-            if existing and not existing.is_time_expired:
+            if existing:
                 from django.http import HttpResponseRedirect
                 return HttpResponseRedirect(reverse('games:feud_session', args=[existing.id]))
             messages.error(request, 'لقد استخدمت الجلسة المجانية لفاميلي فيود.')
@@ -2244,7 +2281,7 @@ def feud_session(request, session_id):
 
 
 def feud_display(request, display_link):
-    session = get_object_or_404(GameSession, display_link=display_link, is_active=True, game_type='feud')
+    session = _session_or_404(display_link=display_link, game_type='feud')
 
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
@@ -2256,7 +2293,7 @@ def feud_display(request, display_link):
 
 
 def feud_contestants(request, contestants_link):
-    session = get_object_or_404(GameSession, contestants_link=contestants_link, is_active=True, game_type='feud')
+    session = _session_or_404(contestants_link=contestants_link, game_type='feud')
 
     if session.is_time_expired:
         return render(request, 'games/session_expired.html', {
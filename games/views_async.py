@@ -0,0 +1,392 @@
+# games/views_async.py
+"""
+نسخ async لـ APIs خلية الحروف اللحظية (مسار HTTP الاحتياطي لعملاء بدون WebSocket):
+- نفس العناوين والتحقق والاستجابات كما في views.py (النسخ المتزامنة باقية هناك للتوافق)
+- تحت daphne تعمل داخل حلقة الأحداث: الـ ORM غير المتزامن و await لـ group_send مباشرة
+  بدل async_to_sync في كل طلب
+- الجلسة من session_cache.aresolve وإعدادات الجلسة من live_settings إن كانت محمّلة في العملية
+- ما يحتاج معاملة (select_for_update للنقاط) أو كاش متزامن يمر بـ sync_to_async مرة واحدة
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from games import buzzer, hexboard, live_settings, presence, progress_store, session_cache, ws_groups
+from games import views
+from games.models import GameSession, GameSettings, LettersGameProgress
+from games.utils_letters import get_paid_order_fresh, set_session_order
+
+logger = logging.getLogger('games')
+
+
+def _expired_response(**extra):
+    return JsonResponse({'success': False, 'error': 'انتهت صلاحية الجلسة', 'session_expired': True, **extra}, status=410)
+
+
+async def _send(group, event, roles=None):
+    channel_layer = get_channel_layer()
+    if channel_layer:
+        await ws_groups.group_send(channel_layer, group, event, roles)
+
+
+async def _grid_size(session_id):
+    snap = live_settings.peek(session_id)
+    if snap is not None:
+        return snap.get('grid_size')
+    return await GameSettings.objects.filter(session_id=session_id).values_list('grid_size', flat=True).afirst()
+
+
+async def _letters_round_won(session, index, team):
+    board = await LettersGameProgress.objects.filter(
+        session_id=session.id
+    ).values_list('team1_cells', 'team2_cells').afirst()
+    return views._round_won_on(board, await _grid_size(session.id), index, team)
+
+
+async def _buzz_timer(session):
+    snap = live_settings.peek(session.id)
+    if snap is not None:
+        return snap.buzz_timer
+    timer_cache_key = views._buzz_timer_key(session.id)
+    buzz_timer = await cache.aget(timer_cache_key)
+    if buzz_timer is None:
+        try:
+            s = await GameSettings.aget_or_create_for_session(session)
+            buzz_timer = max(1, s.buzz_timer_seconds or 3)
+        except Exception:
+            buzz_timer = 3
+        await cache.aset(timer_cache_key, buzz_timer, timeout=600)
+    return buzz_timer
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def update_cell_state(request):
+    """نسخة async من views.update_cell_state."""
+    try:
+        data = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
+
+    session_id = data.get('session_id')
+    letter_in = (data.get('letter') or '').strip()
+    state = data.get('state')
+
+    if not session_id or not letter_in or state is None:
+        return JsonResponse({'success': False, 'error': 'جميع المعاملات مطلوبة'}, status=400)
+
+    state = str(state)
+    if state not in ('normal', 'team1', 'team2'):
+        return JsonResponse({'success': False, 'error': 'حالة الخلية غير صحيحة'}, status=400)
+
+    session = await session_cache.aresolve(session_id)
+    if session is None:
+        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
+
+    if session.is_time_expired:
+        return _expired_response(message='انتهت صلاحية الجلسة المجانية (ساعة واحدة)')
+
+    letters = await sync_to_async(views.get_letters_for_session)(session)
+    chosen_in_session = views._session_letter(letters, letter_in)
+    if not chosen_in_session:
+        return JsonResponse({'success': False, 'error': f'الحرف {letter_in} غير متاح في هذه الجلسة'}, status=400)
+
+    try:
+        cell_index = hexboard.cell_index(data.get('cell_index'))
+        board_index = cell_index if cell_index is not None else hexboard.cell_index(chosen_in_session, letters)
+        await progress_store.aapply_cells(
+            session.id, {chosen_in_session: state}, [chosen_in_session],
+            board={board_index: state} if board_index is not None else None,
+        )
+
+        try:
+            await _send(f"letters_session_{session_id}", {
+                "type": "broadcast_cell_state",
+                "letter": chosen_in_session,
+                "state": state,
+                "cell_index": cell_index,
+            })
+        except Exception as e:
+            logger.error(f'WS broadcast error (cell_state): {e}')
+
+        if board_index is not None and state != 'normal':
+            try:
+                won = await _letters_round_won(session, board_index, state)
+                if won:
+                    await _send(f"letters_session_{session_id}", {"type": "broadcast_round_won", **won})
+            except Exception as e:
+                logger.error(f'Round win check error: {e}')
+
+        logger.info(f'Cell state updated: {chosen_in_session} -> {state} in session {session_id}')
+        return JsonResponse({'success': True, 'message': 'تم تحديث حالة الخلية', 'letter': chosen_in_session, 'state': state})
+
+    except Exception as e:
+        logger.error(f'Error updating cell state: {e}')
+        return JsonResponse({'success': False, 'error': f'خطأ داخلي: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def update_scores(request):
+    """نسخة async من views.update_scores؛ الحفظ نفسه معاملة select_for_update في thread واحد."""
+    try:
+        data = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
+
+    session_id = data.get('session_id')
+    if not session_id:
+        return JsonResponse({'success': False, 'error': 'معرف الجلسة مطلوب'}, status=400)
+
+    try:
+        t1_in = max(0, int(data.get('team1_score', 0)))
+        t2_in = max(0, int(data.get('team2_score', 0)))
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'قيم النقاط يجب أن تكون أرقام صحيحة'}, status=400)
+
+    base_session = await session_cache.aresolve(session_id)
+    if base_session is None:
+        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
+
+    if base_session.is_time_expired:
+        return _expired_response(message='انتهت صلاحية الجلسة المجانية (ساعة واحدة)')
+
+    try:
+        session = await sync_to_async(views._save_scores)(session_id, t1_in, t2_in)
+    except Exception as e:
+        logger.error(f'DB update error (scores) for session {session_id}: {e}')
+        return JsonResponse({'success': False, 'error': 'خطأ داخلي أثناء تحديث النقاط'}, status=500)
+
+    try:
+        await _send(f"{session.game_type}_session_{session_id}", views._score_event(session))
+    except Exception as e:
+        logger.error(f'WS broadcast error (scores) for session {session_id}: {e}')
+
+    logger.info(f'Scores updated in session {session_id}: Team1={session.team1_score}, Team2={session.team2_score}')
+    return JsonResponse({
+        'success': True,
+        'message': 'تم تحديث النقاط',
+        'team1_score': session.team1_score,
+        'team2_score': session.team2_score,
+        'winner': session.winner_team,
+        'is_completed': session.is_completed
+    })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def api_contestant_buzz_http(request):
+    """نسخة async من views.api_contestant_buzz_http — نافذة الحَكَم تنتظر بـ asyncio.sleep لا time.sleep."""
+    try:
+        data = json.loads(request.body or "{}")
+        session_id = data.get('session_id')
+        contestant_name = (data.get('contestant_name') or '').strip()
+        team = data.get('team')
+        timestamp = data.get('timestamp')
+
+        if not all([session_id, contestant_name, team]):
+            return JsonResponse({'success': False, 'error': 'جميع المعاملات مطلوبة'}, status=400)
+
+        session = await session_cache.aresolve(session_id)
+        if session is None:
+            return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
+
+        if session.is_time_expired:
+            return _expired_response()
+
+        buzz_timer = await _buzz_timer(session)
+        lock_payload = {
+            'name': contestant_name,
+            'team': team,
+            'timestamp': timestamp,
+            'session_id': str(session_id),
+            'method': 'HTTP',
+        }
+
+        try:
+            accepted, winner = await buzzer.arbitrate(
+                buzzer.lock_key(session_id), lock_payload, ttl_seconds=buzz_timer + 2
+            )
+        except Exception as e:
+            logger.error(f"Buzzer arbitration error (HTTP) for session {session_id}: {e}")
+            accepted, winner = False, None
+
+        if not accepted:
+            winner = winner or {}
+            return JsonResponse({
+                'success': False,
+                'message': buzzer.rejection_message(winner),
+                'locked_by': winner.get('name'),
+                'locked_team': winner.get('team')
+            })
+
+        member = presence.clean(contestant_name, team)
+        if member:
+            try:
+                await presence.record(session_id, *member)
+            except Exception as e:
+                logger.error(f"Contestant record error (HTTP) for session {session_id}: {e}")
+
+        try:
+            await _send(f"letters_session_{session_id}", {
+                'type': 'broadcast_buzz_event',
+                'contestant_name': contestant_name,
+                'team': team,
+                'team_display': session.team1_name if team == 'team1' else session.team2_name,
+                'timestamp': timestamp,
+                'action': 'buzz_accepted',
+            }, roles=ws_groups.HOST_AND_DISPLAY)
+        except Exception as e:
+            logger.error(f"Error sending HTTP buzz to WebSocket: {e}")
+
+        logger.info(f"HTTP Buzz accepted: {contestant_name} from {team} in session {session_id}, timer={buzz_timer}s")
+        return JsonResponse({
+            'success': True,
+            'message': f'تم تسجيل إجابتك يا {contestant_name}!',
+            'contestant_name': contestant_name,
+            'team': team,
+            'method': 'HTTP'
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
+    except Exception as e:
+        logger.error(f'HTTP Buzz error: {e}')
+        return JsonResponse({'success': False, 'error': f'خطأ داخلي: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def letters_new_round(request):
+    """نسخة async من views.letters_new_round (لا تلمس النقاط)."""
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
+
+    sid = payload.get("session_id")
+    if not sid:
+        return JsonResponse({'success': False, 'error': 'معرف الجلسة مطلوب'}, status=400)
+
+    session = await session_cache.aresolve(sid)
+    if session is None:
+        raise Http404("الجلسة غير موجودة أو غير نشطة")
+
+    if session.is_time_expired:
+        return _expired_response()
+
+    if session.package.is_free:
+        return JsonResponse({'success': False, 'error': 'الميزة متاحة للحزم المدفوعة فقط'}, status=403)
+
+    is_sports = getattr(session.package, 'question_theme', '') == 'sports'
+    new_letters = get_paid_order_fresh(is_sports=is_sports)
+    await sync_to_async(set_session_order)(session.id, new_letters, is_free=False)
+
+    try:
+        await progress_store.areset_cells(session.id)
+    except Exception:
+        pass
+
+    try:
+        await _send(f"letters_session_{session.id}", {
+            "type": "broadcast_letters_replace", "letters": new_letters, "reset_progress": True,
+        })
+    except Exception as e:
+        logger.error(f"WS broadcast error (new round): {e}")
+
+    return JsonResponse({
+        'success': True,
+        'letters': new_letters,
+        'reset_progress': True
+    })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def api_letters_select_letter(request):
+    """نسخة async من views.api_letters_select_letter (إشعار بصري فقط)."""
+    try:
+        payload = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'بيانات JSON غير صحيحة'}, status=400)
+
+    sid = payload.get("session_id")
+    letter = payload.get("letter")
+    if not sid or not letter:
+        return JsonResponse({'success': False, 'error': 'session_id و letter مطلوبة'}, status=400)
+
+    session = await session_cache.aresolve(sid, game_type='letters')
+    if session is None:
+        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة أو غير نشطة'}, status=404)
+
+    if session.is_time_expired:
+        return _expired_response()
+
+    letters = await sync_to_async(views.get_letters_for_session)(session)
+    if letter not in letters:
+        return JsonResponse({'success': False, 'error': f'الحرف {letter} غير متاح في هذه الجلسة'}, status=400)
+
+    try:
+        await _send(f"letters_session_{session.id}", {
+            "type": "broadcast_letter_selected",
+            "letter": letter,
+            "cell_index": payload.get("cell_index"),
+        })
+    except Exception as e:
+        logger.error(f'WS broadcast error (letter_selected): {e}')
+
+    return JsonResponse({'success': True, 'message': 'تم بثّ الحرف', 'letter': letter})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def api_save_settings(request):
+    """نسخة async من views.api_save_settings."""
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'JSON غير صحيح'}, status=400)
+
+    session_id = data.get('session_id')
+    if not session_id:
+        return JsonResponse({'success': False, 'error': 'session_id مطلوب'}, status=400)
+
+    session = await session_cache.aresolve(session_id)
+    if session is None:
+        return JsonResponse({'success': False, 'error': 'الجلسة غير موجودة'}, status=404)
+
+    settings = await GameSettings.aget_or_create_for_session(session)
+    t1_name, t2_name = views._apply_settings(settings, data)
+    await settings.asave()
+    await cache.aset(views._buzz_timer_key(session.id), settings.buzz_timer_seconds, timeout=600)
+
+    names = {}
+    if t1_name and session.team1_name != settings.team1_name:
+        names['team1_name'] = settings.team1_name
+    if t2_name and session.team2_name != settings.team2_name:
+        names['team2_name'] = settings.team2_name
+    if names:
+        # update لا يطلق post_save: نُسقط لقطة الجلسة بأنفسنا
+        await GameSession.objects.filter(id=session.id).aupdate(**names)
+        await sync_to_async(session_cache.invalidate)(session.id, session.display_link, session.contestants_link)
+
+    settings_payload = live_settings.settings_values(settings)
+    try:
+        await _send(f"letters_session_{session_id}", {
+            "type": "broadcast_settings_update",
+            "settings": settings_payload,
+        })
+    except Exception as e:
+        logger.error(f'WS broadcast error (settings): {e}')
+
+    return JsonResponse({
+        'success': True,
+        'message': 'تم حفظ الإعدادات',
+        'settings': settings_payload,
+    })
@@ -1,10 +1,7 @@
 # games/views_time.py
-from datetime import timedelta
-
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.views.decorators.http import require_GET, require_POST
 from django.template import TemplateDoesNotExist
@@ -56,10 +53,8 @@ def _is_free_trial_session(session: GameSession) -> bool:
 
 
 def _is_session_expired(session: GameSession) -> bool:
-    """تحقق انتهاء الصلاحية: تجربة=1 ساعة، مدفوعة=72 ساعة."""
-    is_trial = _is_free_trial_session(session)
-    expiry = session.created_at + (timedelta(hours=1) if is_trial else timedelta(hours=72))
-    return timezone.now() >= expiry
+    """تحقق انتهاء الصلاحية من expires_at المخزّن: تجربة=1 ساعة، مدفوعة=72 ساعة."""
+    return session.is_time_expired
 
 
 def _gen_code(n=12) -> str:
@@ -263,6 +258,8 @@ def create_time_session(request):
                 transaction.set_rollback(True)
                 return HttpResponseBadRequest(f"لا توجد حزمة تجريبية (#0) مفعّلة لفئة {c.name}")
             TimeSessionPackage.objects.create(session=session, category=c, package=pkg0)
+        # جولة تجربة: الموعد ساعة بعد ربط حزم #0 (الإنشاء حسبها مدفوعة)
+        session.refresh_expiry()
 
     return redirect("games:time_host", session_id=session.id)
 
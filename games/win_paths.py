@@ -0,0 +1,164 @@
+# games/win_paths.py
+"""
+كشف الفوز في خلية الحروف: فريق يربط حافتين متقابلتين بخلاياه
+(team1 أعلى↔أسفل، team2 يمين↔يسار — كما تلوّن خلفية اللوحة حواف كل فريق).
+- الجيران محسوبة مرة لكل حجم شبكة (hexboard.neighbours)
+- union-find لكل فريق + عقدتان افتراضيتان للحافتين: تلوين خلية = ضمّها لجيرانها، شبه ثابت الزمن
+- إزالة خلية من فريق (normal أو تبديل الفريق) لا يدعمها union-find: نعيد البناء من قناع الفريق (≤ 49 خلية)
+- round_won يُعلن مرة واحدة عند أول اتصال، مع أقصر مسار (BFS داخل خلايا الفريق) لتمييزه على اللوحة
+"""
+from functools import lru_cache
+
+from games import hexboard
+
+TEAM_EDGES = {
+    'team1': ('top', 'bottom'),
+    'team2': ('left', 'right'),
+}
+
+
+@lru_cache(maxsize=hexboard.MAX_SIZE)
+def adjacency(n) -> tuple:
+    """قائمة أرقام الجيران لكل خلية."""
+    out = []
+    for mask in hexboard.neighbours(n):
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(low.bit_length() - 1)
+            mask ^= low
+        out.append(tuple(cells))
+    return tuple(out)
+
+
+class TeamPaths:
+    """اتصال فريق واحد: خلايا n×n ثم عقدة حافة البداية ثم حافة النهاية."""
+
+    def __init__(self, n, start, goal, mask=0):
+        self.n = n
+        self.cells = n * n
+        self.start = self.cells
+        self.goal = self.cells + 1
+        sides = hexboard.edges(n)
+        self._start_mask = sides[start]
+        self._goal_mask = sides[goal]
+        self.rebuild(mask)
+
+    def _find(self, x):
+        parent = self._parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if self._size[a] < self._size[b]:
+            a, b = b, a
+        self._parent[b] = a
+        self._size[a] += self._size[b]
+
+    def rebuild(self, mask):
+        self._parent = list(range(self.cells + 2))
+        self._size = [1] * (self.cells + 2)
+        self.mask = 0
+        mask &= (1 << self.cells) - 1
+        while mask:
+            low = mask & -mask
+            self.add(low.bit_length() - 1)
+            mask ^= low
+
+    def add(self, index):
+        bit = 1 << index
+        if self.mask & bit:
+            return
+        self.mask |= bit
+        for other in adjacency(self.n)[index]:
+            if self.mask >> other & 1:
+                self._union(index, other)
+        if self._start_mask & bit:
+            self._union(index, self.start)
+        if self._goal_mask & bit:
+            self._union(index, self.goal)
+
+    def remove(self, index):
+        if self.mask >> index & 1:
+            self.rebuild(self.mask & ~(1 << index))
+
+    @property
+    def connected(self) -> bool:
+        return self._find(self.start) == self._find(self.goal)
+
+    def path(self) -> list:
+        """أقصر سلسلة خلايا من حافة البداية لحافة النهاية (فارغة إن لم تتصل)."""
+        came = {}
+        frontier = []
+        for index in range(self.cells):
+            if self.mask >> index & 1 and self._start_mask >> index & 1:
+                came[index] = None
+                frontier.append(index)
+        table = adjacency(self.n)
+        while frontier:
+            grown = []
+            for index in frontier:
+                if self._goal_mask >> index & 1:
+                    out = []
+                    while index is not None:
+                        out.append(index)
+                        index = came[index]
+                    return out[::-1]
+                for other in table[index]:
+                    if other not in came and self.mask >> other & 1:
+                        came[other] = index
+                        grown.append(other)
+            frontier = grown
+        return []
+
+
+class WinTracker:
+    """متتبّع الجلسة: لوحة الفريقين + آخر فائز أُعلن (حتى لا يتكرر الإعلان)."""
+
+    def __init__(self, n, board=hexboard.EMPTY):
+        self.n = n
+        self.teams = {
+            team: TeamPaths(n, start, goal, board[0] if team == 'team1' else board[1])
+            for team, (start, goal) in TEAM_EDGES.items()
+        }
+        # اتصال موجود مسبقاً (لوحة محمّلة) لا يُعلن من جديد
+        self.winner = self._winner()
+
+    def _winner(self):
+        for team, paths in self.teams.items():
+            if paths.connected:
+                return team
+        return None
+
+    def apply(self, index, state):
+        """يطبّق تلوين خلية؛ يرجع {'team', 'path'} عند فوز جديد وإلا None."""
+        if index is None or not 0 <= index < self.n * self.n:
+            return None
+        for team, paths in self.teams.items():
+            if team == state:
+                paths.add(index)
+            else:
+                paths.remove(index)
+        winner = self._winner()
+        if winner == self.winner:
+            return None
+        self.winner = winner
+        if winner is None:
+            return None
+        return {'team': winner, 'path': self.teams[winner].path()}
+
+
+def check(board, n, teams=TEAM_EDGES):
+    """فحص بلا حالة (مسار HTTP): {'team', 'path'} إن كان أحد الفريقين متصلاً."""
+    for team, (start, goal) in TEAM_EDGES.items():
+        if team not in teams:
+            continue
+        mask = board[0] if team == 'team1' else board[1]
+        if hexboard.connects(mask & ((1 << n * n) - 1), n, start, goal):
+            return {'team': team, 'path': TeamPaths(n, start, goal, mask).path()}
+    return None
@@ -0,0 +1,124 @@
+# games/ws_groups.py
+"""
+مجموعات القنوات مقسّمة حسب الدور:
+- <type>_session_<id>               : كل المتصلين (كما كانت — تستخدمها الـ views)
+- <type>_session_<id>_<role>        : host / display / contestant
+الدور viewer (أو أي دور غير معروف) يعامل كشاشة عرض.
+البث الموجّه يرسل فقط للأدوار المهتمة بالحدث بدل أن يستقبله الجميع ثم يتجاهله.
+
+الترميز مرة واحدة: broadcast() يبني رسالة العميل ويرمّزها عند الإرسال ويحملها في الحدث
+(frame للـ JSON و frame_bin للـ msgpack)، وكل مستهلك يمرر ما يناسب بروتوكوله كما هو
+عبر forward() بدل الترميز لكل socket.
+الأحداث القادمة بدون frame (من الـ views) تُبنى محلياً بنفس الدالة.
+
+sequenced=True: الحدث تغيير حالة — يأخذ seq من event_log (عدّاد مشترك بين العمال) وتُحفظ رسالته
+ليستأنف منها العميل العائد (resume) بدل لقطة كاملة.
+
+origin(): معرّف العملية التي بثّت الحدث — حالة حيّة داخل العملية (live_letters) تتجاهل صدى
+ما طبّقته هي فقط، وتطبّق ما بثّه عامل آخر أو مسار HTTP.
+simulated_worker يقسم العملية الواحدة إلى عمال محاكين (ws_loadtest --workers) لكل منهم origin خاص.
+"""
+import contextvars
+import os
+import uuid
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from games import event_log, ws_protocol
+
+ROLES = ('host', 'display', 'contestant')
+
+HOST_AND_DISPLAY = ('host', 'display')
+DISPLAY_AND_CONTESTANT = ('display', 'contestant')
+DISPLAY_ONLY = ('display',)
+
+_origin = (None, None)
+# يضبطه غلاف تطبيق ASGI لكل اتصال في ws_loadtest؛ None في التشغيل العادي
+simulated_worker = contextvars.ContextVar('simulated_worker', default=None)
+
+
+def role_of(role: str) -> str:
+    return role if role in ROLES else 'display'
+
+
+def session_group(game: str, session_id) -> str:
+    return f"{game}_session_{session_id}"
+
+
+def role_group(group_name: str, role: str) -> str:
+    return f"{group_name}_{role_of(role)}"
+
+
+def origin() -> str:
+    """معرّف هذه العملية (يتجدد بعد fork فلا يتشاركه عاملان وُلدا من نفس الأب)."""
+    global _origin
+    pid = os.getpid()
+    if _origin[0] != pid:
+        _origin = (pid, f"{pid}:{uuid.uuid4().hex[:12]}")
+    worker = simulated_worker.get()
+    return _origin[1] if worker is None else f"{_origin[1]}/{worker}"
+
+
+def is_echo(event) -> bool:
+    """الحدث بثّته هذه العملية نفسها."""
+    return event.get('origin') == origin()
+
+
+async def join(channel_layer, group_name, channel_name, role):
+    await channel_layer.group_add(group_name, channel_name)
+    await channel_layer.group_add(role_group(group_name, role), channel_name)
+
+
+async def leave(channel_layer, group_name, channel_name, role):
+    await channel_layer.group_discard(group_name, channel_name)
+    await channel_layer.group_discard(role_group(group_name, role), channel_name)
+
+
+async def group_send(channel_layer, group_name, event, roles=None):
+    """roles=None → المجموعة الكاملة؛ وإلا نرسل لمجموعة كل دور مطلوب فقط."""
+    if not roles:
+        await channel_layer.group_send(group_name, event)
+        return
+    for role in roles:
+        await channel_layer.group_send(role_group(group_name, role), event)
+
+
+async def broadcast(channel_layer, group_name, event, build, roles=None, sequenced=False):
+    """build(event) → رسالة العميل؛ تُرمّز هنا مرة واحدة (JSON + msgpack) لكل المستقبلين."""
+    if sequenced:
+        message = await sync_to_async(event_log.append)(group_name, event, build, roles)
+    else:
+        message = build(event)
+    event['frame'] = ws_protocol.encode_json(message)
+    event['frame_bin'] = ws_protocol.encode_msgpack(message)
+    await group_send(channel_layer, group_name, event, roles)
+
+
+async def forward(consumer, event, build):
+    if getattr(consumer, 'wire', ws_protocol.JSON) == ws_protocol.MSGPACK:
+        frame = event.get('frame_bin')
+        if frame is None:
+            frame = ws_protocol.encode_msgpack(build(event))
+        await consumer.send(bytes_data=frame)
+        return
+    frame = event.get('frame')
+    if frame is None:
+        frame = ws_protocol.encode_json(build(event))
+    await consumer.send(text_data=frame)
+
+
+async def resume(consumer, since) -> bool:
+    """يرسل للعميل العائد ما فاته منذ since؛ False = لا يمكن (يحتاج لقطة كاملة)."""
+    if since < 0:
+        return False
+    missed = await sync_to_async(event_log.since)(consumer.group_name, since, role_of(consumer.role))
+    if missed is None:
+        return False
+    for message in missed:
+        await ws_protocol.send(consumer, message)
+    return True
+
+
+def group_send_sync(channel_layer, group_name, event, roles=None):
+    """نسخة متزامنة للـ views."""
+    async_to_sync(group_send)(channel_layer, group_name, event, roles)
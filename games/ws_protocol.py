@@ -0,0 +1,132 @@
+# games/ws_protocol.py
+"""
+بروتوكول WebSocket المتفاوض عليه عند الاتصال:
+- JSON نصّي: الافتراضي لأي عميل لا يعرض بروتوكولاً فرعياً (صفحات المقدم وأدوات الحمل)
+- msgpack ثنائي: إذا طلب العميل البروتوكول الفرعي MSGPACK_SUBPROTOCOL
+  (new WebSocket(url, ['wesh.msgpack.v1']))؛ الإطارات bytes وحقل type رقم قصير من TYPE_CODES
+  (الأنواع غير الموجودة في الجدول تبقى نصاً)
+- صفحات العرض والمتسابقين تطلبه عبر templates/games/ws_wire.html (WeshWire.open/parse)،
+  وجدول الأرقام يصلها من هنا عبر {% ws_type_codes %}؛ إرسالها يبقى JSON نصّي
+"""
+import json
+
+import msgpack
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+MSGPACK_SUBPROTOCOL = 'wesh.msgpack.v1'
+
+# الأرقام ثابتة — لا تغيّر رقماً موجوداً، أضف الجديد في النهاية
+TYPE_CODES = {
+    # عميل ← خادم
+    'pong': 1,
+    'error': 2,
+    'buzz_confirmed': 3,
+    'buzz_rejected': 4,
+    'contestant_buzz_accepted': 5,
+    'buzz_unlocked': 6,
+    'buzz_reset_by_host': 7,
+    'cell_state_updated': 8,
+    'scores_updated': 9,
+    'letter_selected': 10,
+    'letters_updated': 11,
+    'settings_updated': 12,
+    'grid_state': 13,
+    'penalty_start': 14,
+    'penalty_end': 15,
+    'nohost_question': 16,
+    'puzzle_updated': 17,
+    'timer_state': 18,
+    'answer_revealed': 19,
+    'strike_updated': 20,
+    'phase_changed': 21,
+    'controlling_team_changed': 22,
+    'multiplier_changed': 23,
+    'question_visibility': 24,
+    'full_state': 25,
+    'team_names_updated': 26,
+    'timer_tick': 27,
+    'question_changed': 28,
+    'roster': 29,
+    'roster_changed': 30,
+    'round_won': 31,
+    'rtt_probe': 32,
+    # خادم ← عميل
+    'ping': 64,
+    'contestant_buzz': 65,
+    'update_cell_state': 66,
+    'update_scores': 67,
+    'buzz_reset': 68,
+    'nohost_letter_select': 69,
+    'nohost_question_broadcast': 70,
+    'puzzle_nav': 71,
+    'puzzle_set_index': 72,
+    'update_settings': 73,
+    'contestant_stop_and_switch': 74,
+    'timer_start': 75,
+    'timer_pause': 76,
+    'timer_reset': 77,
+    'reveal_answer': 78,
+    'mark_strike': 79,
+    'reset_strikes': 80,
+    'award_points': 81,
+    'next_question': 82,
+    'prev_question': 83,
+    'set_question': 84,
+    'set_phase': 85,
+    'set_controlling_team': 86,
+    'set_multiplier': 87,
+    'show_question': 88,
+    'update_team_names': 89,
+    'resync': 90,
+    'contestant_join': 91,
+    'rtt_echo': 92,
+}
+CODE_TYPES = {code: name for name, code in TYPE_CODES.items()}
+
+
+def negotiate(scope) -> str:
+    """يختار صيغة الإطارات من البروتوكولات الفرعية التي عرضها العميل."""
+    if MSGPACK_SUBPROTOCOL in (scope.get('subprotocols') or []):
+        return MSGPACK
+    return JSON
+
+
+def accept_subprotocol(wire: str):
+    return MSGPACK_SUBPROTOCOL if wire == MSGPACK else None
+
+
+def encode_json(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_msgpack(message: dict) -> bytes:
+    t = message.get('type')
+    if t in TYPE_CODES:
+        message = dict(message, type=TYPE_CODES[t])
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def decode(text_data=None, bytes_data=None):
+    """يرجع dict من إطار العميل (نص JSON أو bytes msgpack)، أو None إذا كان غير صالح."""
+    try:
+        if bytes_data is not None:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        else:
+            data = json.loads(text_data or '{}')
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    t = data.get('type')
+    if isinstance(t, int):
+        data['type'] = CODE_TYPES.get(t)
+    return data
+
+
+async def send(consumer, message: dict):
+    """إرسال رسالة لسوكت واحد بالصيغة المتفاوض عليها."""
+    if getattr(consumer, 'wire', JSON) == MSGPACK:
+        await consumer.send(bytes_data=encode_msgpack(message))
+    else:
+        await consumer.send(text_data=encode_json(message))
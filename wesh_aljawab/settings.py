@@ -121,6 +121,21 @@ GAME_SETTINGS = {
     'FREE_SESSION_DURATION_HOURS': 1,
     'PAID_SESSION_DURATION_DAYS': 3,
     'MAX_FREE_SESSIONS_PER_GAME_TYPE': 1,
+    # كتابة الحالة الحيّة (خلية الحروف + ساعة تحدّي الوقت) إلى DB على دفعات كل N ms
+    'LIVE_STATE_FLUSH_MS': config('LIVE_STATE_FLUSH_MS', default=250, cast=int),
+    # نافذة جمع ضغطات البازر قبل إعلان الفائز (ms) — auto | redis | shared | local
+    'BUZZ_WINDOW_MS': config('BUZZ_WINDOW_MS', default=30, cast=int),
+    'BUZZ_ARBITER': config('BUZZ_ARBITER', default='auto'),
+    # إطار timer_tick لتصحيح عدّادات تحدّي الوقت أثناء الجريان (0 = بدون)
+    'TIME_CLOCK_TICK_MS': config('TIME_CLOCK_TICK_MS', default=1000, cast=int),
+    # عدد آخر أحداث الحالة المحفوظة لكل جلسة لاستئناف العميل العائد بدل لقطة كاملة
+    'EVENT_LOG_SIZE': config('EVENT_LOG_SIZE', default=128, cast=int),
+    # عدد فهارس أسئلة خلية الحروف (حزمة لكل فهرس) المحفوظة داخل كل عملية
+    'LETTERS_INDEX_CACHE_SIZE': config('LETTERS_INDEX_CACHE_SIZE', default=64, cast=int),
+    # نافذة لقطة الجلسة داخل العملية (session_cache) قبل الرجوع للكاش المشترك
+    'SESSION_CACHE_LOCAL_MS': config('SESSION_CACHE_LOCAL_MS', default=2000, cast=int),
+    # تعطيل الجلسات المنتهية داخل عملية daphne كل N ثانية (0 = عبر manage.py expire_sessions فقط)
+    'SESSION_REAPER_INTERVAL_S': config('SESSION_REAPER_INTERVAL_S', default=0, cast=int),
     'SESSION_WARNING_THRESHOLDS': {
         'FREE': {'DANGER': 5, 'WARNING': 10},
         'PAID': {'DANGER': 2, 'WARNING': 6},
@@ -138,9 +153,28 @@ def _is_rediss(url: str) -> bool:
 REDIS_URL = config('REDIS_URL', default='')
 REDIS_CACHE_URL = config('REDIS_CACHE_URL', default=REDIS_URL or '')
 FORCE_REDIS = config('FORCE_REDIS', default=False, cast=bool)
+# عدة عقد Redis (مفصولة بفواصل): المجموعات والمفاتيح توزَّع بمعرّف الجلسة (games/sharding.py)
+REDIS_SHARDS = [u.strip() for u in config('REDIS_SHARDS', default='').split(',') if u.strip()]
+REDIS_SHARD_REPLICAS = config('REDIS_SHARD_REPLICAS', default=128, cast=int)
+# عدة عمليات daphne على جهاز واحد بدون Redis: مجلد مقابس Unix مشترك بين العمال (games/host_layer.py)
+CHANNEL_LAYER_SOCKETS = config('CHANNEL_LAYER_SOCKETS', default='')
+# ومعه كاش مشترك بين العمال (ملف mmap، يُفضَّل داخل /dev/shm) بدل LocMem الخاص بكل عملية (games/shared_cache.py)
+SHARED_CACHE_PATH = config('SHARED_CACHE_PATH', default='')
 
 try:
-    if FORCE_REDIS and REDIS_URL:
+    if FORCE_REDIS and len(REDIS_SHARDS) > 1:
+        CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "games.sharding.SessionShardedChannelLayer",
+                "CONFIG": {
+                    "hosts": REDIS_SHARDS,
+                    "capacity": 1000,
+                    "expiry": 10,
+                    "shard_replicas": REDIS_SHARD_REPLICAS,
+                },
+            }
+        }
+    elif FORCE_REDIS and REDIS_URL:
         CHANNEL_LAYERS = {
             "default": {
                 "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -151,13 +185,39 @@ try:
                 },
             }
         }
+    elif CHANNEL_LAYER_SOCKETS:
+        CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "games.host_layer.HostChannelLayer",
+                "CONFIG": {
+                    "path": CHANNEL_LAYER_SOCKETS,
+                    "capacity": 1000,
+                    "expiry": 10,
+                },
+            }
+        }
     else:
         CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 except Exception:
     CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
 
 try:
-    if FORCE_REDIS and REDIS_CACHE_URL:
+    if FORCE_REDIS and len(REDIS_SHARDS) > 1:
+        CACHES = {
+            "default": {
+                "BACKEND": "django_redis.cache.RedisCache",
+                "LOCATION": REDIS_SHARDS,
+                "OPTIONS": {
+                    "CLIENT_CLASS": "games.sharding.SessionShardClient",
+                    "CONNECTION_POOL_KWARGS": {"max_connections": 50},
+                    "SHARD_REPLICAS": REDIS_SHARD_REPLICAS,
+                    **({"SSL": True} if any(_is_rediss(u) for u in REDIS_SHARDS) else {}),
+                },
+                "KEY_PREFIX": "wesh",
+                "TIMEOUT": 300,
+            }
+        }
+    elif FORCE_REDIS and REDIS_CACHE_URL:
         CACHES = {
             "default": {
                 "BACKEND": "django_redis.cache.RedisCache",
@@ -171,6 +231,15 @@ try:
                 "TIMEOUT": 300,
             }
         }
+    elif SHARED_CACHE_PATH:
+        CACHES = {
+            "default": {
+                "BACKEND": "games.shared_cache.SharedMemoryCache",
+                "LOCATION": SHARED_CACHE_PATH,
+                "TIMEOUT": 300,
+                "OPTIONS": {"MAX_ENTRIES": 4096, "SLOT_SIZE": 1024},
+            }
+        }
     else:
         CACHES = {
             "default": {